@@ -198,6 +198,7 @@ def get_cpu_load(plugin_data, verbose):
         plugin_data.add_perf_data(
             f"'{cpu_load_dict['metric']}'={cpu_load_dict['value']};"
         )
+        plugin_data.add_point(cpu_load_dict)
 
 
 def get_cpu_util(plugin_data, verbose):
@@ -211,6 +212,7 @@ def get_cpu_util(plugin_data, verbose):
             f"'{cpu_util_dict['metric']}'="
             f"{cpu_util_dict['value']}{cpu_util_dict['units']};"
         )
+        plugin_data.add_point(cpu_util_dict)
 
 
 def get_cpu_core_info(plugin_data, verbose):
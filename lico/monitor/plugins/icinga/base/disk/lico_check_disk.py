@@ -114,6 +114,7 @@ def get_disk_total(plugin_data, verbose):
         plugin_data.add_perf_data("{0}={1}{2}".format(
             disk_total_dict['metric'], disk_total_dict['value'],
             disk_total_dict['units']))
+        plugin_data.add_point(disk_total_dict)
 
 
 def get_disk_used(plugin_data, verbose):
@@ -125,6 +126,7 @@ def get_disk_used(plugin_data, verbose):
         plugin_data.add_perf_data("{0}={1}{2}".format(disk_used_dict['metric'],
                                                       disk_used_dict['value'],
                                                       disk_used_dict['units']))
+        plugin_data.add_point(disk_used_dict)
 
 
 if __name__ == '__main__':
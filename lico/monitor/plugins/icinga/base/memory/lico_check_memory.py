@@ -69,6 +69,7 @@ def get_mem_total(plugin_data, verbose):
         plugin_data.add_perf_data("{0}={1}{2}".format(mem_total_dict['metric'],
                                                       mem_total_dict['value'],
                                                       mem_total_dict['units']))
+        plugin_data.add_point(mem_total_dict)
 
 
 def get_mem_used(plugin_data, verbose):
@@ -80,6 +81,7 @@ def get_mem_used(plugin_data, verbose):
         plugin_data.add_perf_data("{0}={1}{2}".format(mem_used_dict['metric'],
                                                       mem_used_dict['value'],
                                                       mem_used_dict['units']))
+        plugin_data.add_point(mem_used_dict)
 
 
 if __name__ == '__main__':
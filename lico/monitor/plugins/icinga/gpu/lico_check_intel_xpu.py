@@ -24,6 +24,15 @@ from collections import defaultdict
 
 from lico.monitor.plugins.icinga.helper.base import MetricsBase, PluginData
 
+# Management processes which hold a handle on every device, they are not
+# counted as the workload of the device.
+EXCLUDE_PROCESS = ['xpu-smi', 'xpumd', 'slurmd']
+
+ENGINE_UTIL_KEYS = [
+    'compute_engine_util', 'rendering_engine_util', 'copy_engine_util',
+    'media_engine_util', 'media_enhancement_util'
+]
+
 
 async def execute(command, preexec_fn=None):
     process = await asyncio.create_subprocess_exec(
@@ -113,6 +122,7 @@ def get_xpu_command_output():  # noqa: C901
 
 class XPUMetric(MetricsBase):
     output = get_xpu_command_output()
+    exclude_process = EXCLUDE_PROCESS
 
     @classmethod
     def _get_device_nums(cls):
@@ -164,6 +174,39 @@ class XPUMetric(MetricsBase):
                 )
         return temp_list
 
+    @classmethod
+    def xpu_energy(cls):
+        """
+        The energy consumed by each device since it is powered on.
+        """
+        energy_list = []
+        nums = cls._get_device_nums()
+        if nums:
+            for n in range(nums):
+                if 'stats_command_n_output' in cls.output.keys():
+                    stats_out = cls.output['stats_command_n_output'][n]
+                else:
+                    return []
+                data_list = stats_out.get('device_level', [])
+                if not any(data["metrics_type"] == "XPUM_STATS_ENERGY"
+                           for data in data_list):
+                    data_list = [
+                        data for tile in stats_out.get('tile_level', [])
+                        for data in tile['data_list']
+                    ]
+                energy = [
+                    data["value"] for data in data_list
+                    if data["metrics_type"] == "XPUM_STATS_ENERGY"
+                ]
+                energy_list.append(cls.build_point(
+                    'gpu{0}_energy'.format(n),
+                    sum(energy) if energy else None,
+                    'float',
+                    'mJ',
+                    index=n)
+                )
+        return energy_list
+
     @classmethod
     def xpu_product_name(cls):
         if "discovery_command_output" in cls.output.keys():
@@ -267,31 +310,75 @@ class XPUMetric(MetricsBase):
                 )
         return gpu_util
 
+    @classmethod
+    def xpu_device_pids(cls):
+        """
+        Index the processes of each device, for example:
+        {0: {'1234', '1235'}, 1: {'1236'}}
+        """
+        device_pids = defaultdict(set)
+        for n, proc in cls._iter_device_process():
+            device_pids[n].add(str(proc['process_id']))
+        return device_pids
+
+    @classmethod
+    def xpu_process_usage(cls):
+        """
+        Per-process usage of each device, for example:
+        {
+            0: {  # device index
+                '1234': {  # pid
+                    'name': 'python',
+                    'mem_used': 512.0,  # unit: MiB
+                    'util': 35.0,  # unit: %
+                    'engine_util': {'compute_engine_util': 35.0, ...}
+                }
+            }
+        }
+        """
+        process_usage = defaultdict(dict)
+        for n, proc in cls._iter_device_process():
+            engine_util = {
+                k: float(proc[k]) for k in ENGINE_UTIL_KEYS
+                if proc.get(k) is not None
+            }
+            # xpumcli reports the memory size of a process in KiB
+            process_usage[n][str(proc['process_id'])] = {
+                'name': proc.get('process_name', ''),
+                'mem_used': round(float(proc.get('mem_size', 0)) / 1024, 1),
+                'util': engine_util.get(
+                    'compute_engine_util',
+                    max(engine_util.values(), default=0.0)
+                ),
+                'engine_util': engine_util
+            }
+        return process_usage
+
+    @classmethod
+    def _iter_device_process(cls):
+        ps_list = cls.output.get('ps_command_n_output', []) \
+            if cls.output else []
+        for n in range(min(cls._get_device_nums(), len(ps_list))):
+            for proc in ps_list[n].get("device_util_by_proc_list", []):
+                if proc['process_name'] in cls.exclude_process:
+                    continue
+                yield n, proc
+
     @classmethod
     def xpu_index_process(cls):
         nums = cls._get_device_nums()
-        pid_list = list()
-        xpu_process = list()
-        if nums:
-            for n in range(nums):
-                if 'ps_command_n_output' in cls.output.keys():
-                    ps_out = cls.output['ps_command_n_output'][n]
-                else:
-                    return []
-                for proc in ps_out["device_util_by_proc_list"]:
-                    if proc['process_name'] not in \
-                            ["xpu-smi", "xpumd", "slurmd"]:
-                        pid_list.append(proc["process_id"])
-                xpu_process.append(
-                    cls.build_point(
-                        'gpu{0}_proc_num'.format(n),
-                        len(set(pid_list)),
-                        'uint',
-                        '',
-                        index=n
-                    )
-                )
-        return xpu_process
+        if not nums or 'ps_command_n_output' not in cls.output.keys():
+            return []
+        device_pids = cls.xpu_device_pids()
+        return [
+            cls.build_point(
+                'gpu{0}_proc_num'.format(n),
+                len(device_pids[n]),
+                'uint',
+                '',
+                index=n
+            ) for n in range(nums)
+        ]
 
     @classmethod
     def xpu_driver_version(cls):
@@ -364,7 +451,7 @@ class XPUMetric(MetricsBase):
                     cls.build_point(
                         'gpu{0}_util_mem'.format(n),
                         round(util_mem/tile_num, 1),
-                        'string',
+                        'float',
                         '%',
                         index=n
                     )
@@ -464,6 +551,8 @@ def get_gpu_temp(plugin_data, verbose):
                     int(gpu_temp_dict['value']),
                     '')
             )
+            plugin_data.add_point(gpu_temp_dict, 'gpu_temp',
+                                  gpu=gpu_temp_dict['index'])
 
 
 def get_gpu_util(plugin_data, verbose):
@@ -488,6 +577,8 @@ def get_gpu_util(plugin_data, verbose):
                     gpu_util_dict['value'],
                     gpu_util_dict['units'])
             )
+            plugin_data.add_point(gpu_util_dict, 'gpu_util',
+                                  gpu=gpu_util_dict['index'])
 
 
 def get_gpu_static(plugin_data, verbose):
@@ -553,6 +644,34 @@ def get_gpu_index_process(plugin_data, verbose):
                     gpu_process_dict['metric'],
                     gpu_process_dict['value'])
             )
+            plugin_data.add_point(gpu_process_dict, 'gpu_proc_num',
+                                  gpu=gpu_process_dict['index'])
+
+
+def get_gpu_process_usage(plugin_data, verbose):
+    try:
+        gpu_process_usage = XPUMetric.xpu_process_usage()
+    except Exception as e:
+        if verbose:
+            raise e
+        return []
+    else:
+        for index, process_usage in gpu_process_usage.items():
+            for pid, usage in process_usage.items():
+                plugin_data.add_output_data(
+                    "GPU{} process {} used memory = {}MiB, "
+                    "utilization = {}%".format(
+                        index, pid, usage['mem_used'], usage['util']
+                    )
+                )
+                plugin_data.add_perf_data(
+                    "gpu{}_proc_{}_mem_used={}MiB".format(
+                        index, pid, usage['mem_used'])
+                )
+                plugin_data.add_perf_data(
+                    "gpu{}_proc_{}_util={}%".format(
+                        index, pid, usage['util'])
+                )
 
 
 def get_gpu_mem_used(plugin_data, verbose):
@@ -577,6 +696,8 @@ def get_gpu_mem_used(plugin_data, verbose):
                     gpu_mem_used_dict['value'],
                     gpu_mem_used_dict['units'])
             )
+            plugin_data.add_point(gpu_mem_used_dict, 'gpu_mem_used',
+                                  gpu=gpu_mem_used_dict['index'])
 
 
 def get_gpu_mem_total(plugin_data, verbose):
@@ -601,6 +722,8 @@ def get_gpu_mem_total(plugin_data, verbose):
                     gpu_mem_total_dict['value'],
                     gpu_mem_total_dict['units'])
             )
+            plugin_data.add_point(gpu_mem_total_dict, 'gpu_mem_total',
+                                  gpu=gpu_mem_total_dict['index'])
 
 
 def get_gpu_util_mem(plugin_data, verbose):
@@ -625,6 +748,17 @@ def get_gpu_util_mem(plugin_data, verbose):
                     gpu_util_mem_dict['value'],
                     gpu_util_mem_dict['units'])
             )
+            plugin_data.add_point(gpu_util_mem_dict, 'gpu_util_mem',
+                                  gpu=gpu_util_mem_dict['index'])
+
+
+def get_gpu_dynamic(plugin_data, verbose):
+    get_gpu_util(plugin_data, verbose)
+    get_gpu_temp(plugin_data, verbose)
+    get_gpu_mem_used(plugin_data, verbose)
+    get_gpu_mem_total(plugin_data, verbose)
+    get_gpu_index_process(plugin_data, verbose)
+    get_gpu_util_mem(plugin_data, verbose)
 
 
 def get_xpu_tile_info(plugin_data, verbose):
@@ -714,6 +848,27 @@ def get_xpu_tile_info(plugin_data, verbose):
                         tile_value['gpu_bandwidth_utilization'],
                         '%'
                     ))
+                add_xpu_tile_points(
+                    plugin_data, xpu_tile_info_dict['index'], tile_value)
+
+
+def add_xpu_tile_points(plugin_data, index, tile_value):
+    """
+    The points of a tile for the exporter, the tile is a label.
+    """
+    for metric, value, value_type, unit in [
+        ('gpu_tile_mem_usage', round((tile_value['memory_used'] /
+                                      tile_value['memory_total']) * 100, 1),
+         'float', '%'),
+        ('gpu_tile_util', tile_value['gpu_utilization'], 'float', '%'),
+        ('gpu_tile_temp', int(tile_value['gpu_temperature']), 'int', 'C'),
+        ('gpu_tile_mem_used', tile_value['memory_used'], 'float', 'MiB'),
+        ('gpu_tile_util_bandwidth',
+         tile_value['gpu_bandwidth_utilization'], 'float', '%'),
+    ]:
+        plugin_data.add_point(
+            MetricsBase.build_point(metric, value, value_type, unit),
+            gpu=index, tile=tile_value['tile_id'])
 
 
 if __name__ == '__main__':
@@ -727,22 +882,29 @@ if __name__ == '__main__':
                              'and pcie generation.')
     parser.add_argument('-t', '--tile', action='store_true',
                         help='Get the tile information of XPU')
+    parser.add_argument('-p', '--process', action='store_true',
+                        help='Get the memory and engine utilization of '
+                             'each process on XPU')
+    parser.add_argument('--exclude-process',
+                        default=','.join(EXCLUDE_PROCESS),
+                        help='Comma-separated process names which are '
+                             'not counted as XPU processes, default is '
+                             '{}'.format(','.join(EXCLUDE_PROCESS)))
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='Verbose mode')
     args = parser.parse_args()
 
+    XPUMetric.exclude_process = [
+        i.strip() for i in args.exclude_process.split(',') if i.strip()
+    ]
     plugin_data = PluginData()
     if args.dynamic:
-        get_gpu_util(plugin_data, args.verbose)
-        get_gpu_temp(plugin_data, args.verbose)
-        get_gpu_mem_used(plugin_data, args.verbose)
-        get_gpu_mem_total(plugin_data, args.verbose)
-        get_gpu_index_process(plugin_data, args.verbose)
-        get_gpu_util_mem(plugin_data, args.verbose)
-    if args.static and (args.dynamic or args.tile):
+        get_gpu_dynamic(plugin_data, args.verbose)
+    if args.static and (args.dynamic or args.tile or args.process):
         if args.verbose:
             print("There is a conflict between parameter --static with "
-                  "--dynamic or --tile, please check the parameters")
+                  "--dynamic, --tile or --process, please check the "
+                  "parameters")
             sys.exit(2)
         else:
             sys.exit(2)
@@ -750,4 +912,6 @@ if __name__ == '__main__':
         get_gpu_static(plugin_data, args.verbose)
     if args.tile:
         get_xpu_tile_info(plugin_data, args.verbose)
+    if args.process:
+        get_gpu_process_usage(plugin_data, args.verbose)
     plugin_data.exit()
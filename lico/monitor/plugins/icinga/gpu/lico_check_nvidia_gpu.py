@@ -19,8 +19,7 @@ import re
 from collections import defaultdict
 from enum import IntEnum
 
-import defusedxml.ElementTree as ET
-
+from lico.monitor.plugins.icinga.gpu.nvidia_mig import MigTopology
 from lico.monitor.plugins.icinga.helper.base import (
     MetricsBase, PluginData, StateEnum,
 )
@@ -43,6 +42,7 @@ OUTPUT_MAP = {
     'gpu_mem_used': FormatEnum.STRING,
     'gpu_mem_total': FormatEnum.STRING,
     'gpu_proc_num': FormatEnum.STRING,
+    'gpu_proc_usage': FormatEnum.STRING,
     'gpu_util_mem': FormatEnum.STRING,
     'mig_mode': FormatEnum.STRING,
     'mig_sm_count': FormatEnum.STRING,
@@ -65,6 +65,7 @@ PARAMS_MAP = {
     'gpu_mem_used': ['gpu_mem_used'],
     'gpu_mem_total': ['gpu_mem_total'],
     'gpu_proc_num': ['gpu_proc_num'],
+    'gpu_proc_usage': ['gpu_proc_usage'],
     'gpu_util_mem': ['gpu_util_mem'],
     'mig_mode': ['mig_mode'],
     'mig_sm_count': ['mig_sm_count'],
@@ -85,6 +86,7 @@ METRIC_MAP = {
     'gpu_mem_used': 'memory.used',
     'gpu_mem_total': 'memory.total',
     'gpu_proc_num': 'uuid',
+    'gpu_proc_usage': 'uuid',
     'gpu_util_mem': 'utilization.memory',
     'gpu_name': 'name',
     'gpu_uuid': 'uuid',
@@ -138,7 +140,7 @@ class GPUMetric(MetricsBase):
             index, temp = temp_str.split(', ')
             temp_list.append(cls.build_point(
                 'gpu{0}_temp'.format(index), temp, 'uint', 'C',
-                'GPU{0} temperature'.format(index), StateEnum.OK)
+                'GPU{0} temperature'.format(index), StateEnum.OK, index)
             )
         return temp_list
 
@@ -197,7 +199,8 @@ class GPUMetric(MetricsBase):
                     'uint',
                     'MiB',
                     'GPU{0} used memory'.format(idx),
-                    StateEnum.OK
+                    StateEnum.OK,
+                    idx
                 )
             )
         return gpu_mem_usage
@@ -217,7 +220,8 @@ class GPUMetric(MetricsBase):
                     'uint',
                     'MiB',
                     'GPU{0} total memory'.format(idx),
-                    StateEnum.OK
+                    StateEnum.OK,
+                    idx
                 )
             )
         return gpu_mem_usage
@@ -243,7 +247,8 @@ class GPUMetric(MetricsBase):
                             'uint',
                             '%',
                             'GPU{0} utilization'.format(idx),
-                            StateEnum.OK
+                            StateEnum.OK,
+                            idx
                         )
                     )
             except Exception:  # nosec B112
@@ -272,7 +277,8 @@ class GPUMetric(MetricsBase):
                         'uint',
                         '%',
                         'GPU{0} utilization'.format(gpu_id),
-                        StateEnum.OK
+                        StateEnum.OK,
+                        gpu_id
                     )
                 )
 
@@ -298,11 +304,88 @@ class GPUMetric(MetricsBase):
                     'uint',
                     '',
                     'GPU{0} process number'.format(idx),
-                    StateEnum.OK
+                    StateEnum.OK,
+                    idx
                 )
             )
         return gpu_process
 
+    @classmethod
+    def _gpu_process_memory(cls):
+        command = [
+            'nvidia-smi', '--query-compute-apps=pid,gpu_uuid,used_memory',
+            '--format=csv,noheader,nounits'
+        ]
+        out, err, ret_code = cls.command_call(command)
+        if ret_code:
+            cls.print_err(out + err)
+            return []
+        '''[['5895', 'GPU-2c09ffaca', '512'], ...]'''
+        return [
+            [i.strip() for i in line.split(',')]
+            for line in out.decode().strip().split('\n') if line.strip()
+        ]
+
+    @classmethod
+    def _gpu_process_util(cls):
+        '''
+        Example for "nvidia-smi pmon -c 1 -s u":
+        # gpu        pid  type    sm   mem   enc   dec   command
+        # Idx          #   C/G     %     %     %     %   name
+            0      12345     C    45    10     -     -   python
+        '''
+        out, err, ret_code = cls.command_call(
+            ['nvidia-smi', 'pmon', '-c', '1', '-s', 'u'])
+        if ret_code:
+            cls.print_err(out + err)
+            return {}
+        columns = []
+        process_util = defaultdict(dict)
+        for line in out.decode().strip().split('\n'):
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] == '#':
+                columns = columns or fields[1:]
+                continue
+            info = dict(zip(columns, fields))
+            if info.get('pid', '-') == '-':
+                continue
+            process_util[info['gpu']][info['pid']] = {
+                k: float(info[k]) if info.get(k, '-') != '-' else 0.0
+                for k in ['sm', 'mem', 'enc', 'dec']
+            }
+        return process_util
+
+    @classmethod
+    def gpu_process_usage(cls, content):
+        '''
+        Per-process usage of each GPU, for example:
+        {
+            '0': {  # gpu index
+                '5895': {  # pid
+                    'mem_used': 512,  # unit: MiB
+                    'util': 45.0,  # sm utilization, unit: %
+                    'mem_util': 10.0,  # memory bandwidth, unit: %
+                }
+            }
+        }
+        '''
+        uuid_idx = {v: k for k, v in cls._gpu_idx_uuid(content).items()}
+        process_util = cls._gpu_process_util()
+        process_usage = defaultdict(dict)
+        for pid, uuid, used_memory in cls._gpu_process_memory():
+            idx = uuid_idx.get(uuid)
+            if idx is None:
+                continue
+            util = process_util.get(idx, {}).get(pid, {})
+            process_usage[idx][pid] = {
+                'mem_used': int(used_memory) if used_memory.isdigit() else 0,
+                'util': util.get('sm', 0.0),
+                'mem_util': util.get('mem', 0.0)
+            }
+        return process_usage
+
     # Get the driver version
     @classmethod
     def gpu_driver_version(cls, content):
@@ -388,7 +471,7 @@ class GPUMetric(MetricsBase):
                     'uint',
                     '%',
                     'GPU{0} utilization.memory'.format(index),
-                    StateEnum.OK)
+                    StateEnum.OK, index)
                 )
             else:
                 gpu_util_mem_list.append(cls.build_point(
@@ -397,7 +480,7 @@ class GPUMetric(MetricsBase):
                     'uint',
                     '%',
                     'GPU{0} utilization.memory'.format(index),
-                    StateEnum.OK)
+                    StateEnum.OK, index)
                 )
         return gpu_util_mem_list
 
@@ -444,40 +527,15 @@ def get_sm_total():
 
 # GPU MIG info monitor
 class GPUMIGMetric(MetricsBase):
-    def gpu_mig_data(self, gpu_element_data):
+    def gpu_mig_data(self, topology):
         try:
             mig_monitor_result = []
-            for gpu_data in gpu_element_data:
-                miginfo_list = []
-                process_info = []
-                mig_mode_date = gpu_data.find('mig_mode')
-                mig_mode_state = mig_mode_date.find('current_mig').text \
-                    if mig_mode_date else None
-                if mig_mode_state == 'Enabled':
-                    process_info_data = gpu_data.findall('processes')
-                    mig_elemet_data = gpu_data.find('mig_devices').findall(
-                        'mig_device')
-                    for process_data in process_info_data:
-                        for job_info in process_data:
-                            result = {}
-                            process_gi = job_info.find(
-                                'gpu_instance_id').text
-                            process_ci = job_info.find(
-                                'compute_instance_id').text
-
-                            pid = job_info.find('pid').text
-                            result["process_gi"] = process_gi
-                            result["process_ci"] = process_ci
-                            result["pid"] = pid
-                            process_info.append(result)
+            for gpu in topology.gpus:
+                if gpu.mig_enabled:
                     # Get information about MIG
-                    miginfo_list = self.get_data_info(
-                        mig_elemet_data,
-                        process_info,
-                        miginfo_list)
-                    gpu_index = gpu_data.find('minor_number').text
+                    miginfo_list = self.get_data_info(gpu, [])
                     mig_monitor_result.append(self.build_point(
-                        "lico_gpu{}_mig_devices".format(gpu_index),
+                        "lico_gpu{}_mig_devices".format(gpu.index),
                         miginfo_list,
                         'string',
                         '',
@@ -517,69 +575,38 @@ class GPUMIGMetric(MetricsBase):
                     gpu_mig_info["type_name"] = i.split()[3]
         return gpu_mig_info
 
-    def get_data_info(self, mig_elemet_data, process_info, miginfo_list):
-        for mig_data in mig_elemet_data:
-            gpu_mig_info = {}
-            # 'mig_device': '0'
-            mig_device = mig_data.find(
-                'index').text
-            gpu_mig_info["mig_device"] = mig_device
-            # 'gpu_instance_id': '0'
-            gpu_instance_id = mig_data.find(
-                'gpu_instance_id').text
-            gpu_mig_info["gpu_instance_id"] = gpu_instance_id
-
-            # 'compute_instance_id': '0'
-            compute_instance_id = mig_data.find(
-                'compute_instance_id').text
-            gpu_mig_info["compute_instance_id"] = compute_instance_id
-
-            # 'memory_total': '40536 MiB'
-            memory_total = mig_data.find(
-                'fb_memory_usage/total').text
-            gpu_mig_info["memory_total"] = memory_total
-
-            # 'memory_used': '0 MiB'
-            memory_used = mig_data.find(
-                'fb_memory_usage/used').text
-            gpu_mig_info["memory_used"] = memory_used
-
-            # 'sm_counts': '42'
-            sm_counts = mig_data.find(
-                'device_attributes/shared/multiprocessor_count'
-            ).text
-            gpu_mig_info["sm_counts"] = sm_counts
-
+    def get_data_info(self, gpu, miginfo_list):
+        for instance in gpu.instances.values():
+            gpu_mig_info = {
+                # 'mig_device': '0'
+                "mig_device": instance.mig_device,
+                # 'gpu_instance_id': '0'
+                "gpu_instance_id": instance.gpu_instance_id,
+                # 'compute_instance_id': '0'
+                "compute_instance_id": instance.compute_instance_id,
+                # 'memory_total': '40536 MiB'
+                "memory_total": instance.memory_total,
+                # 'memory_used': '0 MiB'
+                "memory_used": instance.memory_used,
+                # 'sm_counts': '42'
+                "sm_counts": str(instance.sm_count),
+                # Get pid 'process': []
+                "process": [p.pid for p in instance.processes]
+            }
             # 'type_name': '3c.7g.40gb'
-            self.get_gpu_typename(gpu_instance_id, compute_instance_id,
+            self.get_gpu_typename(instance.gpu_instance_id,
+                                  instance.compute_instance_id,
                                   gpu_mig_info)
-            # Get pid 'process': []
-            list_pid = []
-            gpu_mig_info["process"] = []
-            for process_mig_info in process_info:
-                if process_mig_info['process_gi'] == gpu_instance_id \
-                        and process_mig_info['process_ci'] == \
-                        compute_instance_id:
-                    list_pid.append(process_mig_info['pid'])
-                gpu_mig_info["process"] = list_pid
             miginfo_list.append(gpu_mig_info)
 
         return miginfo_list
 
     def gpu_mig_info(self):
-
-        command = [
-            'nvidia-smi', '-q', '-x'
-        ]
-        out, err, ret_code = self.command_call(command)
-        if ret_code:
-            self.print_err(out + err)
+        MigTopology.verbose = self.verbose
+        topology = MigTopology.load()
+        if topology is None:
             return []
-        output = out.decode()
-
-        gpu_element = ET.fromstring(output)
-        gpu_element_data = gpu_element.findall('gpu')
-        return self.gpu_mig_data(gpu_element_data)
+        return self.gpu_mig_data(topology)
 
 
 def gpu_util(content):
@@ -606,6 +633,10 @@ def gpu_util_mem(content):
     return GPUMetric().gpu_util_mem(content)
 
 
+def gpu_process_usage(content):
+    return GPUMetric().gpu_process_usage(content)
+
+
 def gpu_model_name(content):
     return GPUMetric().gpu_model_name(content)
 
@@ -673,6 +704,8 @@ def get_gpu_temp(**kwargs):
             plugin_data.add_perf_data(
                 f"{metric}={value}"
             )
+            plugin_data.add_point(gpu_temp_dict, 'gpu_temp',
+                                  gpu=gpu_temp_dict['index'])
             plugin_data.set_state(state)
 
 
@@ -694,6 +727,8 @@ def get_gpu_memory_total(**kwargs):
             plugin_data.add_perf_data(
                 f"{metric}={value}{units}"
             )
+            plugin_data.add_point(gpu_mem_total_dict, 'gpu_mem_total',
+                                  gpu=gpu_mem_total_dict['index'])
             plugin_data.set_state(state)
 
 
@@ -715,6 +750,8 @@ def get_gpu_memory_used(**kwargs):
             plugin_data.add_perf_data(
                 f"{metric}={value}{units}"
             )
+            plugin_data.add_point(gpu_mem_used_dict, 'gpu_mem_used',
+                                  gpu=gpu_mem_used_dict['index'])
             plugin_data.set_state(state)
 
 
@@ -736,6 +773,8 @@ def get_gpu_util(**kwargs):
             plugin_data.add_perf_data(
                 f"{metric}={value}{units}"
             )
+            plugin_data.add_point(gpu_util_dict, 'gpu_util',
+                                  gpu=gpu_util_dict['index'])
             plugin_data.set_state(state)
 
 
@@ -757,9 +796,30 @@ def get_gpu_index_process(**kwargs):
             plugin_data.add_perf_data(
                 f"{metric}={value}"
             )
+            plugin_data.add_point(gpu_process_dict, 'gpu_proc_num',
+                                  gpu=gpu_process_dict['index'])
             plugin_data.set_state(state)
 
 
+# GPU memory and utilization of each process
+def get_gpu_process_usage(**kwargs):
+    plugin_data = kwargs['plugin_data']
+    content = kwargs['content']
+    gpu_process_usage_dict = gpu_process_usage(content)
+    for idx, process_usage in gpu_process_usage_dict.items():
+        for pid, usage in process_usage.items():
+            plugin_data.add_output_data(
+                f"GPU{idx} process {pid} used memory = "
+                f"{usage['mem_used']}MiB, utilization = {usage['util']}%"
+            )
+            plugin_data.add_perf_data(
+                f"gpu{idx}_proc_{pid}_mem_used={usage['mem_used']}MiB"
+            )
+            plugin_data.add_perf_data(
+                f"gpu{idx}_proc_{pid}_util={usage['util']}%"
+            )
+
+
 # GPU bandwidth utilization
 def get_gpu_util_mem(**kwargs):
     plugin_data = kwargs['plugin_data']
@@ -781,6 +841,8 @@ def get_gpu_util_mem(**kwargs):
             plugin_data.add_perf_data(
                 f"{metric}={value}{units}"
             )
+            plugin_data.add_point(gpu_util_mem_dict, 'gpu_util_mem',
+                                  gpu=gpu_util_mem_dict['index'])
             plugin_data.set_state(state)
 
 
@@ -900,6 +962,9 @@ def get_mig_sm(**kwargs):
                     f"gpu{idx}_{dev}_{gi}_{ci}_sm_count="
                     f"{sm_count}"
                 )
+                plugin_data.add_point(MetricsBase.build_point(
+                    'gpu_mig_sm_count', sm_count, 'uint', ''),
+                    gpu=idx, mig_device=dev, gi=gi, ci=ci)
 
 
 # memory usage for different mig sizes
@@ -924,6 +989,9 @@ def get_mig_mem_used(**kwargs):
                     f"gpu{idx}_{dev}_{gi}_{ci}_mem_used="
                     f"{mem_used}"
                 )
+                plugin_data.add_point(MetricsBase.build_point(
+                    'gpu_mig_mem_used', mem_used, 'float', 'MiB'),
+                    gpu=idx, mig_device=dev, gi=gi, ci=ci)
 
 
 # memory total for different mig sizes
@@ -948,6 +1016,9 @@ def get_mig_total(**kwargs):
                     f"gpu{idx}_{dev}_{gi}_{ci}_mem_total="
                     f"{mem_total}"
                 )
+                plugin_data.add_point(MetricsBase.build_point(
+                    'gpu_mig_mem_total', mem_total, 'float', 'MiB'),
+                    gpu=idx, mig_device=dev, gi=gi, ci=ci)
 
 
 # number of processes with different mig sizes
@@ -971,6 +1042,9 @@ def get_mig_proc_num(**kwargs):
                     f"gpu{idx}_{dev}_{gi}_{ci}_proc_num="
                     f"{process_num}"
                 )
+                plugin_data.add_point(MetricsBase.build_point(
+                    'gpu_mig_proc_num', process_num, 'uint', ''),
+                    gpu=idx, mig_device=dev, gi=gi, ci=ci)
 
 
 # mig profile information
@@ -1119,6 +1193,12 @@ def add_argument(parser):
                                    Get the process number for each GPU;
                                    """
                                    )
+    gpu_dynamic_group.add_argument('--gpu-proc-usage', action='store_true',
+                                   help="""
+                                   Get the used memory and utilization of
+                                   each process for each GPU;
+                                   """
+                                   )
     gpu_dynamic_group.add_argument('--gpu-util-mem', action='store_true',
                                    help="""
                                    Get the usage of memory bandwidth for
@@ -1198,6 +1278,7 @@ gpu_handle_map = {
         'gpu_mem_used': get_gpu_memory_used,
         'gpu_mem_total': get_gpu_memory_total,
         'gpu_proc_num': get_gpu_index_process,
+        'gpu_proc_usage': get_gpu_process_usage,
         'gpu_util_mem': get_gpu_util_mem,
         'mig_mode': get_gpu_mig_mode_current,
         'gpu_name': get_gpu_model_name,
@@ -1265,6 +1346,40 @@ def get_mig_info(atomic_param_list: list) -> list:
     return []
 
 
+def get_gpu_data(plugin_data, atomic_param_list, input_params_set):
+    gpu_info = get_gpu_info(atomic_param_list)
+    mig_info = get_mig_info(atomic_param_list)
+    gpu_para_list = []
+    for i in atomic_param_list:
+        if METRIC_MAP.get(i):
+            gpu_para_list.append(i)
+    for index, value in enumerate(gpu_para_list):
+        if gpu_info:
+            content_need = [f'{i[0]},{i[index + 1]}' for i in gpu_info]
+            if content_need:
+                gpu_handle_map[value](plugin_data=plugin_data,
+                                      content=content_need)
+    for value in atomic_param_list:
+        if value not in gpu_para_list:
+            gpu_handle_map[value](plugin_data=plugin_data,
+                                  mig_resource_out=mig_info)
+
+    if list(input_params_set)[0] == 0:
+        format_output(plugin_data)
+
+
+def get_gpu_dynamic(plugin_data, verbose):
+    MetricsBase.verbose = verbose
+    get_gpu_data(plugin_data, PARAMS_MAP['gpu_dynamic'],
+                 {OUTPUT_MAP['gpu_dynamic']})
+
+
+def get_mig_resource(plugin_data, verbose):
+    MetricsBase.verbose = verbose
+    get_gpu_data(plugin_data, PARAMS_MAP['mig_resource'],
+                 {OUTPUT_MAP['mig_resource']})
+
+
 def main():
     parser = argparse.ArgumentParser()
     add_argument(parser)
@@ -1276,25 +1391,7 @@ def main():
     atomic_param_list, input_params_set = handle_params(args)
 
     if atomic_param_list:
-        gpu_info = get_gpu_info(atomic_param_list)
-        mig_info = get_mig_info(atomic_param_list)
-        gpu_para_list = []
-        for i in atomic_param_list:
-            if METRIC_MAP.get(i):
-                gpu_para_list.append(i)
-        for index, value in enumerate(gpu_para_list):
-            if gpu_info:
-                content_need = [f'{i[0]},{i[index + 1]}' for i in gpu_info]
-                if content_need:
-                    gpu_handle_map[value](plugin_data=plugin_data,
-                                          content=content_need)
-        for value in atomic_param_list:
-            if value not in gpu_para_list:
-                gpu_handle_map[value](plugin_data=plugin_data,
-                                      mig_resource_out=mig_info)
-
-        if list(input_params_set)[0] == 0:
-            format_output(plugin_data)
+        get_gpu_data(plugin_data, atomic_param_list, input_params_set)
 
     plugin_data.exit()
 
@@ -0,0 +1,456 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import time
+from collections import defaultdict
+
+import defusedxml.ElementTree as ET
+
+from lico.monitor.plugins.icinga.helper.base import MetricsBase
+from lico.monitor.plugins.icinga.helper.state import StateFile
+
+try:
+    import pynvml
+except ModuleNotFoundError:
+    pynvml = None
+
+MEMORY_UNITS = {'KiB': 1 / 1024, 'MiB': 1, 'GiB': 1024, 'TiB': 1024 ** 2}
+# | -> I 0/1          | GPU Instance (EntityID: 0)   |
+DCGM_GI_PATTERN = re.compile(
+    r'->\s*I\s+(\d+)/(\d+)\s*\|\s*GPU Instance \(EntityID:\s*(\d+)\)')
+# GPU-I 0    0.152
+DCGM_DMON_PATTERN = re.compile(r'GPU-I\s+(\d+)\s+([\d.]+)')
+DCGM_SM_ACTIVE = '1002'
+
+
+def _text(element, path, default=None):
+    child = element.find(path)
+    if child is None or child.text is None:
+        return default
+    return child.text.strip()
+
+
+def to_mib(text):
+    """
+    '20096 MiB' -> 20096, or 0 if the size is not available
+    """
+    try:
+        size, unit = text.split()
+        return int(float(size) * MEMORY_UNITS[unit])
+    except (AttributeError, KeyError, ValueError):
+        return 0
+
+
+class MigProcess:
+    __slots__ = ['pid', 'gpu_instance_id', 'compute_instance_id',
+                 'used_memory']
+
+    def __init__(self, pid, gpu_instance_id, compute_instance_id,
+                 used_memory):
+        self.pid = pid
+        self.gpu_instance_id = gpu_instance_id
+        self.compute_instance_id = compute_instance_id
+        # unit: MiB
+        self.used_memory = used_memory
+
+
+class MigInstance:
+    """
+    A compute instance of a GPU instance, shown as a MIG device.
+    """
+    __slots__ = ['mig_device', 'gpu_instance_id', 'compute_instance_id',
+                 'sm_count', 'memory_total', 'memory_used', 'processes']
+
+    def __init__(self, mig_device, gpu_instance_id, compute_instance_id,
+                 sm_count, memory_total, memory_used):
+        self.mig_device = mig_device
+        self.gpu_instance_id = gpu_instance_id
+        self.compute_instance_id = compute_instance_id
+        self.sm_count = sm_count
+        # '20096 MiB', as reported by nvidia-smi
+        self.memory_total = memory_total
+        self.memory_used = memory_used
+        self.processes = []
+
+    @property
+    def gi_ci_id(self):
+        return f'{self.gpu_instance_id}/{self.compute_instance_id}'
+
+
+class MigGPU:
+    __slots__ = ['index', 'uuid', 'mig_enabled', 'instances']
+
+    def __init__(self, index, uuid, mig_enabled):
+        # nvidia-smi index of the GPU, which is the NVML index
+        self.index = index
+        self.uuid = uuid
+        self.mig_enabled = mig_enabled
+        # {'gi_id/ci_id': MigInstance}
+        self.instances = dict()
+
+    @property
+    def sm_total(self):
+        return sum(i.sm_count for i in self.instances.values())
+
+
+class MigTopology(MetricsBase):
+    """
+    GPU -> GPU instance / compute instance -> SM count, memory and
+    processes, parsed from the XML output of nvidia-smi -q.
+    The GPU and compute instances only change with the driver or the MIG
+    config, so when NVML is available they are kept between the runs in a
+    state file keyed by both, and a run only reads the memory used and the
+    processes of the MIG devices by NVML.
+    """
+    state = StateFile('nvidia_mig_topology.json')
+    _cache = None
+
+    def __init__(self, gpus):
+        self.gpus = gpus
+
+    def mig_gpus(self):
+        return [gpu for gpu in self.gpus if gpu.mig_enabled]
+
+    @classmethod
+    def _parse_instance(cls, mig_element):
+        sm_count = _text(
+            mig_element, 'device_attributes/shared/multiprocessor_count')
+        memory_total = _text(mig_element, 'fb_memory_usage/total')
+        if sm_count is None or memory_total is None:
+            return None
+        return MigInstance(
+            mig_device=_text(mig_element, 'index'),
+            gpu_instance_id=_text(mig_element, 'gpu_instance_id'),
+            compute_instance_id=_text(mig_element, 'compute_instance_id'),
+            sm_count=int(sm_count),
+            memory_total=memory_total,
+            memory_used=_text(mig_element, 'fb_memory_usage/used', ''),
+        )
+
+    @classmethod
+    def _parse_gpu(cls, index, gpu_element):
+        gpu = MigGPU(
+            index=str(index),
+            uuid=_text(gpu_element, 'uuid'),
+            mig_enabled=_text(gpu_element, 'mig_mode/current_mig') ==
+            'Enabled'
+        )
+        if not gpu.mig_enabled:
+            return gpu
+        for mig_element in gpu_element.iterfind('mig_devices/mig_device'):
+            instance = cls._parse_instance(mig_element)
+            if instance is not None:
+                gpu.instances[instance.gi_ci_id] = instance
+        for proc_element in gpu_element.iterfind('processes/process_info'):
+            process = MigProcess(
+                pid=_text(proc_element, 'pid'),
+                gpu_instance_id=_text(proc_element, 'gpu_instance_id'),
+                compute_instance_id=_text(
+                    proc_element, 'compute_instance_id'),
+                used_memory=to_mib(_text(proc_element, 'used_memory'))
+            )
+            instance = gpu.instances.get(
+                f'{process.gpu_instance_id}/{process.compute_instance_id}')
+            if instance is not None and process.pid:
+                instance.processes.append(process)
+        return gpu
+
+    @classmethod
+    def from_xml(cls, content):
+        root = ET.fromstring(content)
+        # The GPUs are listed in the order of their nvidia-smi index
+        return cls([
+            cls._parse_gpu(index, e)
+            for index, e in enumerate(root.iterfind('gpu'))
+        ])
+
+    def to_state(self):
+        return [{
+            'index': gpu.index,
+            'uuid': gpu.uuid,
+            'mig_enabled': gpu.mig_enabled,
+            'instances': [
+                [i.mig_device, i.gpu_instance_id, i.compute_instance_id,
+                 i.sm_count, i.memory_total]
+                for i in gpu.instances.values()
+            ]
+        } for gpu in self.gpus]
+
+    @classmethod
+    def from_state(cls, gpus):
+        topology = cls([])
+        for gpu_state in gpus:
+            gpu = MigGPU(gpu_state['index'], gpu_state['uuid'],
+                         gpu_state['mig_enabled'])
+            for mig_device, gi, ci, sm_count, memory_total in \
+                    gpu_state['instances']:
+                instance = MigInstance(mig_device, gi, ci, sm_count,
+                                       memory_total, '')
+                gpu.instances[instance.gi_ci_id] = instance
+            topology.gpus.append(gpu)
+        return topology
+
+    @classmethod
+    def _query(cls):
+        out, err, ret = cls.command_call(['nvidia-smi', '-q', '-x'])
+        if ret:
+            cls.print_err(out + err)
+            return None
+        try:
+            return cls.from_xml(out)
+        except ET.ParseError as e:
+            cls.print_err(e)
+            return None
+
+    @classmethod
+    def _nvml_mig_devices(cls, handle):
+        """
+        return example:
+        (['MIG-3c2b...'],  # UUID of the MIG devices
+         {'1/0': ('13 MiB', [MigProcess])})  # gi id/ci id: memory used
+        """
+        uuids = []
+        mig_devices = dict()
+        for i in range(pynvml.nvmlDeviceGetMaxMigDeviceCount(handle)):
+            try:
+                mig_handle = pynvml.nvmlDeviceGetMigDeviceHandleByIndex(
+                    handle, i)
+            except pynvml.NVMLError_NotFound:
+                continue
+            uuids.append(str(pynvml.nvmlDeviceGetUUID(mig_handle)))
+            gi = str(pynvml.nvmlDeviceGetGpuInstanceId(mig_handle))
+            ci = str(pynvml.nvmlDeviceGetComputeInstanceId(mig_handle))
+            memory = pynvml.nvmlDeviceGetMemoryInfo(mig_handle)
+            processes = [
+                MigProcess(str(p.pid), gi, ci,
+                           (p.usedGpuMemory or 0) // 1024 ** 2)
+                for p in pynvml.nvmlDeviceGetComputeRunningProcesses(
+                    mig_handle)
+            ]
+            mig_devices[f'{gi}/{ci}'] = (
+                f'{memory.used // 1024 ** 2} MiB', processes)
+        return sorted(uuids), mig_devices
+
+    @classmethod
+    def _nvml_usage(cls):
+        """
+        Read the MIG devices of the GPUs by NVML.
+        return: (the driver and MIG config, {gpu index: MIG devices}), or
+        None if NVML is not available.
+        """
+        if pynvml is None:
+            return None
+        try:
+            pynvml.nvmlInit()
+        except pynvml.NVMLError as e:
+            cls.print_err(e)
+            return None
+        try:
+            config = [str(pynvml.nvmlSystemGetDriverVersion())]
+            usage = dict()
+            for i in range(pynvml.nvmlDeviceGetCount()):
+                handle = pynvml.nvmlDeviceGetHandleByIndex(i)
+                try:
+                    mig_mode = pynvml.nvmlDeviceGetMigMode(handle)[0]
+                except pynvml.NVMLError_NotSupported:
+                    mig_mode = pynvml.NVML_DEVICE_MIG_DISABLE
+                mig_uuids = []
+                if mig_mode == pynvml.NVML_DEVICE_MIG_ENABLE:
+                    mig_uuids, usage[str(i)] = cls._nvml_mig_devices(handle)
+                config.append(
+                    [str(pynvml.nvmlDeviceGetUUID(handle)), mig_uuids])
+            return config, usage
+        except (pynvml.NVMLError, AttributeError) as e:
+            # AttributeError: pynvml is too old to support MIG
+            cls.print_err(e)
+            return None
+        finally:
+            pynvml.nvmlShutdown()
+
+    @classmethod
+    def _load_state(cls, config):
+        state = cls.state.load()
+        if state.get('config') == config:
+            return cls.from_state(state['gpus'])
+        topology = cls._query()
+        if topology is not None:
+            cls.state.save({'config': config, 'gpus': topology.to_state()})
+        return topology
+
+    def _set_usage(self, usage):
+        for gpu in self.gpus:
+            mig_devices = usage.get(gpu.index, {})
+            for gi_ci_id, instance in gpu.instances.items():
+                instance.memory_used, instance.processes = \
+                    mig_devices.get(gi_ci_id, ('', []))
+
+    @classmethod
+    def load(cls, refresh=False):
+        """
+        The topology is loaded once for a run of a plugin, as the processes
+        in it change between the runs. Return None if nvidia-smi fails.
+        """
+        if cls._cache is None or refresh:
+            usage = cls._nvml_usage()
+            if usage is None:
+                cls._cache = cls._query()
+                return cls._cache
+            config, mig_devices = usage
+            cls._cache = cls._load_state(config)
+            if cls._cache is not None:
+                cls._cache._set_usage(mig_devices)
+        return cls._cache
+
+
+class MigActivity(MetricsBase):
+    """
+    SM activity of each MIG GPU instance.
+    The activity is sampled by NVML GPM if pynvml is installed and the GPU
+    supports it (Hopper and later), or else by the SM_ACTIVE field of
+    dcgmi dmon. A GPU instance which can not be sampled has no activity,
+    rather than a made up one.
+    """
+    # Interval between the two GPM samples of a GPU instance
+    gpm_interval = 0.1
+    # The GPU instances only change when MIG is reconfigured, the mapping
+    # of the DCGM entities is cached between the runs
+    entity_state = StateFile('dcgm_mig_entities.json')
+    entity_ttl = 300
+
+    @classmethod
+    def sample(cls, gpu_instances):
+        """
+        gpu_instances: [(gpu index, gpu instance id), ...]
+        return example:
+        {'0/1': 35.2}  # gpu index/gpu instance id: SM activity in %
+        """
+        if not gpu_instances:
+            return {}
+        activity = cls._sample_gpm(gpu_instances)
+        missing = [
+            (gpu, gi) for gpu, gi in gpu_instances
+            if f'{gpu}/{gi}' not in activity
+        ]
+        if missing:
+            activity.update(cls._sample_dcgm(missing))
+        return activity
+
+    @classmethod
+    def _gpm_samples(cls, gpu_instances, samples):
+        """
+        Take the first samples of the GPU instances, the allocated samples
+        are added to samples, so they are freed even if one fails.
+        """
+        wanted = defaultdict(set)
+        for gpu, gi in gpu_instances:
+            wanted[str(gpu)].add(int(gi))
+        for i in range(pynvml.nvmlDeviceGetCount()):
+            handle = pynvml.nvmlDeviceGetHandleByIndex(i)
+            # The NVML index is the nvidia-smi index of the topology
+            gpu = str(i)
+            if gpu not in wanted or \
+                    not pynvml.nvmlGpmQueryDeviceSupport(
+                        handle).isSupportedDevice:
+                continue
+            for gi in wanted[gpu]:
+                sample = pynvml.nvmlGpmSampleAlloc()
+                samples.append((gpu, gi, handle, sample))
+                pynvml.nvmlGpmMigSampleGet(handle, gi, sample)
+
+    @classmethod
+    def _gpm_activity(cls, handle, gi, sample1):
+        sample2 = pynvml.nvmlGpmSampleAlloc()
+        try:
+            pynvml.nvmlGpmMigSampleGet(handle, gi, sample2)
+            metrics = pynvml.c_nvmlGpmMetricsGet_t()
+            metrics.version = pynvml.NVML_GPM_METRICS_GET_VERSION
+            metrics.numMetrics = 1
+            metrics.sample1 = sample1
+            metrics.sample2 = sample2
+            metrics.metrics[0].metricId = pynvml.NVML_GPM_METRIC_SM_UTIL
+            pynvml.nvmlGpmMetricsGet(metrics)
+            return round(metrics.metrics[0].value, 1)
+        finally:
+            pynvml.nvmlGpmSampleFree(sample2)
+
+    @classmethod
+    def _sample_gpm(cls, gpu_instances):
+        activity = dict()
+        if pynvml is None:
+            return activity
+        try:
+            pynvml.nvmlInit()
+        except pynvml.NVMLError as e:
+            cls.print_err(e)
+            return activity
+        samples = []
+        try:
+            cls._gpm_samples(gpu_instances, samples)
+            if samples:
+                time.sleep(cls.gpm_interval)
+            for gpu, gi, handle, sample1 in samples:
+                activity[f'{gpu}/{gi}'] = cls._gpm_activity(
+                    handle, gi, sample1)
+        except (pynvml.NVMLError, AttributeError) as e:
+            # AttributeError: pynvml is too old to support GPM
+            cls.print_err(e)
+        finally:
+            for _, _, _, sample in samples:
+                pynvml.nvmlGpmSampleFree(sample)
+            pynvml.nvmlShutdown()
+        return activity
+
+    @classmethod
+    def _dcgm_entities(cls):
+        """
+        return example:
+        {'0/1': '0'}  # gpu index/gpu instance id: DCGM entity id
+        """
+        state = cls.entity_state.load()
+        if time.time() - state.get('time', 0) < cls.entity_ttl:
+            return state.get('entities', {})
+        out, err, ret = cls.command_call(['dcgmi', 'discovery', '-c'])
+        if ret:
+            cls.print_err(out + err)
+            return {}
+        entities = {
+            f'{gpu}/{gi}': entity
+            for gpu, gi, entity in DCGM_GI_PATTERN.findall(out.decode())
+        }
+        cls.entity_state.save({'time': time.time(), 'entities': entities})
+        return entities
+
+    @classmethod
+    def _sample_dcgm(cls, gpu_instances):
+        entities = cls._dcgm_entities()
+        entity_gi = {
+            entities[f'{gpu}/{gi}']: f'{gpu}/{gi}'
+            for gpu, gi in gpu_instances if f'{gpu}/{gi}' in entities
+        }
+        if not entity_gi:
+            return {}
+        out, err, ret = cls.command_call([
+            'dcgmi', 'dmon', '-e', DCGM_SM_ACTIVE, '-c', '1',
+            '-i', ','.join(f'i:{entity}' for entity in entity_gi)
+        ])
+        if ret:
+            cls.print_err(out + err)
+            return {}
+        # SM_ACTIVE is a ratio in [0, 1]
+        return {
+            entity_gi[entity]: round(float(value) * 100, 1)
+            for entity, value in DCGM_DMON_PATTERN.findall(out.decode())
+            if entity in entity_gi
+        }
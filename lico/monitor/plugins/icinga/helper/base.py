@@ -13,10 +13,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import sys
+import time
+from abc import ABCMeta, abstractmethod
 from enum import IntEnum
 from subprocess import PIPE, Popen  # nosec B404
 
+from lico.monitor.plugins.icinga.helper.state import StateFile
+
 
 class MetricsBase:
     verbose = False
@@ -68,6 +73,7 @@ class PluginData:
     def __init__(self):
         self._output_data = list()
         self._perf_data = list()
+        self._points = list()
         self._state = StateEnum.OK
 
     def add_output_data(self, data):
@@ -88,6 +94,20 @@ class PluginData:
     def get_perf_data(self):
         return " ".join(self._perf_data)
 
+    def add_point(self, point, name=None, **labels):
+        """
+        Keep a point of MetricsBase.build_point for the exporter, with the
+        entities it belongs to as labels instead of being encoded in its
+        name, e.g. add_point(point, 'gpu_temp', gpu='0') for 'gpu0_temp'.
+        """
+        self._points.append(dict(
+            point, metric=name or point['metric'],
+            labels={k: str(v) for k, v in labels.items()}
+        ))
+
+    def get_points(self):
+        return self._points
+
     def set_state(self, state: StateEnum):
         if state > self._state:
             self._state = state
@@ -95,12 +115,204 @@ class PluginData:
     def get_state(self):
         return self._state.name
 
+    def get_exit_status(self):
+        return int(self._state)
+
+    def merge(self, plugin_data):
+        self._output_data += plugin_data._output_data
+        self._perf_data += plugin_data._perf_data
+        self._points += plugin_data._points
+        self.set_state(plugin_data._state)
+
     def get_plugin_output(self):
         if self._output_data:
             return f"[{self.get_state()}] - " + self.get_output_data() + \
                    " | " + self.get_perf_data()
 
-    def exit(self):
-        plugin_output = self.get_plugin_output()
+    def exit(self, sink=None):
+        if sink is None:
+            plugin_output = self.get_plugin_output()
+            if plugin_output:
+                print(plugin_output)
+        else:
+            sink.emit(self)
+            sink.flush()
+
+
+class OutputSink(metaclass=ABCMeta):
+    """
+    Where the output of the plugins goes. The output of several services,
+    or of several hosts, may be emitted before the sink is flushed.
+    """
+    host = None
+    check_source = None
+
+    def build_result(self, plugin_data, service=None, host=None):
+        """
+        The output as a passive check result of the Icinga 2 API.
+        """
+        host = host or self.host
+        result = {
+            'exit_status': plugin_data.get_exit_status(),
+            'plugin_output':
+                f"[{plugin_data.get_state()}] - "
+                f"{plugin_data.get_output_data()}",
+            'performance_data': plugin_data.get_perf_data(),
+            'check_source': self.check_source or host,
+            'execution_end': time.time()
+        }
+        if service:
+            result.update(type='Service', service=f'{host}!{service}')
+        else:
+            result.update(type='Host', host=host)
+        return result
+
+    @abstractmethod
+    def emit(self, plugin_data, service=None, host=None):
+        """
+        Queue or write the output of a service, or of a host if service is
+        None.
+        """
+
+    def flush(self):
+        return True
+
+
+class StdoutSink(OutputSink):
+
+    def emit(self, plugin_data, service=None, host=None):
+        plugin_output = plugin_data.get_plugin_output()
+        name = '!'.join(i for i in (host, service) if i)
         if plugin_output:
-            print(plugin_output)
+            print(f"{name}: {plugin_output}" if name else plugin_output)
+
+
+class FileSink(OutputSink, MetricsBase):
+    """
+    Append the output to a file as passive check results, one JSON
+    document in a line, to be submitted later.
+    """
+
+    def __init__(self, path, host=None, check_source=None):
+        self.path = path
+        self.host = host
+        self.check_source = check_source
+        self._queue = list()
+
+    def emit(self, plugin_data, service=None, host=None):
+        if plugin_data.get_plugin_output():
+            self._queue.append(
+                self.build_result(plugin_data, service, host))
+
+    def flush(self):
+        try:
+            with open(self.path, 'a') as f:
+                for result in self._queue:
+                    f.write(json.dumps(result) + '\n')
+        except OSError as e:
+            self.print_err(e)
+            return False
+        self._queue = list()
+        return True
+
+
+class IcingaPushSink(OutputSink, MetricsBase):
+    """
+    Submit the output as passive check results to the
+    /v1/actions/process-check-result of the Icinga 2 API.
+
+    The API takes one result in a request, the results are queued and
+    sent in batches of batch_size over the keep-alive connection of one
+    session. The results which can not be sent, as the API is unreachable
+    or unavailable, are kept in a spool file and sent first by the next
+    flush, with the time they were checked. The spool file is shared by
+    the plugins, it is locked for each read-modify-write.
+    """
+    api_path = '/v1/actions/process-check-result'
+
+    def __init__(self, url, host, auth=None, verify=True, timeout=10,
+                 batch_size=50, spool='icinga_spool.json', spool_limit=10000,
+                 check_source=None):
+        self.url = url.rstrip('/')
+        self.host = host
+        self.auth = auth
+        self.verify = verify
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.spool = StateFile(spool) if spool else None
+        self.spool_limit = spool_limit
+        self.check_source = check_source
+        self._queue = list()
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            # requests is only needed by the push mode, it is not imported
+            # by every plugin
+            import requests
+            self._session = requests.Session()
+            self._session.auth = self.auth
+            self._session.verify = self.verify
+            self._session.headers.update({'Accept': 'application/json'})
+        return self._session
+
+    def emit(self, plugin_data, service=None, host=None):
+        if not plugin_data.get_plugin_output():
+            return
+        self._queue.append(self.build_result(plugin_data, service, host))
+        if len(self._queue) >= self.batch_size:
+            self.flush()
+
+    def _post(self, result):
+        """
+        Return False if the result should be sent again later.
+        """
+        import requests
+        try:
+            response = self.session.post(
+                self.url + self.api_path, json=result, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.print_err(e)
+            return False
+        if response.status_code >= 500:
+            self.print_err(response.text)
+            return False
+        if not response.ok:
+            # The result is rejected, e.g. the object does not exist,
+            # sending it again does not help
+            self.print_err(response.text)
+        return True
+
+    def _take_spool(self):
+        """
+        Return the spooled results and empty the spool, the other plugins
+        do not send them again.
+        """
+        if self.spool is None:
+            return []
+        with self.spool.lock():
+            results = self.spool.load().get('results', [])
+            if results:
+                self.spool.save({'results': []})
+        return results
+
+    def _add_spool(self, results):
+        if self.spool is None:
+            return
+        with self.spool.lock():
+            # The results spooled by the other plugins in the meantime
+            # are kept
+            results = self.spool.load().get('results', []) + results
+            # The oldest results are dropped if the API is unreachable for
+            # long
+            self.spool.save({'results': results[-self.spool_limit:]})
+
+    def flush(self):
+        results = self._take_spool() + self._queue
+        self._queue = list()
+        for i, result in enumerate(results):
+            if not self._post(result):
+                self._add_spool(results[i:])
+                return False
+        return True
@@ -0,0 +1,163 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+METRIC_PREFIX = 'lico'
+
+# unit of the points: (unit of the metric, scale)
+UNITS = {
+    'B': ('bytes', 1),
+    'KiB': ('bytes', 1024),
+    'MiB': ('bytes', 1024 ** 2),
+    'GiB': ('bytes', 1024 ** 3),
+    '%': ('percent', 1),
+    'C': ('celsius', 1),
+    'W': ('watts', 1),
+    'J': ('joules', 1),
+    's': ('seconds', 1),
+    'V': ('volts', 1),
+    'A': ('amperes', 1),
+    'RPM': ('rpm', 1),
+    'mJ': ('joules', 0.001),
+}
+# The points which are cumulative, e.g. the energy consumed since a start,
+# the other points are gauges
+COUNTERS = {
+    'job_gpu_energy',
+}
+
+
+def _sanitize(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name.strip()).lower()
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n') \
+        .replace('"', r'\"')
+
+
+def build_samples(points):
+    """
+    Build the samples of the points kept by PluginData.add_point, the
+    points whose value is not a number are skipped.
+    return example:
+    [('lico_job_gpu_util_percent', {'job': '3350_1', 'gpu': '0'}, 45.0,
+      'percent', 'gauge')]
+    """
+    samples = []
+    for point in points:
+        if point.get('type') == 'string':
+            continue
+        try:
+            value = float(point['value'])
+        except (TypeError, ValueError):
+            continue
+        unit, scale = UNITS.get(str(point.get('units', '')).strip(), ('', 1))
+        metric = f"{METRIC_PREFIX}_{_sanitize(point['metric'])}"
+        if unit and not metric.endswith(f'_{unit}'):
+            metric += f'_{unit}'
+        kind = 'counter' if point['metric'] in COUNTERS else 'gauge'
+        samples.append(
+            (metric, point.get('labels', {}), value * scale, unit, kind))
+    return samples
+
+
+def render(samples):
+    families = OrderedDict()
+    for metric, labels, value, unit, kind in samples:
+        families.setdefault((metric, unit, kind), []).append((labels, value))
+    lines = []
+    for (metric, unit, kind), metric_samples in families.items():
+        lines.append(f'# TYPE {metric} {kind}')
+        if unit:
+            lines.append(f'# UNIT {metric} {unit}')
+        # The sample of a counter is suffixed by _total
+        name = f'{metric}_total' if kind == 'counter' else metric
+        for labels, value in metric_samples:
+            label_text = ','.join(
+                f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(
+                f'{name}{{{label_text}}} {value}' if label_text
+                else f'{name} {value}')
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+class OpenMetricsExporter:
+    """
+    Expose the points of the collectors as OpenMetrics text.
+
+    The collectors run when the metrics are scraped, at most once in
+    min_interval seconds. The scrapes in the interval, or waiting for a
+    running collection, get the cached metrics, so several scrapers do
+    not multiply the load of the node.
+    collect: a callable which returns the PluginData of the collectors
+    """
+
+    def __init__(self, collect, min_interval=15):
+        self.collect = collect
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._text = None
+        self._time = None
+
+    def scrape(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._text is None or now - self._time >= self.min_interval:
+                samples = []
+                for plugin_data in self.collect():
+                    samples += build_samples(plugin_data.get_points())
+                self._text = render(samples)
+                self._time = time.monotonic()
+            return self._text
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def serve(exporter, address='localhost', port=9110):
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            try:
+                body = exporter.scrape().encode()
+            except Exception as e:
+                self.send_error(500, explain=str(e))
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,67 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from lico.monitor.plugins.icinga.helper.state import StateFile
+
+
+class BMCHost:
+    __slots__ = ['address', 'name']
+
+    def __init__(self, address, name=None):
+        self.address = address
+        # name of the host in Icinga 2
+        self.name = name or address
+
+
+def load_hosts(path):
+    """
+    One BMC in a line, as "<BMC address> [<host name>]", the host name is
+    the BMC address if it is omitted. The lines starting with # are
+    comments.
+    """
+    hosts = []
+    with open(path, 'r') as f:
+        for line in f:
+            fields = line.split('#', 1)[0].split()
+            if fields:
+                hosts.append(BMCHost(*fields[:2]))
+    return hosts
+
+
+class Backoff:
+    """
+    The BMCs which failed are not polled again until the backoff time,
+    doubled at each consecutive failure, up to max_delay.
+    """
+
+    def __init__(self, name, base_delay=60, max_delay=3600):
+        self.state = StateFile(name)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # {BMC address: {'failures': 2, 'next': 1700000000.0}}
+        self._hosts = self.state.load()
+
+    def ready(self, address, now):
+        return self._hosts.get(address, {}).get('next', 0) <= now
+
+    def failed(self, address, now):
+        failures = self._hosts.get(address, {}).get('failures', 0) + 1
+        delay = min(self.base_delay * 2 ** (failures - 1), self.max_delay)
+        self._hosts[address] = {'failures': failures, 'next': now + delay}
+
+    def succeeded(self, address):
+        self._hosts.pop(address, None)
+
+    def save(self):
+        return self.state.save(self._hosts)
@@ -0,0 +1,68 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import socket
+
+from lico.monitor.plugins.icinga.helper.base import (
+    FileSink, IcingaPushSink, StdoutSink,
+)
+
+ICINGA_PASSWORD_ENV = 'LICO_ICINGA_API_PASSWORD'
+
+
+def add_sink_arguments(parser, host=True):
+    """
+    host: add the --host argument, a plugin which has its own --host gives
+    the host name to get_sink
+    """
+    parser.add_argument('--icinga-url', help="""
+    Push the results to the Icinga 2 API at this URL, e.g.
+    https://icinga:5665, instead of printing them. The password of the API
+    user is read from the environment variable {};
+    """.format(ICINGA_PASSWORD_ENV))
+    parser.add_argument('--icinga-user', help="""
+    API user of Icinga 2;
+    """)
+    parser.add_argument('--icinga-ca', help="""
+    CA certificate to verify the Icinga 2 API, default is the system CA;
+    """)
+    parser.add_argument('--batch-size', type=int, default=50, help="""
+    Number of the results pushed in a batch, default is 50;
+    """)
+    parser.add_argument('--output', help="""
+    Append the results to this file as passive check results of the
+    Icinga 2 API, one JSON document in a line, instead of printing them;
+    """)
+    if host:
+        parser.add_argument('--host', default=socket.gethostname(), help="""
+        Host name of the results in Icinga 2, default is the hostname;
+        """)
+
+
+def get_sink(args, check_source=None, host=None):
+    host = host or args.host
+    if args.icinga_url:
+        # The password is not taken from the command line, which is
+        # visible to all the users of the node
+        auth = (args.icinga_user, os.environ.get(ICINGA_PASSWORD_ENV, '')) \
+            if args.icinga_user else None
+        return IcingaPushSink(
+            args.icinga_url, host, auth=auth,
+            verify=args.icinga_ca or True, batch_size=args.batch_size,
+            check_source=check_source
+        )
+    if args.output:
+        return FileSink(args.output, host, check_source=check_source)
+    return StdoutSink()
@@ -0,0 +1,100 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fcntl
+import json
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+
+STATE_DIR_ENV = 'LICO_MONITOR_STATE_DIR'
+
+
+def get_state_dir():
+    state_dir = os.environ.get(STATE_DIR_ENV) or os.path.join(
+        tempfile.gettempdir(), f'lico-monitor-{os.geteuid()}')
+    os.makedirs(state_dir, mode=0o700, exist_ok=True)
+    # The state may contain credentials, refuse a directory which is
+    # owned by another user or is accessible by others.
+    dir_stat = os.lstat(state_dir)
+    if not stat.S_ISDIR(dir_stat.st_mode) or \
+            dir_stat.st_uid != os.geteuid() or \
+            dir_stat.st_mode & 0o077:
+        raise PermissionError(f'Insecure state directory {state_dir}')
+    return state_dir
+
+
+@contextmanager
+def state_lock(name, state_dir=None):
+    """
+    An exclusive lock of the processes of all the plugins, on a file of
+    the state directory.
+    """
+    fd = os.open(os.path.join(state_dir or get_state_dir(), name),
+                 os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # Closing the file releases the lock
+        os.close(fd)
+
+
+class StateFile:
+    """
+    A JSON document kept between two runs of a plugin.
+    The state is a cache, so failing to load or save it is not an error,
+    the next run just starts from an empty state.
+    """
+
+    def __init__(self, name, state_dir=None):
+        self.name = name
+        self.state_dir = state_dir
+
+    @property
+    def path(self):
+        return os.path.join(self.state_dir or get_state_dir(), self.name)
+
+    def lock(self):
+        """
+        Lock the state for a read-modify-write shared by several processes.
+        """
+        return state_lock(f'{self.name}.lock', self.state_dir)
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def save(self, data):
+        tmp_path = None
+        try:
+            path = self.path
+            # mkstemp creates the file with mode 0600
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(path), prefix=f'.{self.name}.')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+            tmp_path = None
+        except (OSError, TypeError, ValueError):
+            return False
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return True
@@ -81,17 +81,41 @@ class EthernetMetric(MetricsBase):
             send_speed = \
                 sum(latest_data['send_bytes']) - sum(prev_data['send_bytes'])
 
-        return recv_speed, send_speed
+        # The speed of each interface, {'eth0': (recv speed, send speed)}
+        prev_bytes = dict(zip(
+            prev_data['interface'],
+            zip(prev_data['recv_bytes'], prev_data['send_bytes'])))
+        interface_speed = dict()
+        for interface, recv, send in zip(latest_data['interface'],
+                                         latest_data['recv_bytes'],
+                                         latest_data['send_bytes']):
+            if interface in prev_bytes:
+                interface_speed[interface] = (
+                    recv - prev_bytes[interface][0],
+                    send - prev_bytes[interface][1])
+
+        return recv_speed, send_speed, interface_speed
 
     @classmethod
     def eth_recv(cls):
-        eth_read, _ = cls._read_eth_bytes()
-        return [cls.build_point('eth_in', eth_read, 'float', 'B')]
+        """
+        The speed of the node, followed by the speed of each interface,
+        the interface is the index of its point.
+        """
+        eth_read, _, interface_speed = cls._read_eth_bytes()
+        return [cls.build_point('eth_in', eth_read, 'float', 'B')] + [
+            cls.build_point('eth_in', speed[0], 'float', 'B', index=interface)
+            for interface, speed in interface_speed.items()
+        ]
 
     @classmethod
     def eth_send(cls):
-        _, eth_send = cls._read_eth_bytes()
-        return [cls.build_point('eth_out', eth_send, 'float', 'B')]
+        _, eth_send, interface_speed = cls._read_eth_bytes()
+        return [cls.build_point('eth_out', eth_send, 'float', 'B')] + [
+            cls.build_point('eth_out', speed[1], 'float', 'B',
+                            index=interface)
+            for interface, speed in interface_speed.items()
+        ]
 
 
 def eth_recv(verbose):
@@ -106,7 +130,8 @@ def eth_send(verbose):
 
 def get_network_eth_in(plugin_data, verbose):
     try:
-        eth_in_dict = eth_recv(verbose)[0]
+        eth_in_list = eth_recv(verbose)
+        eth_in_dict = eth_in_list[0]
     except Exception as e:
         if verbose:
             raise e
@@ -124,11 +149,14 @@ def get_network_eth_in(plugin_data, verbose):
                 eth_in_dict['units']
             )
         )
+        for point in eth_in_list[1:]:
+            plugin_data.add_point(point, interface=point['index'])
 
 
 def get_network_eth_out(plugin_data, verbose):
     try:
-        eth_out_dict = eth_send(verbose)[0]
+        eth_out_list = eth_send(verbose)
+        eth_out_dict = eth_out_list[0]
     except Exception as e:
         if verbose:
             raise e
@@ -146,6 +174,8 @@ def get_network_eth_out(plugin_data, verbose):
                 eth_out_dict['units']
             )
         )
+        for point in eth_out_list[1:]:
+            plugin_data.add_point(point, interface=point['index'])
 
 
 if __name__ == '__main__':
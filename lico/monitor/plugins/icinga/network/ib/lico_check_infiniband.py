@@ -26,33 +26,51 @@ except ModuleNotFoundError:
 
 
 class InfinibandMetric(MetricsBase):
+    @staticmethod
+    def _read_port_data(counter):
+        """
+        return example:
+        {'mlx5_0/1': 1073741824}  # port: counter of the port
+        """
+        port_data = dict()
+        for dev in get_device_list():
+            for p in dev.ports:
+                ca_name = p.ca_name.decode() \
+                    if isinstance(p.ca_name, bytes) else p.ca_name
+                port_data[f'{ca_name}/{p.portnum}'] = \
+                    getattr(p.io_counters, counter)
+        return port_data
+
     @classmethod
-    def ib_recv(cls):
+    def _ib_speed(cls, metric, counter):
+        """
+        The speed of the node, followed by the speed of each port, the
+        port is the index of its point.
+        """
         try:
-            ib_in_f = sum([p.io_counters.rcv_data
-                           for dev in get_device_list() for p in dev.ports])
+            prev_data = cls._read_port_data(counter)
             time.sleep(1)
-            ib_in_g = sum([p.io_counters.rcv_data
-                           for dev in get_device_list() for p in dev.ports])
-            ib_in = ib_in_g - ib_in_f
+            latest_data = cls._read_port_data(counter)
         except Exception as e:
             cls.print_err(e)
             return []
-        return [cls.build_point('ib_in', ib_in, 'float', 'B')]
+        port_speed = {
+            port: value - prev_data[port]
+            for port, value in latest_data.items() if port in prev_data
+        }
+        return [cls.build_point(
+            metric, sum(port_speed.values()), 'float', 'B')] + [
+            cls.build_point(metric, speed, 'float', 'B', index=port)
+            for port, speed in port_speed.items()
+        ]
+
+    @classmethod
+    def ib_recv(cls):
+        return cls._ib_speed('ib_in', 'rcv_data')
 
     @classmethod
     def ib_send(cls):
-        try:
-            ib_out_f = sum([p.io_counters.xmit_data
-                            for dev in get_device_list() for p in dev.ports])
-            time.sleep(1)
-            ib_out_g = sum([p.io_counters.xmit_data
-                            for dev in get_device_list() for p in dev.ports])
-            ib_out = ib_out_g - ib_out_f
-        except Exception as e:
-            cls.print_err(e)
-            return []
-        return [cls.build_point('ib_out', ib_out, 'float', 'B')]
+        return cls._ib_speed('ib_out', 'xmit_data')
 
 
 def ib_recv(verbose):
@@ -67,7 +85,8 @@ def ib_send(verbose):
 
 def get_network_ib_in(plugin_data, verbose):
     try:
-        ib_in_dict = ib_recv(verbose)[0]
+        ib_in_list = ib_recv(verbose)
+        ib_in_dict = ib_in_list[0]
     except Exception as e:
         if verbose:
             raise e
@@ -85,11 +104,14 @@ def get_network_ib_in(plugin_data, verbose):
                 ib_in_dict['units']
             )
         )
+        for point in ib_in_list[1:]:
+            plugin_data.add_point(point, interface=point['index'])
 
 
 def get_network_ib_out(plugin_data, verbose):
     try:
-        ib_out_dict = ib_send(verbose)[0]
+        ib_out_list = ib_send(verbose)
+        ib_out_dict = ib_out_list[0]
     except Exception as e:
         if verbose:
             raise e
@@ -107,6 +129,8 @@ def get_network_ib_out(plugin_data, verbose):
                 ib_out_dict['units']
             )
         )
+        for point in ib_out_list[1:]:
+            plugin_data.add_point(point, interface=point['index'])
 
 
 if __name__ == '__main__':
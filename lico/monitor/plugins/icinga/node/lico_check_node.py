@@ -0,0 +1,222 @@
+#!/usr/bin/python3
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from lico.monitor.plugins.icinga.base.cpu.lico_check_cpu import (
+    get_cpu_load, get_cpu_util,
+)
+from lico.monitor.plugins.icinga.base.disk.lico_check_disk import (
+    get_disk_total, get_disk_used,
+)
+from lico.monitor.plugins.icinga.base.memory.lico_check_memory import (
+    get_mem_total, get_mem_used,
+)
+from lico.monitor.plugins.icinga.helper.base import MetricsBase, PluginData
+from lico.monitor.plugins.icinga.helper.exporter import (
+    OpenMetricsExporter, serve,
+)
+from lico.monitor.plugins.icinga.helper.output import (
+    add_sink_arguments, get_sink,
+)
+from lico.monitor.plugins.icinga.network.eth.lico_check_ethernet import (
+    get_network_eth_in, get_network_eth_out,
+)
+from lico.monitor.plugins.icinga.network.ib.lico_check_infiniband import (
+    get_network_ib_in, get_network_ib_out,
+)
+
+GPU_COMMANDS = {
+    'nvidia': 'nvidia-smi',
+    'intel': 'xpumcli'
+}
+SCHEDULER_COMMANDS = {
+    'slurm': 'squeue',
+    'pbs': 'qstat',
+    'lsf': 'bjobs'
+}
+
+
+def get_gpu_dynamic(plugin_data, verbose):
+    # The GPU plugins are imported on demand, the XPU plugin calls xpumcli
+    # when it is imported
+    if shutil.which(GPU_COMMANDS['nvidia']):
+        from lico.monitor.plugins.icinga.gpu import lico_check_nvidia_gpu
+        lico_check_nvidia_gpu.get_gpu_dynamic(plugin_data, verbose)
+    elif shutil.which(GPU_COMMANDS['intel']):
+        from lico.monitor.plugins.icinga.gpu import lico_check_intel_xpu
+        lico_check_intel_xpu.get_gpu_dynamic(plugin_data, verbose)
+
+
+def get_gpu_partition(plugin_data, verbose):
+    # The MIG devices of the NVIDIA GPUs, or the tiles of the Intel XPUs
+    if shutil.which(GPU_COMMANDS['nvidia']):
+        from lico.monitor.plugins.icinga.gpu import lico_check_nvidia_gpu
+        lico_check_nvidia_gpu.get_mig_resource(plugin_data, verbose)
+    elif shutil.which(GPU_COMMANDS['intel']):
+        from lico.monitor.plugins.icinga.gpu import lico_check_intel_xpu
+        lico_check_intel_xpu.get_xpu_tile_info(plugin_data, verbose)
+
+
+def get_job_dynamic(plugin_data, verbose):
+    # The jobs of the scheduler of the node, the scheduler plugins are
+    # imported on demand as the GPU plugins
+    args = argparse.Namespace(verbose=verbose, discovery='auto', step=False,
+                              source='auto', all_hosts=False)
+    if shutil.which(SCHEDULER_COMMANDS['slurm']):
+        from lico.monitor.plugins.icinga.scheduler.slurm import (
+            lico_check_slurm,
+        )
+        lico_check_slurm.get_slurm_job_info(plugin_data, args)
+    elif shutil.which(SCHEDULER_COMMANDS['pbs']):
+        from lico.monitor.plugins.icinga.scheduler.pbs import lico_check_pbs
+        lico_check_pbs.get_pbs_job_info(plugin_data, args)
+    elif shutil.which(SCHEDULER_COMMANDS['lsf']):
+        from lico.monitor.plugins.icinga.scheduler.lsf import lico_check_lsf
+        lico_check_lsf.get_lsf_job_info(plugin_data, args)
+
+
+# The same metrics as the dynamic mode of each plugin, each function is a
+# task of the thread pool, as most of them sleep between two samples or
+# wait for a command
+COLLECTORS = {
+    'cpu': [get_cpu_load, get_cpu_util],
+    'memory': [get_mem_total, get_mem_used],
+    'disk': [get_disk_total, get_disk_used],
+    'eth': [get_network_eth_in, get_network_eth_out],
+    'ib': [get_network_ib_in, get_network_ib_out],
+    'gpu': [get_gpu_dynamic],
+    'gpu_partition': [get_gpu_partition],
+    'job': [get_job_dynamic],
+}
+# The gpu_partition and job collectors are only run if they are specified
+DEFAULT_COLLECTORS = [
+    name for name in COLLECTORS if name not in ('gpu_partition', 'job')]
+
+
+def _run_task(get_data, verbose):
+    plugin_data = PluginData()
+    get_data(plugin_data, verbose)
+    return plugin_data
+
+
+def collect(collectors, verbose, max_workers=None):
+    """
+    Run the functions of the collectors concurrently.
+    return example:
+    {'cpu': PluginData, 'memory': PluginData}
+    The data of each collector is in the order of its functions, whatever
+    the order they finish in.
+    """
+    tasks = [
+        (name, get_data) for name in collectors
+        for get_data in COLLECTORS[name]
+    ]
+    with ThreadPoolExecutor(
+            max_workers=max_workers or max(len(tasks), 1)) as pool:
+        futures = [
+            (name, pool.submit(_run_task, get_data, verbose))
+            for name, get_data in tasks
+        ]
+        result = {name: PluginData() for name in collectors}
+        for name, future in futures:
+            result[name].merge(future.result())
+    return result
+
+
+def get_node_info(plugin_data, collector_data):
+    for data in collector_data.values():
+        plugin_data.merge(data)
+
+
+def emit_passive(sink, collector_data, service_prefix=''):
+    # One result for each service, to be submitted as passive check results
+    for name, data in collector_data.items():
+        sink.emit(data, service=f'{service_prefix}{name}')
+    sink.flush()
+
+
+def run_exporter(args):
+    exporter = OpenMetricsExporter(
+        lambda: collect(args.collectors, args.verbose).values(),
+        min_interval=args.min_interval
+    )
+    serve(exporter, args.listen, args.port)
+
+
+def parse_collectors(value):
+    collectors = [i.strip() for i in value.split(',') if i.strip()]
+    if not collectors:
+        raise argparse.ArgumentTypeError("no collector is specified")
+    unknown = set(collectors) - set(COLLECTORS)
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown collectors: {','.join(sorted(unknown))}")
+    return list(dict.fromkeys(collectors))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--verbose', action='store_true', help="""
+    Verbose mode;
+    """)
+    parser.add_argument('--collectors', type=parse_collectors,
+                        default=DEFAULT_COLLECTORS,
+                        help="""
+                        Comma-separated collectors to run, default is
+                        {}, the gpu_partition collector gets the metrics of
+                        the MIG devices or the XPU tiles, the job collector
+                        gets the metrics of the jobs of the scheduler of
+                        the node;
+                        """.format(','.join(DEFAULT_COLLECTORS))
+                        )
+    parser.add_argument('--passive', action='store_true', help="""
+    Emit one result for each collector, printed as
+    "<collector>: <plugin output>" or pushed as the result of the service
+    of the collector, instead of one combined output;
+    """)
+    parser.add_argument('--service-prefix', default='', help="""
+    Prefix of the service names of the collectors in passive mode;
+    """)
+    add_sink_arguments(parser)
+    parser.add_argument('--exporter', action='store_true', help="""
+    Run as a resident OpenMetrics exporter serving /metrics over HTTP,
+    the collectors run when the metrics are scraped;
+    """)
+    parser.add_argument('--listen', default='localhost', help="""
+    Address the exporter listens on, default is localhost;
+    """)
+    parser.add_argument('--port', type=int, default=9110, help="""
+    Port the exporter listens on, default is 9110;
+    """)
+    parser.add_argument('--min-interval', type=float, default=15, help="""
+    Minimum interval in seconds between two collections of the exporter,
+    the scrapes in the interval get the cached metrics, default is 15;
+    """)
+    args = parser.parse_args()
+
+    MetricsBase.verbose = args.verbose
+    if args.exporter:
+        run_exporter(args)
+    elif args.passive:
+        emit_passive(get_sink(args),
+                     collect(args.collectors, args.verbose),
+                     args.service_prefix)
+    else:
+        plugin_data = PluginData()
+        get_node_info(plugin_data, collect(args.collectors, args.verbose))
+        plugin_data.exit(get_sink(args))
@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import warnings
+
+warnings.filterwarnings('ignore')
+
+import argparse
+import os
+import socket
+import time
+
+from lico.monitor.plugins.icinga.helper.base import MetricsBase, PluginData
+from lico.monitor.plugins.icinga.helper.fanout import load_hosts
+from lico.monitor.plugins.icinga.helper.output import (
+    add_sink_arguments, get_sink,
+)
+from lico.monitor.plugins.icinga.outband.ipmi.common import SensorReadings
+from lico.monitor.plugins.icinga.outband.ipmi.fanout import IPMIFanout
+from lico.monitor.plugins.icinga.outband.ipmi.health import lico_check_health
+from lico.monitor.plugins.icinga.outband.ipmi.power import lico_check_power
+from lico.monitor.plugins.icinga.outband.ipmi.temperature import (
+    lico_check_temperature,
+)
+
+IPMI_PASSWORD_ENV = 'LICO_IPMI_PASSWORD'
+
+
+def get_ipmi_info(plugin_data, args, sensors=None, strict=False):
+    """
+    strict: raise the IPMI errors, so the fan-out backs off a BMC which
+    fails to respond
+    """
+    # One session and one reading of the sensors for all the metrics, the
+    # health needs all the sensors
+    sensors = sensors or SensorReadings(
+        lazy=not (args.health or args.all))
+    if args.power or args.all:
+        lico_check_power.get_power_info(
+            plugin_data, args.verbose, sensors, strict)
+    if args.temperature or args.all:
+        lico_check_temperature.get_temperature_info(
+            plugin_data, args.verbose, sensors, strict)
+    if args.health or args.all:
+        lico_check_health.get_health_info(
+            plugin_data, args.verbose, sensors, strict)
+
+
+def get_fanout(args):
+    return IPMIFanout(
+        lambda plugin_data, sensors: get_ipmi_info(
+            plugin_data, args, sensors, strict=True),
+        args.user, os.environ.get(IPMI_PASSWORD_ENV, ''),
+        port=args.ipmi_port, concurrency=args.concurrency,
+        timeout=args.timeout, lazy=not (args.health or args.all)
+    )
+
+
+def run_fanout(args):
+    fanout = get_fanout(args)
+    hosts = load_hosts(args.hosts)
+    sink = get_sink(args, check_source=socket.gethostname())
+    try:
+        while True:
+            start = time.monotonic()
+            fanout.run(hosts, sink, args.service)
+            if not args.interval:
+                break
+            time.sleep(max(args.interval - (time.monotonic() - start), 0))
+    finally:
+        fanout.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--verbose', action='store_true', help="""
+    Verbose mode;
+    """)
+    parser.add_argument('--power', action='store_true', help="""
+    Get the power of the node;
+    """)
+    parser.add_argument('--temperature', action='store_true', help="""
+    Get the temperature of the node;
+    """)
+    parser.add_argument('--health', action='store_true', help="""
+    Get health information of the node;
+    """)
+    parser.add_argument('--all', action='store_true', help="""
+    Get the power, temperature and health information of the node;
+    """)
+    parser.add_argument('--hosts', help="""
+    Collect from the BMCs in this file over lanplus instead of the local
+    BMC, one BMC in a line as "<BMC address> [<host name>]". The password
+    of the BMCs is read from the environment variable {};
+    """.format(IPMI_PASSWORD_ENV))
+    parser.add_argument('--user', help="""
+    User of the BMCs;
+    """)
+    parser.add_argument('--ipmi-port', type=int, default=623, help="""
+    Port of the BMCs, default is 623;
+    """)
+    parser.add_argument('--concurrency', type=int, default=64, help="""
+    Number of the BMCs polled at a time, default is 64;
+    """)
+    parser.add_argument('--timeout', type=float, default=60, help="""
+    Timeout in seconds to collect from a BMC, default is 60;
+    """)
+    parser.add_argument('--interval', type=float, default=0, help="""
+    Poll the BMCs every interval seconds, keeping the sessions, instead
+    of polling them once;
+    """)
+    parser.add_argument('--service', help="""
+    Service name of the results of the BMCs in Icinga 2, the results are
+    host results if it is omitted;
+    """)
+    add_sink_arguments(parser)
+    args = parser.parse_args()
+
+    MetricsBase.verbose = args.verbose
+    if args.hosts:
+        run_fanout(args)
+    else:
+        plugin_data = PluginData()
+        get_ipmi_info(plugin_data, args)
+        plugin_data.exit(get_sink(args))
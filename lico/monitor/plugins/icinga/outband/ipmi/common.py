@@ -0,0 +1,143 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+
+import pyghmi.constants as pygconstants
+import pyghmi.exceptions as pygexc
+from pyghmi.ipmi.command import Command
+
+from lico.monitor.plugins.icinga.helper.state import get_state_dir
+from lico.monitor.plugins.icinga.outband.ipmi.sdrcache import SDRCache
+
+PSU_POWER_PATTERN = re.compile(r'PSU\d+_PIN')
+# The first sensor found is the power of the node, or else the sum of the
+# input power of the PSUs
+POWER_SENSORS = ['Sys Power', 'Avg Power', 'Total_Power']
+INLET_TEMP_SENSORS = ['ambient temp', 'inlet_temp']
+
+
+def get_sdr_cache_dir():
+    cache_dir = os.path.join(get_state_dir(), 'sdr')
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    return cache_dir
+
+
+def get_command(bmc=None, userid=None, password=None, port=623):
+    """
+    Open an IPMI session, the local BMC if bmc is None.
+    The SDR repository is cached by SensorReadings, not by pyghmi.
+    """
+    return Command(bmc=bmc, userid=userid, password=password, port=port)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _is_power_sensor(name):
+    return name in POWER_SENSORS or PSU_POWER_PATTERN.match(name)
+
+
+def _is_inlet_temp_sensor(name):
+    return name.lower() in INLET_TEMP_SENSORS
+
+
+class SensorReadings:
+    """
+    The sensor readings of a BMC, read in one session, the power, inlet
+    temperature and health are derived from the same readings.
+    The sensors are located by the SDR cache, the SDR repository is only
+    downloaded when it is changed. If lazy, a metric which needs a few
+    sensors only reads those sensors, until all the sensors are read.
+    """
+
+    def __init__(self, command=None, lazy=True):
+        self._command = command
+        self.lazy = lazy
+        self._readings = None
+        self._sdr_cache = None
+
+    @property
+    def command(self):
+        if self._command is None:
+            self._command = get_command()
+        return self._command
+
+    @property
+    def sdr_cache(self):
+        if self._sdr_cache is None:
+            self._sdr_cache = SDRCache(self.command, get_sdr_cache_dir())
+        return self._sdr_cache
+
+    @property
+    def readings(self):
+        """
+        The readings of all the sensors, as Command.get_sensor_data.
+        """
+        if self._readings is None:
+            readings = self.sdr_cache.read_sensors(lambda name: True)
+            if readings is None:
+                readings = list(self.command.get_sensor_data())
+            else:
+                # The sensors of the OEM handler follow those of the SDR
+                self.command.oem_init()
+                readings += list(self.command._oem.get_sensor_data())
+            self._readings = readings
+        return self._readings
+
+    def select(self, match):
+        if self._readings is None and self.lazy:
+            readings = self.sdr_cache.read_sensors(match)
+            if readings:
+                return readings
+        # The sensors of the OEM handler are not in the SDR
+        return [reading for reading in self.readings if match(reading.name)]
+
+    def power(self):
+        power = 0.0
+        for reading in self.select(_is_power_sensor):
+            if reading.name in POWER_SENSORS:
+                return _to_float(reading.value)
+            power += _to_float(reading.value)
+        return power
+
+    def inlet_temperature(self):
+        for reading in self.select(_is_inlet_temp_sensor):
+            return reading.value
+        return None
+
+    def health(self):
+        """
+        The same summary as Command.get_health, the OEM handler of the BMC
+        may extend it, or replace the assessment of the readings.
+        """
+        summary = {'badreadings': [], 'health': pygconstants.Health.Ok}
+        fallback_readings = []
+        try:
+            self.command.oem_init()
+            fallback_readings = self.command._oem.get_health(summary)
+            for reading in self.readings:
+                if reading.health != pygconstants.Health.Ok:
+                    summary['health'] |= reading.health
+                    summary['badreadings'].append(reading)
+        except pygexc.BypassGenericBehavior:
+            pass
+        if not summary['badreadings']:
+            summary['badreadings'] = fallback_readings
+        return summary
@@ -0,0 +1,123 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lico.monitor.plugins.icinga.helper.base import (
+    MetricsBase, PluginData, StateEnum,
+)
+from lico.monitor.plugins.icinga.helper.fanout import Backoff
+from lico.monitor.plugins.icinga.outband.ipmi.common import (
+    SensorReadings, get_command,
+)
+
+
+class IPMIFanout(MetricsBase):
+    """
+    Collect the metrics of many BMCs over lanplus, with at most
+    concurrency BMCs polled at a time.
+    The session of a BMC is kept for the next polls of a resident
+    collector, until the BMC fails.
+    collect: a callable which takes the PluginData and the SensorReadings
+    of a BMC
+    """
+
+    def __init__(self, collect, userid, password, port=623, concurrency=64,
+                 timeout=60, lazy=True, backoff=None):
+        self.collect = collect
+        self.userid = userid
+        self.password = password
+        self.port = port
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.lazy = lazy
+        self.backoff = backoff or Backoff('ipmi_fanout_backoff.json')
+        self._commands = dict()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def _collect_host(self, address):
+        command = self._commands.get(address)
+        if command is None:
+            command = get_command(address, self.userid, self.password,
+                                  self.port)
+            self._commands[address] = command
+        plugin_data = PluginData()
+        self.collect(plugin_data, SensorReadings(command, lazy=self.lazy))
+        return plugin_data
+
+    def _close_command(self, address):
+        command = self._commands.pop(address, None)
+        if command is None:
+            return
+        try:
+            command.ipmi_session.logout()
+        except Exception as e:
+            self.print_err(f'{address}: {e}\n')
+
+    async def _poll(self, loop, semaphore, host):
+        async with semaphore:
+            future = loop.run_in_executor(
+                self._executor, self._collect_host, host.address)
+            try:
+                plugin_data = await asyncio.wait_for(
+                    asyncio.shield(future), self.timeout)
+            except Exception as e:
+                self.print_err(f'{host.address}: {e}\n')
+                # A worker thread can not be stopped, the slot is held until
+                # it returns, so no more than concurrency threads are
+                # blocked on the BMCs
+                try:
+                    await future
+                except Exception:
+                    pass
+                self._close_command(host.address)
+                self.backoff.failed(host.address, time.time())
+                plugin_data = PluginData()
+                plugin_data.add_output_data(
+                    f"Unable to collect from the BMC {host.address}: "
+                    f"{str(e) or type(e).__name__}")
+                plugin_data.set_state(StateEnum.Unknown)
+                return host, plugin_data
+            self.backoff.succeeded(host.address)
+            return host, plugin_data
+
+    async def _poll_all(self, loop, hosts):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(
+            *[self._poll(loop, semaphore, host) for host in hosts])
+
+    def run(self, hosts, sink, service=None):
+        """
+        Poll the BMCs which are not backed off, and emit the result of each
+        host to sink in one batch.
+        """
+        now = time.time()
+        hosts = [host for host in hosts if self.backoff.ready(
+            host.address, now)]
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(self._poll_all(loop, hosts))
+        finally:
+            loop.close()
+        self.backoff.save()
+        for host, plugin_data in results:
+            sink.emit(plugin_data, service=service, host=host.name)
+        return sink.flush()
+
+    def close(self):
+        for address in list(self._commands):
+            self._close_command(address)
+        self._executor.shutdown()
@@ -20,9 +20,10 @@ import argparse
 import json
 
 import pyghmi.constants as pygconstants
-from pyghmi.ipmi.command import Command
+import pyghmi.exceptions as pygexc
 
 from lico.monitor.plugins.icinga.helper.base import MetricsBase, PluginData
+from lico.monitor.plugins.icinga.outband.ipmi.common import SensorReadings
 
 
 class HealthMetric(MetricsBase):
@@ -42,7 +43,7 @@ class HealthMetric(MetricsBase):
         return health
 
     @classmethod
-    def node_health(cls):
+    def node_health(cls, sensors=None, strict=False):
         try:
             # Example for health_info
             '''
@@ -98,7 +99,7 @@ class HealthMetric(MetricsBase):
             '''
             # The type of the element of badreadings as following:
             # <class 'pyghmi.ipmi.sdr.SensorReading'>
-            health_info = Command().get_health()
+            health_info = (sensors or SensorReadings()).health()
             if 'health' not in health_info:
                 return []
             health_info['health'] = cls._str_health(health_info['health'])
@@ -113,6 +114,9 @@ class HealthMetric(MetricsBase):
                 badreadings[idx] = sensor_info
 
         except Exception as e:
+            # The fan-out backs off a BMC which fails to respond
+            if strict and isinstance(e, pygexc.IpmiException):
+                raise
             cls.print_err(e)
             return []
 
@@ -120,13 +124,17 @@ class HealthMetric(MetricsBase):
             "node_health", critical_count, "string", '', health_info)]
 
 
-def node_health(verbose):
+def node_health(verbose, sensors=None, strict=False):
     HealthMetric.verbose = verbose
-    return HealthMetric.node_health()
+    return HealthMetric.node_health(sensors, strict)
 
 
-def get_health_info(plugin_data, verbose):
-    node_health_dict = node_health(verbose)
+def get_health_info(plugin_data, verbose, sensors=None, strict=False):
+    """
+    strict: raise the IPMI errors, e.g. the BMC does not respond, instead
+    of leaving the health out
+    """
+    node_health_dict = node_health(verbose, sensors, strict)
     if node_health_dict:
         node_health_dict = node_health_dict[0]
         plugin_data.add_output_data(json.dumps(node_health_dict['output']))
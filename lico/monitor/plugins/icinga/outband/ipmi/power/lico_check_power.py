@@ -17,53 +17,38 @@ import warnings
 warnings.filterwarnings('ignore')
 
 import argparse
-import re
 
-from pyghmi.ipmi.command import Command
+import pyghmi.exceptions as pygexc
 
 from lico.monitor.plugins.icinga.helper.base import MetricsBase, PluginData
+from lico.monitor.plugins.icinga.outband.ipmi.common import SensorReadings
 
 
 class PowerMetric(MetricsBase):
     @classmethod
-    def _get_value(cls, value):
+    def node_power(cls, sensors=None, strict=False):
         try:
-            return float(value)
-        except ValueError:
-            return 0.0
-        except TypeError:
-            return 0.0
-
-    @classmethod
-    def node_power(cls):
-        power = 0.0
-        pattern = re.compile(r'PSU\d+_PIN')
-        try:
-            for data_dict in Command().get_sensor_data():
-                if data_dict.name == 'Sys Power':
-                    power = cls._get_value(data_dict.value)
-                    break
-                elif data_dict.name == 'Avg Power':
-                    power = cls._get_value(data_dict.value)
-                    break
-                elif data_dict.name == 'Total_Power':
-                    power = cls._get_value(data_dict.value)
-                    break
-                elif pattern.match(data_dict.name):
-                    power += cls._get_value(data_dict.value)
+            power = (sensors or SensorReadings()).power()
         except Exception as e:
+            # The fan-out backs off a BMC which fails to respond
+            if strict and isinstance(e, pygexc.IpmiException):
+                raise
             cls.print_err(e)
             return []
         return [cls.build_point('node_power', power, 'float', 'W')]
 
 
-def node_power(verbose):
+def node_power(verbose, sensors=None, strict=False):
     PowerMetric.verbose = verbose
-    return PowerMetric.node_power()
+    return PowerMetric.node_power(sensors, strict)
 
 
-def get_power_info(plugin_data, verbose):
-    node_power_dict = node_power(verbose)
+def get_power_info(plugin_data, verbose, sensors=None, strict=False):
+    """
+    strict: raise the IPMI errors, e.g. the BMC does not respond, instead
+    of leaving the power out
+    """
+    node_power_dict = node_power(verbose, sensors, strict)
     if node_power_dict:
         node_power_dict = node_power_dict[0]
         plugin_data.add_output_data(
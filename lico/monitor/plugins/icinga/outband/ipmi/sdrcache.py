@@ -0,0 +1,184 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import struct
+import tempfile
+
+import pyghmi.exceptions as pygexc
+from pyghmi.ipmi import sdr
+
+from lico.monitor.plugins.icinga.helper.base import MetricsBase
+
+
+class _RecordingSDR(sdr.SDR):
+    """
+    The SDR of pyghmi, keeping the raw bytes of each record it downloads
+    from the BMC.
+    """
+
+    def __init__(self, ipmicmd):
+        # (SDREntry, raw record)
+        self.records = []
+        super().__init__(ipmicmd)
+
+    def make_sdr_entry(self, sdrbytes):
+        entry = super().make_sdr_entry(sdrbytes)
+        self.records.append((entry, bytes(sdrbytes)))
+        return entry
+
+
+class SDRCache(MetricsBase):
+    """
+    The sensor records of the SDR repository of a BMC, kept on disk.
+
+    The cache file is a JSON index line followed by the raw bytes of the
+    records of the readable sensors, the most compact form of a record.
+    The index has the add and erase timestamps of the repository, it is
+    rebuilt when the repository is changed. A record is decoded only when
+    its sensor is read, so reading a few sensors does not decode the whole
+    repository.
+    The repository is checked once for the session of the command, the
+    records are kept in memory for the next reads.
+    """
+
+    def __init__(self, command, cache_dir):
+        self.command = command
+        self.cache_dir = cache_dir
+        self._device = None
+        # (index, raw records) of the current repository, None if it can
+        # not be cached
+        self._records = None
+        self._checked = False
+
+    def _read_device(self):
+        # Get Device ID
+        data = bytearray(self.command.xraw_command(netfn=6, command=1)['data'])
+        mfg_id = data[6] + (data[7] << 8) + (data[8] << 16)
+        prod_id = data[9] + (data[10] << 8)
+        key = '{0}.{1}.{2}.{3}.{4:02X}'.format(
+            mfg_id, prod_id, data[0], data[2] & 0x7f, data[3])
+        return key, mfg_id, prod_id
+
+    def _read_timestamps(self):
+        # Get SDR Repository Info, the most recent addition and erase
+        # timestamps are the bytes 5-8 and 9-12
+        data = bytearray(
+            self.command.xraw_command(netfn=0x0a, command=0x20)['data'])
+        return list(struct.unpack('<II', bytes(data[5:13])))
+
+    @property
+    def path(self):
+        key, _, _ = self._device
+        bmc = self.command.bmc or 'local'
+        return os.path.join(self.cache_dir, f'sdr-{bmc}-{key}.bin')
+
+    def _open(self, timestamps):
+        """
+        Return the index and the records of the cache file, or None if it
+        is not the cache of the current repository.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                index = json.loads(f.readline())
+                if index.get('timestamps') == timestamps:
+                    return index, f.read()
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _build(self, timestamps):
+        repository = _RecordingSDR(self.command)
+        sensors = []
+        records = bytearray()
+        for entry, raw in repository.records:
+            if entry.sdrtype != sdr.TYPE_SENSOR or not entry.readable:
+                continue
+            sensor_id = '{0}.{1}.{2}'.format(
+                entry.sensor_owner, entry.sensor_number, entry.sensor_lun)
+            if sensor_id in repository.broken_sensor_ids:
+                continue
+            sensors.append([entry.name, len(records), len(raw)])
+            records += raw
+        if not sensors:
+            # The records are shared with an SDR decoded before in this
+            # process, nothing to cache
+            return None
+        index = {'timestamps': timestamps, 'sensors': sensors}
+        header = (json.dumps(index) + '\n').encode()
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.sdr')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header)
+                f.write(records)
+            os.replace(tmp_path, self.path)
+            tmp_path = None
+        except OSError as e:
+            self.print_err(e)
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return index, bytes(records)
+
+    def _get_records(self):
+        if not self._checked:
+            # A failed check is not repeated in the session
+            self._checked = True
+            self._device = self._read_device()
+            timestamps = self._read_timestamps()
+            self._records = self._open(timestamps) or self._build(timestamps)
+        return self._records
+
+    def _read_sensor(self, entry):
+        rsp = self.command.raw_command(
+            command=0x2d, netfn=4, rslun=entry.sensor_lun,
+            data=(entry.sensor_number,))
+        if 'error' in rsp:
+            if rsp['code'] == 203:
+                # Sensor does not exist, optional device
+                return None
+            raise pygexc.IpmiException(rsp['error'], code=rsp['code'])
+        return entry.decode_sensor_reading(self.command, rsp['data'])
+
+    def read_sensors(self, match):
+        """
+        Read the sensors whose name is matched, in the order of the
+        repository. Return None if the repository can not be cached, e.g.
+        the BMC has no SDR repository device.
+        """
+        try:
+            records = self._get_records()
+        except (pygexc.PyghmiException, NotImplementedError, IndexError,
+                struct.error) as e:
+            self.print_err(e)
+            return None
+        if records is None:
+            return None
+        index, raw = records
+        _, mfg_id, prod_id = self._device
+        readings = []
+        event_consts = None
+        for name, offset, length in index['sensors']:
+            if not match(name):
+                continue
+            if event_consts is None:
+                event_consts = self.command.get_event_constants()
+            entry = sdr.SDREntry(bytearray(raw[offset:offset + length]),
+                                 event_consts, False, mfg_id, prod_id)
+            reading = self._read_sensor(entry)
+            if reading is not None:
+                readings.append(reading)
+        return readings
@@ -18,40 +18,41 @@ warnings.filterwarnings('ignore')
 
 import argparse
 
-from pyghmi.ipmi.command import Command
+import pyghmi.exceptions as pygexc
 
 from lico.monitor.plugins.icinga.helper.base import MetricsBase, PluginData
+from lico.monitor.plugins.icinga.outband.ipmi.common import SensorReadings
 
 
 class TempMetric(MetricsBase):
     @classmethod
-    def node_temperature(cls):
+    def node_temperature(cls, sensors=None, strict=False):
         try:
-            valid_val = None
-            for data_dict in Command().get_sensor_data():
-                if data_dict.name.lower() == 'ambient temp':
-                    valid_val = data_dict.value
-                    break
-                elif data_dict.name.lower() == 'inlet_temp':
-                    valid_val = data_dict.value
-                    break
+            valid_val = (sensors or SensorReadings()).inlet_temperature()
             if valid_val is not None:
                 temp = float(valid_val)
             else:
                 raise Exception("Unable to get temperature!")
         except Exception as e:
+            # The fan-out backs off a BMC which fails to respond
+            if strict and isinstance(e, pygexc.IpmiException):
+                raise
             cls.print_err(e)
             return []
         return [cls.build_point('node_temp', temp, 'float', '')]
 
 
-def node_temp(verbose):
+def node_temp(verbose, sensors=None, strict=False):
     TempMetric.verbose = verbose
-    return TempMetric.node_temperature()
+    return TempMetric.node_temperature(sensors, strict)
 
 
-def get_temperature_info(plugin_data, verbose):
-    node_temp_dict = node_temp(verbose)
+def get_temperature_info(plugin_data, verbose, sensors=None, strict=False):
+    """
+    strict: raise the IPMI errors, e.g. the BMC does not respond, instead
+    of leaving the temperature out
+    """
+    node_temp_dict = node_temp(verbose, sensors, strict)
     if node_temp_dict:
         node_temp_dict = node_temp_dict[0]
         plugin_data.add_output_data(
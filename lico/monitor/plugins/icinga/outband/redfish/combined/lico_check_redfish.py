@@ -0,0 +1,273 @@
+#!/usr/bin/python3
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import argparse
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lico.monitor.plugins.icinga.helper.base import MetricsBase, PluginData
+from lico.monitor.plugins.icinga.helper.fanout import load_hosts
+from lico.monitor.plugins.icinga.helper.output import (
+    add_sink_arguments, get_sink,
+)
+from lico.monitor.plugins.icinga.outband.redfish.common import (
+    RedfishConnection, RedfishLogger, apply_vendor_profile, get_vendor_names,
+    get_vendor_profile,
+)
+from lico.monitor.plugins.icinga.outband.redfish.fanout import RedfishFanout
+from lico.monitor.plugins.icinga.outband.redfish.health import (
+    lico_check_health,
+)
+from lico.monitor.plugins.icinga.outband.redfish.power import lico_check_power
+from lico.monitor.plugins.icinga.outband.redfish.temperature import (
+    lico_check_temperature,
+)
+
+REDFISH_PASSWORD_ENV = 'LICO_REDFISH_PASSWORD'
+
+# The default arguments of the power and temperature checks
+POWER_ARGS = {
+    'res_instance': 'Chassis',
+    'res_type': 'Power',
+    'data_url': None,
+    'property': 'PowerControl',
+    'identify': 'Name=Server Power Control',
+    'metric': 'PowerConsumedWatts',
+    'report_metric': None,
+}
+TEMPERATURE_ARGS = {
+    'res_instance': 'Chassis',
+    'res_type': 'Thermal',
+    'data_url': None,
+    'property': 'Temperatures',
+    'identify': 'Name=Ambient Temp',
+    'metric': 'ReadingCelsius',
+    'report_metric': None,
+}
+
+
+def _metric_args(conn, args, defaults, profile, metric_report):
+    metric_args = argparse.Namespace(**vars(args))
+    for key, value in defaults.items():
+        setattr(metric_args, key, value)
+    metric_args.metric_report = metric_report
+    if args.vendor is not None:
+        apply_vendor_profile(
+            metric_args, get_vendor_profile(args.vendor)[profile])
+    else:
+        metric_args.identify = conn.parse_identify(metric_args.identify)
+    return metric_args
+
+
+def _health_args(args):
+    health_args = argparse.Namespace(**vars(args))
+    health_args.res_instance = 'Systems'
+    health_args.res_type = args.health_log
+    health_args.data_url = None
+    return health_args
+
+
+def _run_task(get_info, conn, args):
+    plugin_data = PluginData()
+    get_info(plugin_data, conn, args)
+    return plugin_data
+
+
+def get_tasks(conn, args):
+    """
+    return example:
+    [(lico_check_power.get_power_info, Namespace(...))]
+    """
+    tasks = []
+    if args.power or args.all:
+        tasks.append((lico_check_power.get_power_info,
+                      _metric_args(conn, args, POWER_ARGS, 'power',
+                                   args.power_report)))
+    if args.temperature or args.all:
+        tasks.append((lico_check_temperature.get_temperature_info,
+                      _metric_args(conn, args, TEMPERATURE_ARGS,
+                                   'temperature', args.thermal_report)))
+    if args.health or args.all:
+        tasks.append((lico_check_health.get_health_info, _health_args(args)))
+    return tasks
+
+
+def get_redfish_info(plugin_data, conn, args):
+    """
+    Get the metrics concurrently over the session of the connection, the
+    requests share its pool of keep-alive connections to the BMC. The
+    output is in the order of power, temperature and health.
+    """
+    tasks = get_tasks(conn, args)
+    if not tasks:
+        return
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        futures = [
+            pool.submit(_run_task, get_info, conn, task_args)
+            for get_info, task_args in tasks
+        ]
+        for future in futures:
+            plugin_data.merge(future.result())
+
+
+def run_fanout(args):
+    fanout = RedfishFanout(
+        lambda conn: get_tasks(conn, args), args,
+        concurrency=args.concurrency, per_host=args.per_host
+    )
+    hosts = load_hosts(args.hosts)
+    sink = get_sink(args, check_source=socket.gethostname(),
+                    host=socket.gethostname())
+    try:
+        while True:
+            start = time.monotonic()
+            fanout.run(hosts, sink, args.service)
+            if not args.interval:
+                break
+            time.sleep(max(args.interval - (time.monotonic() - start), 0))
+    finally:
+        fanout.close()
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', help="""
+    BMC IP address, required unless --hosts is specified;
+    """)
+    parser.add_argument('--username', help="BMC login user;", required=True)
+    parser.add_argument('--password', help="""
+    BMC login password, default is the environment variable {};
+    """.format(REDFISH_PASSWORD_ENV))
+    parser.add_argument('--sys_url', default=None, help="""
+    Redfish system url, default is None;
+    """)
+    parser.add_argument('--vendor', choices=get_vendor_names(), help="""
+    Server vendor, the resources of the metrics are located with the
+    profile of the vendor in vendors.json, or in the file of the environment
+    variable LICO_REDFISH_VENDOR_PROFILES;
+    """)
+    parser.add_argument('--power', action='store_true', help="""
+    Get the power of the node;
+    """)
+    parser.add_argument('--temperature', action='store_true', help="""
+    Get the temperature of the node;
+    """)
+    parser.add_argument('--health', action='store_true', help="""
+    Get health information of the node;
+    """)
+    parser.add_argument('--all', action='store_true', help="""
+    Get the power, temperature and health information of the node;
+    """)
+    parser.add_argument('--psu', action='store_true', help="""
+    Get the input power of each power supply with the power;
+    """)
+    parser.add_argument('--sensors', action='store_true', help="""
+    Get the reading of each temperature sensor with the temperature;
+    """)
+    parser.add_argument('--fans', action='store_true', help="""
+    Get the speed of each fan with the temperature;
+    """)
+    parser.add_argument('--health_log', default='ActiveLog', help="""
+    Log service of the health information, default is ActiveLog;
+    """)
+    parser.add_argument('--sensor_key', default='MessageArgs', help="""
+    The parameter is comma-separated string to locate the key which represents
+    the sensor name.
+    For example: 'Oem,Hpe,ClassDescription';
+    """)
+    parser.add_argument('--power_report', default=None, help="""
+    Id of the MetricReport of the power, e.g. PowerMetrics, the power is
+    located in the report with the profile of the vendor, or with the
+    resources of the power discovered;
+    """)
+    parser.add_argument('--thermal_report', default=None, help="""
+    Id of the MetricReport of the temperature, e.g. ThermalSensor, the
+    temperature is located in the report with the profile of the vendor,
+    or with the resources of the temperature discovered;
+    """)
+    parser.add_argument('--report_interval', default=300, type=int, help="""
+    Seconds of the samples of the reports summarized, default is 300;
+    """)
+    parser.add_argument('--timeout', default=5, type=int, help="""
+    Timeout in seconds, default is 5s;
+    """)
+    parser.add_argument('--max_attempt', default=1, type=int, help="""
+    Max attempt times, default is 1;
+    """)
+    parser.add_argument('--cache_ttl', default=3600, type=int, help="""
+    Seconds the navigation resources of the BMC are cached for, 0 disables
+    the resource cache, default is 3600;
+    """)
+    parser.add_argument('--no_session_cache', dest='session_cache',
+                        action='store_false', help="""
+    Log in and out at each check, instead of sharing a cached session with
+    the other checks of the BMC;
+    """)
+    parser.add_argument('--verbose', action='store_true', help="""
+    Verbose mode;
+    """)
+    parser.add_argument('--hosts', help="""
+    Collect from the BMCs in this file instead of --host, one BMC in a line
+    as "<BMC address> [<host name>]";
+    """)
+    parser.add_argument('--concurrency', type=int, default=64, help="""
+    Number of the requests to the BMCs at a time, default is 64;
+    """)
+    parser.add_argument('--per_host', type=int, default=2, help="""
+    Number of the requests to a BMC at a time, default is 2;
+    """)
+    parser.add_argument('--interval', type=float, default=0, help="""
+    Poll the BMCs every interval seconds, keeping the sessions, instead
+    of polling them once;
+    """)
+    parser.add_argument('--service', help="""
+    Service name of the results of the BMCs in Icinga 2, the results are
+    host results if it is omitted;
+    """)
+    add_sink_arguments(parser, host=False)
+    result = parser.parse_args()
+    if not (result.host or result.hosts):
+        parser.error('--host or --hosts is required')
+    result.password = result.password or os.environ.get(
+        REDFISH_PASSWORD_ENV)
+    if result.password is None:
+        parser.error('--password or the environment variable {} is '
+                     'required'.format(REDFISH_PASSWORD_ENV))
+    return result
+
+
+if __name__ == '__main__':
+    args = parse_command_line()
+    logger = RedfishLogger(args.verbose)
+    if args.hosts:
+        MetricsBase.verbose = args.verbose
+        try:
+            logger.set_logger()
+            run_fanout(args)
+        finally:
+            logger.close()
+    else:
+        plugin_data = PluginData()
+        try:
+            logger.set_logger()
+            with RedfishConnection(args) as conn:
+                get_redfish_info(plugin_data, conn, args)
+        except Exception as e:
+            if args.verbose:
+                raise e
+        finally:
+            plugin_data.exit()
+            logger.close()
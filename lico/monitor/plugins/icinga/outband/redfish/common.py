@@ -12,105 +12,173 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import abc
+import functools
 import http
+import json
 import logging
+import os
+import re
+import time
+from datetime import datetime
 from tempfile import NamedTemporaryFile
 from typing import List, Tuple
+from urllib.parse import quote, urlencode
 
 import redfish
 from attrs import define
-
-
-class VendorGeneric(abc.ABCMeta):
-    name = "Generic"
-
-    health = dict()
-    power = dict()
-    temperature = dict()
-
-
-class VendorLenovo(VendorGeneric):
-    name = "Lenovo"
-
-    health = {
-        "uri": "/redfish/v1/Systems/1/LogServices/ActiveLog/Entries/",
-        "sensor_key": "MessageArgs"
-    }
-    power = {
-        "uri": "/redfish/v1/Chassis/1/Power/",
-        "property": "PowerControl",
-        "identify": {
-            "key": "Name",
-            "values": ["Server Power Control", ]
-        },
-        "metric": "PowerConsumedWatts"
-    }
-    temperature = {
-        "uri": "/redfish/v1/Chassis/1/Thermal/",
+from redfish.rest.v1 import HttpClient, RisObject, ServerDownOrUnreachableError
+
+from lico.monitor.plugins.icinga.helper.state import StateFile, state_lock
+
+VENDOR_PROFILES_ENV = 'LICO_REDFISH_VENDOR_PROFILES'
+
+# The metrics got with the power or the temperature of a check, in the same
+# resource unless the profile of the vendor locates them in another
+# resource.
+EXTRA_METRICS = {
+    'psu': {
+        "property": "PowerSupplies",
+        "identify": {"key": "Name", "values": ["*"]},
+        "metric": "PowerInputWatts"
+    },
+    'sensors': {
         "property": "Temperatures",
-        "identify": {
-            "key": "Name",
-            "values": ["Ambient Temp", ]
-        },
+        "identify": {"key": "Name", "values": ["*"]},
         "metric": "ReadingCelsius"
+    },
+    'fans': {
+        "property": "Fans",
+        "identify": {"key": "Name", "values": ["*"]},
+        "metric": ["Reading", "ReadingUnits"]
+    },
+}
+
+
+@functools.lru_cache(maxsize=None)
+def load_vendor_profiles():
+    """
+    The profiles of the vendors, in vendors.json next to this module, or
+    in the file of the environment variable LICO_REDFISH_VENDOR_PROFILES.
+    return example:
+    {'Lenovo': {'health': {...}, 'power': {...}, 'temperature': {...}}}
+    """
+    path = os.environ.get(VENDOR_PROFILES_ENV) or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'vendors.json')
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def get_vendor_names():
+    return list(load_vendor_profiles())
+
+
+def get_vendor_profile(name):
+    return load_vendor_profiles()[name]
+
+
+def get_profile_spec(profile):
+    """
+    The arguments of a metric located by a profile, as the spec of
+    RedfishConnection.get_metrics_from_res.
+    return example:
+    ('PowerControl', ('Name', ['Server Power Control']), 'PowerConsumedWatts')
+    """
+    identify = profile.get("identify") or {}
+    return (
+        profile.get("property"),
+        (identify.get("key"), identify.get("values", [])),
+        profile.get("metric")
+    )
+
+
+def get_extra_profiles(args, names):
+    """
+    The profiles of the extra metrics of a check, from the profile of its
+    vendor if the vendor has them.
+    """
+    profile = get_vendor_profile(args.vendor) if args.vendor else {}
+    return {name: profile.get(name, EXTRA_METRICS[name]) for name in names}
+
+
+def apply_vendor_profile(args, profile):
+    """
+    Locate the metric of a check with a profile of a vendor, e.g. the power
+    profile of Lenovo, instead of the resource and metric arguments.
+    """
+    args.property, args.identify, args.metric = get_profile_spec(profile)
+    args.data_url = profile.get("uri")
+
+
+def get_member_name(metric_data, index):
+    """
+    The name of a matched object in the names of the points, e.g. 'cpu_1'
+    of 'CPU 1', or the index of the object if it has no identify.
+    """
+    name = next(iter(metric_data.identify.values()), None)
+    if name is None:
+        return str(index)
+    return re.sub(r'[^a-z0-9]+', '_', str(name).lower()).strip('_') or \
+        str(index)
+
+
+def get_host_state_name(prefix, host):
+    # The name of a state file of a BMC
+    return '{}_{}.json'.format(prefix, re.sub(r'[^\w.-]', '_', host))
+
+
+def parse_datetime(value):
+    # '2026-10-19T11:00:00.000+00:00' -> datetime, None if it is invalid
+    try:
+        value = re.sub(r'\.\d+', '', value).replace('Z', '+00:00')
+        return datetime.strptime(
+            re.sub(r'([+-]\d\d):(\d\d)$', r'\1\2', value),
+            '%Y-%m-%dT%H:%M:%S%z')
+    except (TypeError, ValueError):
+        return None
+
+
+def summarize_metric_report(report, match, interval=None):
+    """
+    Summarize the values of a MetricReport matched, those of the last
+    interval seconds if interval is specified. The samples older than the
+    interval are missing, so a report the BMC stopped updating is not
+    summarized.
+    return example:
+    {'min': 310.0, 'avg': 342.5, 'max': 371.0, 'last': 350.0}
+    """
+    samples = []
+    for metric_value in report.get('MetricValues') or []:
+        if not match(metric_value):
+            continue
+        try:
+            value = float(metric_value.get('MetricValue'))
+        except (TypeError, ValueError):
+            continue
+        samples.append((parse_datetime(metric_value.get('Timestamp')), value))
+    if not samples:
+        return None
+    if all(timestamp is not None for timestamp, _ in samples):
+        samples.sort(key=lambda sample: sample[0])
+        if interval:
+            start = time.time() - interval
+            samples = [sample for sample in samples
+                       if sample[0].timestamp() >= start]
+    if not samples:
+        return None
+    values = [value for _, value in samples]
+    return {
+        'min': min(values),
+        'avg': round(sum(values) / len(values), 2),
+        'max': max(values),
+        'last': values[-1],
     }
 
 
-class VendorDell(VendorGeneric):
-    name = "Dell"
-
-    health = {
-        "uri": "/redfish/v1/Managers"
-               "/iDRAC.Embedded.1/LogServices/FaultList/Entries",
-        "sensor_key": "MessageArgs"
-    }
-    power = {
-        "uri": "/redfish/v1/Chassis/1/Power/",
-        "property": "PowerControl",
-        "identify": {
-            "key": "Name",
-            "values": ["Server Power Control", ]
-        },
-        "metric": "PowerConsumedWatts"
-    }
-    temperature = {
-        "uri": "/redfish/v1/Chassis/System.Embedded.1/Thermal/",
-        "property": "Temperatures",
-        "identify": {
-            "key": "Name",
-            # System Board Exhaust Temp
-            "values": ["System Board Inlet Temp", ]
-        },
-        "metric": "ReadingCelsius"
-    }
-
-
-class VendorHPE(VendorGeneric):
-    name = "HPE"
-
-    health = {
-        "uri": "/redfish/v1/Systems/1/LogServices/IML/Entries/",
-        "sensor_key": "Oem,Hpe,ClassDescription",
-    }
-    power = {
-        "uri": "/redfish/v1/Chassis/1/Power/",
-        "property": "PowerControl",
-        "identify": {
-            "key": "MemberId",
-            "values": ["0", ]
-        },
-        "metric": "PowerConsumedWatts"
-    }
-    temperature = {
-        "uri": "/redfish/v1/Chassis/1/Thermal/",
-        "property": "Temperatures",
-        "identify": {
-            "key": "Name",
-            "values": ["01-Inlet Ambient", ]
-        },
-        "metric": "ReadingCelsius"
-    }
+class QueryNotSupportedError(Exception):
+    """
+    The BMC rejects the query parameters of a request, e.g. $top or
+    $filter, with 400 Bad Request or 501 Not Implemented.
+    """
 
 
 @define
@@ -120,29 +188,211 @@ class MetricData:
     metric: dict
 
 
+class SessionCache:
+    """
+    The Redfish sessions of the BMCs, kept between two checks, so all the
+    checks of a BMC share one session instead of logging in each time.
+    The tokens are credentials, the state file is only readable by the
+    user.
+    """
+    state = StateFile('redfish_sessions.json')
+
+    @staticmethod
+    def _key(host, username):
+        return f'{username}@{host}'
+
+    def lock(self, host, username):
+        # Serialize the logins of a user to a BMC, the checks of a BMC
+        # started together create one session, while the logins to the
+        # other BMCs go on
+        return state_lock('redfish_session_{}.lock'.format(
+            re.sub(r'[^\w.-]', '_', self._key(host, username))))
+
+    def get(self, host, username):
+        """
+        return example:
+        ('b1a2c3...', '/redfish/v1/SessionService/Sessions/12')
+        """
+        session = self.state.load().get(self._key(host, username), {})
+        return session.get('token'), session.get('location')
+
+    def set(self, host, username, token, location):
+        # The sessions of all the BMCs are in one file
+        with self.state.lock():
+            sessions = self.state.load()
+            sessions[self._key(host, username)] = {
+                'token': token, 'location': location}
+            return self.state.save(sessions)
+
+
+class ResourceCache:
+    """
+    The Redfish resources of a BMC, kept between two checks.
+
+    The navigation resources, which only change when the BMC is
+    reconfigured, are used without a request until their TTL expires. The
+    resources with an ETag are fetched with a conditional GET, the BMC
+    answers 304 Not Modified without a body if they have not changed.
+    The URLs found by a discovery are kept too, so the next checks get
+    the metric resources directly.
+    """
+
+    def __init__(self, host, ttl=3600):
+        self.state = StateFile(get_host_state_name('redfish_resources', host))
+        self.ttl = ttl
+        self._data = None
+        self._updates = {'resources': {}, 'discovery': {}}
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.state.load()
+            for section in self._updates:
+                self._data.setdefault(section, {})
+        return self._data
+
+    def get(self, url):
+        """
+        return example:
+        {'body': {...}, 'etag': 'W/"1a2b"', 'time': 1700000000.0}
+        """
+        return self.data['resources'].get(url)
+
+    def get_fresh(self, url):
+        # The body of a navigation resource fetched in the TTL
+        entry = self.get(url)
+        if entry is not None and time.time() - entry['time'] < self.ttl:
+            return entry['body']
+        return None
+
+    def set(self, url, body, etag=None):
+        entry = {'body': body, 'etag': etag, 'time': time.time()}
+        self.data['resources'][url] = entry
+        self._updates['resources'][url] = entry
+
+    def get_discovery(self, key):
+        return self.data['discovery'].get(key)
+
+    def set_discovery(self, key, urls):
+        self.data['discovery'][key] = urls
+        self._updates['discovery'][key] = urls
+
+    def save(self):
+        if not any(self._updates.values()):
+            return True
+        # Merged into the latest state, the other checks of the BMC may
+        # have saved it in the meantime
+        data = self.state.load()
+        for section, updates in self._updates.items():
+            data.setdefault(section, {}).update(updates)
+        if not self.state.save(data):
+            return False
+        # Only the resources updated since are saved by the next save
+        self._updates = {section: {} for section in self._updates}
+        return True
+
+
+class RedfishClient(HttpClient):
+    """
+    The client of the redfish library, getting the service root from the
+    resource cache, instead of fetching it when it is created.
+    """
+
+    def __init__(self, base_url, resource_cache=None, **kwargs):
+        self.resource_cache = resource_cache
+        super().__init__(base_url, **kwargs)
+
+    def get_root_object(self):
+        root_data = None
+        if self.resource_cache is not None:
+            root_data = self.resource_cache.get_fresh(self.default_prefix)
+        if root_data is None:
+            super().get_root_object()
+            if self.resource_cache is not None:
+                self.resource_cache.set(
+                    self.default_prefix, self.root_resp.dict)
+        else:
+            self.root = RisObject.parse(root_data)
+            self.root_resp = None
+
+
 class RedfishConnection:
-    def __init__(self, cli_args):
+    def __init__(self, cli_args, session_cache=None, resource_cache=None):
         self.cli_args = cli_args
+        if session_cache is None and cli_args.session_cache:
+            session_cache = SessionCache()
+        self.session_cache = session_cache
+        if resource_cache is None and cli_args.cache_ttl > 0:
+            resource_cache = ResourceCache(cli_args.host, cli_args.cache_ttl)
+        self.resource_cache = resource_cache
         self.init_connection()
         self._get_base_url()
 
     def init_connection(self):
-        self.connection = redfish.redfish_client(
+        cached_token, location = None, None
+        if self.session_cache is not None:
+            cached_token, location = self.session_cache.get(
+                self.cli_args.host, self.cli_args.username)
+        token = cached_token
+        try:
+            self.connection = self._client(token)
+        except ServerDownOrUnreachableError as e:
+            # Some BMCs reject an expired token on the service root too
+            response = getattr(e, 'response', None)
+            if token is None or response is None or \
+                    response.status != http.HTTPStatus.UNAUTHORIZED.value:
+                raise
+            token = None
+            self.connection = self._client(token)
+        if token is None:
+            self.login(expired_token=cached_token)
+        else:
+            self.connection.set_session_location(location)
+
+    def _client(self, token):
+        return RedfishClient(
             base_url=f"https://{self.cli_args.host}",
+            resource_cache=self.resource_cache, sessionkey=token,
             max_retry=self.cli_args.max_attempt, timeout=self.cli_args.timeout)
+
+    def login(self, expired_token=None):
+        if self.session_cache is None:
+            self._login()
+            return
+        host, username = self.cli_args.host, self.cli_args.username
+        with self.session_cache.lock(host, username):
+            # Another check may have logged in while waiting for the lock
+            token, location = self.session_cache.get(host, username)
+            if token is not None and token != expired_token:
+                self.connection.set_session_key(token)
+                self.connection.set_session_location(location)
+                return
+            self._login()
+            self.session_cache.set(
+                host, username, self.connection.get_session_key(),
+                self.connection.get_session_location())
+
+    def _login(self):
+        # The expired token must not be sent with the new login
+        self.connection.set_session_key(None)
         self.connection.login(username=self.cli_args.username,
                               password=self.cli_args.password,
                               auth="session")
 
     def _get_base_url(self):
-        rep = self.rf_get('/redfish')
+        rep = self.rf_get('/redfish', static=True)
         base_url = rep.get("v1")
         if base_url is None:
             raise Exception("Only support redfish v1.")
         self.base_url = base_url
 
     def close(self):
-        self.connection.logout()
+        if self.resource_cache is not None:
+            self.resource_cache.save()
+        # The cached session is kept for the next checks, it is removed
+        # by the BMC when it is idle for the session timeout
+        if self.session_cache is None:
+            self.connection.logout()
 
     def __enter__(self):
         return self
@@ -150,12 +400,126 @@ class RedfishConnection:
     def __exit__(self, *exc_info):
         self.close()
 
-    def rf_get(self, rf_url):
-        rep = self.connection.get(rf_url, None)
+    def _get(self, rf_url, headers=None):
+        rep = self.connection.get(rf_url, None, dict(headers or {}))
+        if rep.status == http.HTTPStatus.UNAUTHORIZED.value and \
+                self.session_cache is not None:
+            # The cached session has expired, or was deleted on the BMC
+            self.login(expired_token=self.connection.get_session_key())
+            rep = self.connection.get(rf_url, None, dict(headers or {}))
+        return rep
+
+    def rf_get(self, rf_url, static=False):
+        """
+        static: a navigation resource, used from the resource cache until
+        its TTL expires
+        """
+        if self.resource_cache is None:
+            rep = self._get(rf_url)
+            if rep.status >= http.HTTPStatus.BAD_REQUEST.value:
+                self.raise_error(rep.dict, rf_url)
+            return rep.dict
+
+        if static:
+            body = self.resource_cache.get_fresh(rf_url)
+            if body is not None:
+                return body
+        entry = self.resource_cache.get(rf_url)
+        headers = None
+        if entry is not None and entry.get('etag'):
+            headers = {'If-None-Match': entry['etag']}
+        rep = self._get(rf_url, headers)
+        if rep.status == http.HTTPStatus.NOT_MODIFIED.value and \
+                headers is not None:
+            self.resource_cache.set(rf_url, entry['body'], entry['etag'])
+            return entry['body']
+        if rep.status >= http.HTTPStatus.BAD_REQUEST.value:
+            self.raise_error(rep.dict, rf_url)
+        etag = rep.getheader('ETag')
+        if static or etag:
+            self.resource_cache.set(rf_url, rep.dict, etag)
+        return rep.dict
+
+    def supports_query(self, feature):
+        """
+        Whether the BMC supports a query parameter, from the
+        ProtocolFeaturesSupported of the service root, e.g. 'TopSkipQuery'
+        or 'FilterQuery'. None if the BMC does not tell.
+        """
+        features = self.rf_get(self.base_url, static=True).get(
+            'ProtocolFeaturesSupported') or {}
+        return features.get(feature)
+
+    def rf_query(self, rf_url, query=None):
+        """
+        Get a resource with the query parameters, e.g. {'$top': 100}, it is
+        not cached.
+        """
+        if query:
+            rf_url = '{}?{}'.format(
+                rf_url, urlencode(query, quote_via=quote, safe="$'"))
+        rep = self._get(rf_url)
+        if query and rep.status in (http.HTTPStatus.BAD_REQUEST.value,
+                                    http.HTTPStatus.NOT_IMPLEMENTED.value):
+            raise QueryNotSupportedError(f"{rf_url}: {rep.dict}")
         if rep.status >= http.HTTPStatus.BAD_REQUEST.value:
             self.raise_error(rep.dict, rf_url)
         return rep.dict
 
+    def _query_page(self, collection_url, query, page_size):
+        """
+        Get the first page of a collection, limited to page_size members
+        with $top if the BMC supports it. Return the page and the page
+        size actually used.
+        """
+        if page_size and self.supports_query('TopSkipQuery') is not False:
+            try:
+                data = self.rf_query(
+                    collection_url, {**query, '$top': page_size})
+                return data, page_size
+            except QueryNotSupportedError:
+                # The BMC does not tell it does not support $top
+                pass
+        return self.rf_query(collection_url, query), None
+
+    def get_count(self, collection_url):
+        """
+        Get the Members@odata.count of a collection, with the smallest page.
+        """
+        data, _ = self._query_page(collection_url, {}, 1)
+        return data.get('Members@odata.count')
+
+    def get_members(self, collection_url, query=None, page_size=None):
+        """
+        Get all the members of a collection, and its Members@odata.count.
+        The pages are followed by Members@odata.nextLink, or by $skip if
+        the BMC limits a page to $top without a next link.
+        """
+        query = dict(query or {})
+        data, page_size = self._query_page(collection_url, query, page_size)
+        if page_size:
+            query['$top'] = page_size
+        count = data.get('Members@odata.count')
+        page = data.get('Members', [])
+        members = list(page)
+        while True:
+            next_link = data.get('Members@odata.nextLink')
+            if next_link:
+                data = self.rf_query(next_link)
+            elif page_size and len(page) == page_size and \
+                    count is not None and len(members) < count:
+                query['$skip'] = len(members)
+                data = self.rf_query(collection_url, query)
+            else:
+                break
+            next_page = data.get('Members', [])
+            if not next_page or next_page[0] == page[0]:
+                # The BMC ignores $skip
+                break
+            page = next_page
+            members += page
+        return members, count
+
     def rf_post(self):
         pass
 
@@ -165,11 +529,11 @@ class RedfishConnection:
 
     @property
     def sysinfo(self):
-        overview = self.connection.get(self.base_url).dict
+        overview = self.rf_get(self.base_url, static=True)
         if 'Systems' not in overview:
             raise Exception('Redfish not ready')
         systems = overview['Systems']['@odata.id']
-        systems = self.connection.get(systems).dict.get("Members", [])
+        systems = self.rf_get(systems, static=True).get("Members", [])
         if self.cli_args.sys_url:
             for system in systems:
                 if system['@odata.id'] == self.cli_args.sys_url:
@@ -184,11 +548,11 @@ class RedfishConnection:
                 raise Exception(
                     'Multi system manager, sysurl is required parameter')
             self.sysurl = systems[0]['@odata.id']
-        return self.connection.get(self.sysurl).dict
+        return self.rf_get(self.sysurl, static=True)
 
     def get_service_url(self, service, base_url=None):
         base_url = base_url if base_url is not None else self.base_url
-        collection = self.rf_get(f'{base_url}{service}')
+        collection = self.rf_get(f'{base_url}{service}', static=True)
         members = collection.get("Members")
         service_urls = []
         for member in members:
@@ -196,56 +560,261 @@ class RedfishConnection:
 
         return service_urls
 
-    def get_metric_by_identify_from_service(
-            self, service_urls: List, res_type: str, model_property: str,
-            identify: Tuple, metric: str):
-        metric_data_list = []
+    def get_metrics_from_service(
+            self, service_urls: List, res_type: str, specs: List):
+        metric_data_lists = [[] for _ in specs]
         for service_url in service_urls:
             complete_url = self.url_path_join(service_url, res_type)
-            service_data = self.rf_get(service_url)
-            if service_data.get(res_type):
-                data = self.rf_get(complete_url)
-                property_data = data.get(model_property)
-                metric_data_list += self.parse_property_by_identify(
-                    property_data, identify, metric, complete_url)
+            service_data = self.rf_get(service_url, static=True)
+            # The link of a subsystem, e.g. ThermalSubsystem/ThermalMetrics
+            if service_data.get(res_type.split('/')[0]):
+                for metric_data_list, metric_data in zip(
+                        metric_data_lists,
+                        self.get_metrics_from_res(complete_url, specs)):
+                    metric_data_list += metric_data
+
+        return metric_data_lists
+
+    def _discovery_key(self, res_instance: str, res_type: str):
+        return '|'.join([self.cli_args.sys_url or '', res_instance, res_type])
+
+    def get_metrics_from_system(
+            self, res_instance: str, res_type: str, specs: List):
+        """
+        The metrics of the res_type resources of the res_instance linked to
+        the system, e.g. the Power of the Chassis, a list of MetricData
+        for each spec.
+        The URLs of the resources the metric of the first spec is found in
+        are kept in the resource cache, the next checks only get these
+        resources, until the metric is not found in them any more.
+        """
+        key = self._discovery_key(res_instance, res_type)
+        data_urls = None
+        if self.resource_cache is not None:
+            data_urls = self.resource_cache.get_discovery(key)
+        if data_urls:
+            try:
+                metric_data_lists = [[] for _ in specs]
+                for data_url in data_urls:
+                    for metric_data_list, metric_data in zip(
+                            metric_data_lists,
+                            self.get_metrics_from_res(data_url, specs)):
+                        metric_data_list += metric_data
+                if metric_data_lists[0]:
+                    return metric_data_lists
+            except Exception:
+                # The resources have moved, discover them again
+                pass
+
+        services = self.sysinfo.get('Links', {}).get(res_instance)
+        service_urls = [serv.get('@odata.id') for serv in services]
+        metric_data_lists = self.get_metrics_from_service(
+            service_urls, res_type, specs)
+        if self.resource_cache is not None and metric_data_lists[0]:
+            self.resource_cache.set_discovery(
+                key, list(dict.fromkeys(m.url for m in metric_data_lists[0])))
+        return metric_data_lists
 
-        return metric_data_list
+    def get_metric_by_identify_from_service(
+            self, service_urls: List, res_type: str, model_property: str,
+            identify: Tuple, metric: str):
+        return self.get_metrics_from_service(
+            service_urls, res_type, [(model_property, identify, metric)])[0]
 
-    def get_metric_by_identify_from_res(
+    def get_metric_by_identify_from_system(
+            self, res_instance: str, res_type: str, model_property: str,
+            identify: Tuple, metric: str):
+        return self.get_metrics_from_system(
+            res_instance, res_type, [(model_property, identify, metric)])[0]
+
+    def get_check_metrics(self, args, extras=None):
+        """
+        The metric of a check, and the extra metrics in the same resource,
+        got from one fetch of the resource.
+        extras: the profiles of the extra metrics, e.g. {'psu': {...}}, the
+        extra metrics in another resource are got by get_extra_metrics.
+        return example:
+        ([MetricData(...)], {'psu': [MetricData(...), MetricData(...)]})
+        """
+        names = [
+            name for name, profile in (extras or {}).items()
+            if not profile.get("uri") or (
+                args.data_url and
+                self.url_verify(profile.get("uri"), args.data_url))
+        ]
+        specs = [(args.property, args.identify, args.metric)] + [
+            get_profile_spec(extras[name]) for name in names]
+        if args.data_url:
+            metric_data_lists = self.get_metrics_from_res(args.data_url, specs)
+        else:
+            metric_data_lists = self.get_metrics_from_system(
+                args.res_instance, args.res_type, specs)
+        return metric_data_lists[0], dict(zip(names, metric_data_lists[1:]))
+
+    def get_extra_metrics(self, extras):
+        """
+        The extra metrics located in their own resources by their profiles,
+        one fetch for each resource.
+        return example:
+        {'sensors': [MetricData(...), MetricData(...)]}
+        """
+        uri_names = dict()
+        for name, profile in extras.items():
+            uri_names.setdefault(profile.get("uri"), []).append(name)
+        extra_metrics = dict()
+        for uri, names in uri_names.items():
+            extra_metrics.update(zip(names, self.get_metrics_from_res(
+                uri, [get_profile_spec(extras[name]) for name in names])))
+        return extra_metrics
+
+    def get_metric_report(self, report_id):
+        """
+        The MetricReport of the TelemetryService, the BMC keeps the samples
+        of the metrics of the report, e.g. the power of each minute.
+        """
+        root = self.rf_get(self.base_url, static=True)
+        telemetry_url = root.get('TelemetryService', {}).get('@odata.id')
+        if telemetry_url is None:
+            raise Exception("TelemetryService not supported.")
+        telemetry = self.rf_get(telemetry_url, static=True)
+        reports_url = telemetry.get('MetricReports', {}).get('@odata.id')
+        if reports_url is None:
+            raise Exception("MetricReports not supported.")
+        report_url = self.url_path_join(reports_url, report_id)
+        return self.rf_get(report_url)
+
+    def get_metric_properties(
             self, data_url: str, model_property: str, identify: Tuple,
             metric: str):
-        data = self.rf_get(data_url)
+        """
+        The MetricProperty of the metric of the matched objects in the
+        metric reports, e.g.
+        '/redfish/v1/Chassis/1/Power#/PowerControl/0/PowerConsumedWatts'
+        The resource is only used to locate the objects, it is got from
+        the resource cache as a navigation resource.
+        """
+        data = self.rf_get(data_url, static=True)
+        ident_key, ident_values = identify
+        properties = set()
         property_data = data.get(model_property)
-        metric = self.parse_property_by_identify(
-            property_data, identify, metric, data_url)
-        return metric
+        if isinstance(property_data, dict):
+            # An excerpt, e.g. '/redfish/v1/Chassis/1/EnvironmentMetrics#
+            # /PowerWatts/Reading'
+            properties.add('{}#/{}/{}'.format(
+                data_url.rstrip('/'), model_property, metric))
+        elif isinstance(property_data, list):
+            for index, pro in enumerate(property_data):
+                if isinstance(pro, dict) and (
+                        pro.get(ident_key) in ident_values or
+                        '*' in ident_values):
+                    properties.add('{}#/{}/{}/{}'.format(
+                        data_url.rstrip('/'), model_property, index, metric))
+        return properties
+
+    def get_metric_urls(self, args):
+        """
+        The URLs of the resources of the metric of a check, the data_url,
+        or else the URLs discovered in the resources of the system, which
+        are kept in the resource cache.
+        """
+        if args.data_url:
+            return [args.data_url]
+        if self.resource_cache is not None:
+            data_urls = self.resource_cache.get_discovery(
+                self._discovery_key(args.res_instance, args.res_type))
+            if data_urls:
+                return data_urls
+        metric_data = self.get_metric_by_identify_from_system(
+            args.res_instance, args.res_type, args.property, args.identify,
+            args.metric)
+        return list(dict.fromkeys(m.url for m in metric_data))
+
+    def match_report_metric(self, args):
+        """
+        Return a callable matching the values of the metric of a check in
+        a MetricReport, by their MetricId if report_metric is specified, or
+        else by the MetricProperty of the metric in the resources.
+        """
+        if args.report_metric:
+            return lambda value: value.get('MetricId') == args.report_metric
+        properties = set()
+        for data_url in self.get_metric_urls(args):
+            properties |= self.get_metric_properties(
+                data_url, args.property, args.identify, args.metric)
+        if not properties:
+            raise Exception("The metric is not found in the resources.")
+
+        def match(value):
+            url, _, path = (value.get('MetricProperty') or '').partition('#')
+            return f"{url.rstrip('/')}#{path}" in properties
+        return match
+
+    def get_metrics_from_res(self, data_url: str, specs: List):
+        """
+        The metrics of the specs, as (property, identify, metric), from one
+        fetch of the resource, a list of MetricData for each spec.
+        """
+        data = self.rf_get(data_url)
+        return [
+            self.parse_property_by_identify(
+                data.get(model_property), identify, metric, data_url)
+            for model_property, identify, metric in specs
+        ]
 
-    def parse_property_by_identify(self, property_data: List, identify: Tuple,
-                                   metric: str, metric_url: str):
+    def get_metric_by_identify_from_res(
+            self, data_url: str, model_property: str, identify: Tuple,
+            metric: str):
+        return self.get_metrics_from_res(
+            data_url, [(model_property, identify, metric)])[0]
+
+    def parse_property_by_identify(self, property_data, identify: Tuple,
+                                   metric, metric_url: str):
+        """
+        The matched objects of the property, the values '*' match all the
+        objects. A property which is an object, e.g. the PowerWatts excerpt
+        of EnvironmentMetrics, is matched without identify.
+        metric: the name of the metric, or a list of names
+        """
         metric_data_list = []
         ident_key, ident_values = identify
+        metrics = [metric] if isinstance(metric, str) else metric
+        if isinstance(property_data, dict):
+            property_data = [property_data]
+            ident_values = ['*'] if ident_key is None else ident_values
         if isinstance(property_data, list):
             for pro in property_data:
                 if isinstance(pro, dict):
                     pro_value = pro.get(ident_key)
-                    if pro_value in ident_values:
+                    if pro_value in ident_values or '*' in ident_values:
+                        identify_data = dict()
+                        if ident_key is not None:
+                            identify_data[ident_key] = pro_value
                         metric_obj = MetricData(
                             url=metric_url,
-                            identify={ident_key: pro_value},
-                            metric={metric: pro.get(metric)})
+                            identify=identify_data,
+                            metric={m: pro.get(m) for m in metrics})
                         metric_data_list.append(metric_obj)
 
         return metric_data_list
 
     @staticmethod
     def parse_identify(identify):
-        identify_list = identify.split('=')
-        if len(identify_list) > 1:
-            ident_key = identify_list[0]
-            ident_values = identify_list[1:]
-
-            return ident_key, ident_values
-        return None, []
+        # 'Name=CPU1 Temp,CPU2 Temp' -> ('Name', ['CPU1 Temp', 'CPU2 Temp'])
+        # A comma in a value is escaped as '\,', a backslash as '\\'
+        ident_key, sep, ident_values = identify.partition('=')
+        if not sep:
+            return None, []
+        values, value, chars = [], '', iter(ident_values)
+        for char in chars:
+            if char == '\\':
+                value += next(chars, char)
+            elif char == ',':
+                values.append(value)
+                value = ''
+            else:
+                value += char
+        values.append(value)
+        return ident_key, values
 
     @staticmethod
     def url_path_join(*paths):
@@ -0,0 +1,146 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lico.monitor.plugins.icinga.helper.base import (
+    MetricsBase, PluginData, StateEnum,
+)
+from lico.monitor.plugins.icinga.helper.fanout import Backoff
+from lico.monitor.plugins.icinga.outband.redfish.common import (
+    RedfishConnection,
+)
+
+
+class RedfishFanout(MetricsBase):
+    """
+    Collect the metrics of many BMCs over Redfish, with at most
+    concurrency requests at a time, and at most per_host requests to a
+    BMC.
+    A BMC has one connection, its keep-alive connections and its session
+    are kept for the next polls of a resident collector, until the BMC
+    fails. The requests are bounded by the --timeout and --max_attempt
+    of cli_args, as in the checks of a single BMC.
+    get_tasks: a callable which takes the RedfishConnection of a BMC and
+    returns the tasks of the metrics, as (get_info, task_args), get_info
+    being called with the PluginData, the connection and task_args
+    """
+
+    def __init__(self, get_tasks, cli_args, concurrency=64, per_host=2,
+                 backoff=None):
+        self.get_tasks = get_tasks
+        self.cli_args = cli_args
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.backoff = backoff or Backoff('redfish_fanout_backoff.json')
+        self._connections = dict()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def _connect(self, address):
+        conn = self._connections.get(address)
+        if conn is None:
+            cli_args = argparse.Namespace(**vars(self.cli_args))
+            cli_args.host = address
+            conn = RedfishConnection(cli_args)
+            self._connections[address] = conn
+        return conn
+
+    @staticmethod
+    def _run_task(get_info, conn, task_args):
+        plugin_data = PluginData()
+        get_info(plugin_data, conn, task_args)
+        return plugin_data
+
+    async def _run_in_executor(self, loop, semaphore, func, *args):
+        async with semaphore:
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _poll(self, loop, semaphore, host):
+        try:
+            conn = await self._run_in_executor(
+                loop, semaphore, self._connect, host.address)
+            host_semaphore = asyncio.Semaphore(self.per_host)
+
+            async def run_task(get_info, task_args):
+                async with host_semaphore:
+                    return await self._run_in_executor(
+                        loop, semaphore, self._run_task, get_info, conn,
+                        task_args)
+
+            # The connection is only closed once all its tasks are done
+            results = await asyncio.gather(
+                *[run_task(*task) for task in self.get_tasks(conn)],
+                return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        except Exception as e:
+            self.print_err(f'{host.address}: {e}\n')
+            await loop.run_in_executor(
+                self._executor, self._close, host.address)
+            self.backoff.failed(host.address, time.time())
+            plugin_data = PluginData()
+            plugin_data.add_output_data(
+                f"Unable to collect from the BMC {host.address}: "
+                f"{str(e) or type(e).__name__}")
+            plugin_data.set_state(StateEnum.Unknown)
+            return host, plugin_data
+        self.backoff.succeeded(host.address)
+        plugin_data = PluginData()
+        for result in results:
+            plugin_data.merge(result)
+        return host, plugin_data
+
+    async def _poll_all(self, loop, hosts):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(
+            *[self._poll(loop, semaphore, host) for host in hosts])
+
+    def run(self, hosts, sink, service=None):
+        """
+        Poll the BMCs which are not backed off, and emit the result of each
+        host to sink in one batch.
+        """
+        now = time.time()
+        hosts = [host for host in hosts if self.backoff.ready(
+            host.address, now)]
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(self._poll_all(loop, hosts))
+        finally:
+            loop.close()
+        self.backoff.save()
+        for conn in self._connections.values():
+            if conn.resource_cache is not None:
+                conn.resource_cache.save()
+        for host, plugin_data in results:
+            sink.emit(plugin_data, service=service, host=host.name)
+        return sink.flush()
+
+    def _close(self, address):
+        conn = self._connections.pop(address, None)
+        if conn is None:
+            return
+        try:
+            conn.close()
+        except Exception as e:
+            self.print_err(f'{address}: {e}\n')
+
+    def close(self):
+        for address in list(self._connections):
+            self._close(address)
+        self._executor.shutdown()
@@ -17,11 +17,15 @@ import json
 from enum import IntEnum
 
 from lico.monitor.plugins.icinga.helper.base import MetricsBase, PluginData
-from lico.monitor.plugins.icinga.outband.redfish import common
+from lico.monitor.plugins.icinga.helper.state import StateFile
 from lico.monitor.plugins.icinga.outband.redfish.common import (
-    RedfishConnection, RedfishLogger,
+    QueryNotSupportedError, RedfishConnection, RedfishLogger,
+    get_host_state_name, get_vendor_names, get_vendor_profile, parse_datetime,
 )
 
+# Number of the log entries in a page
+PAGE_SIZE = 100
+
 
 class StateEnum(IntEnum):
     ok = 0
@@ -30,6 +34,146 @@ class StateEnum(IntEnum):
     critical = 3
 
 
+def _get_reading(entry, sensor_key_list):
+    reading = {'Id': entry.get('Id'),
+               'Message': entry.get('Message'),
+               'Severity': entry.get('Severity').lower()}
+    for key in sensor_key_list:
+        entry = entry.get(key)
+    reading['SensorName'] = ",".join(entry) if \
+        isinstance(entry, list) else entry
+    return reading
+
+
+class LogState:
+    """
+    The entries of the log services of a BMC read by the previous checks.
+
+    A check only reads the entries created since the newest entry read,
+    with $filter=Created ge <cursor>, and adds them to the entries read.
+    The entries are kept from the oldest to the newest, so the entries
+    evicted when a full log rotates are dropped from the front, down to
+    the number of the entries in the log. The log is read again from the
+    start if an Id is used again by an entry created at another time, e.g.
+    it has been cleared, or if the BMC does not support $filter.
+    """
+
+    def __init__(self, host):
+        self.state = StateFile(get_host_state_name('redfish_log', host))
+        # {entries url: {'sensor_key': 'MessageArgs', 'filter': True,
+        #                'cursor': '2026-10-19T11:00:00+00:00',
+        #                'entries': [['1', '2026-10-19T10:00:00+00:00']],
+        #                'readings': [{'Id': '1', ...}]}}
+        # entries: the Id and Created of the entry of each reading
+        self._logs = self.state.load()
+
+    def read(self, conn, entries_url, sensor_key):
+        """
+        Return the readings of all the entries of the log.
+        """
+        log = self._logs.get(entries_url)
+        if log is None or log.get('sensor_key') != sensor_key or \
+                'entries' not in log or \
+                not self._update(conn, entries_url, log):
+            log = self._read_all(conn, entries_url, sensor_key, log)
+        self._logs[entries_url] = log
+        return log['readings']
+
+    @staticmethod
+    def _get_cursor(entries, cursor=None):
+        newest = parse_datetime(cursor)
+        for entry in entries:
+            created = parse_datetime(entry.get('Created'))
+            if created is None:
+                # The entries can not be filtered by Created
+                return None
+            if newest is None or created > newest:
+                newest, cursor = created, entry.get('Created')
+        return cursor
+
+    @staticmethod
+    def _add_entries(log, entries):
+        """
+        Add the entries to the log from the oldest to the newest, the
+        entries must all have a Created.
+        """
+        entries = sorted(
+            entries, key=lambda entry: parse_datetime(entry.get('Created')))
+        sensor_key_list = log['sensor_key'].split(',')
+        log['readings'] += [
+            _get_reading(entry, sensor_key_list) for entry in entries]
+        log['entries'] += [
+            [entry.get('Id'), entry.get('Created')] for entry in entries]
+
+    def _read_all(self, conn, entries_url, sensor_key, log=None):
+        entries, _ = conn.get_members(entries_url, page_size=PAGE_SIZE)
+        unique_entries = dict()
+        for entry in entries:
+            unique_entries.setdefault(entry.get('Id'), entry)
+        entries = list(unique_entries.values())
+        new_log = {
+            'sensor_key': sensor_key,
+            'filter': log.get('filter', True) if log else True,
+            'cursor': self._get_cursor(entries),
+            'entries': [],
+            'readings': [],
+        }
+        if new_log['cursor'] is None:
+            sensor_key_list = sensor_key.split(',')
+            new_log['readings'] = [
+                _get_reading(entry, sensor_key_list) for entry in entries]
+        else:
+            self._add_entries(new_log, entries)
+        return new_log
+
+    def _update(self, conn, entries_url, log):
+        """
+        Add the new entries to the log, return False if the log has to be
+        read again.
+        """
+        if not log['filter'] or log['cursor'] is None or \
+                conn.supports_query('FilterQuery') is False:
+            return False
+        try:
+            entries, _ = conn.get_members(
+                entries_url, {'$filter': f"Created ge {log['cursor']}"},
+                page_size=PAGE_SIZE)
+        except QueryNotSupportedError:
+            log['filter'] = False
+            return False
+        # The entries created in the same second as the cursor are read
+        # again, and entries are filtered locally if the BMC ignores
+        # $filter
+        created = dict(log['entries'])
+        new_entries = []
+        for entry in entries:
+            entry_id = entry.get('Id')
+            if entry_id not in created:
+                created[entry_id] = entry.get('Created')
+                new_entries.append(entry)
+            elif created[entry_id] != entry.get('Created'):
+                # The log has been cleared, and the Id is used again
+                return False
+        if self._get_cursor(new_entries) is None and new_entries:
+            return False
+        # Counted after the new entries are read, so an entry created in
+        # between is not taken for an evicted one
+        total = conn.get_count(entries_url)
+        if total is None:
+            # The evicted entries can not be found
+            return False
+        self._add_entries(log, new_entries)
+        # The oldest entries are evicted when a full log rotates
+        evicted = max(len(log['readings']) - total, 0)
+        del log['readings'][:evicted]
+        del log['entries'][:evicted]
+        log['cursor'] = self._get_cursor(new_entries, log['cursor'])
+        return True
+
+    def save(self):
+        return self.state.save(self._logs)
+
+
 class HealthMetric(MetricsBase):
 
     @classmethod
@@ -38,21 +182,22 @@ class HealthMetric(MetricsBase):
             if args.data_url is not None:
                 return [args.data_url]
             elif args.vendor is not None:
-                vendor = getattr(common, f"Vendor{args.vendor}")
-                args.sensor_key = vendor.health.get("sensor_key")
-                return [vendor.health.get("uri")]
+                profile = get_vendor_profile(args.vendor)["health"]
+                args.sensor_key = profile.get("sensor_key")
+                return [profile.get("uri")]
             else:
                 entries_url_list = []
                 service_urls = conn.get_service_url(args.res_instance)
                 for service_url in service_urls:
-                    systems_info = conn.rf_get(service_url)
+                    systems_info = conn.rf_get(service_url, static=True)
                     logservices_path = systems_info.get(
                         "LogServices").get('@odata.id')
                     log_path = conn.url_path_join(
                         logservices_path, args.res_type)
-                    if not cls.check_log_path(logservices_path, log_path):
+                    if not cls.check_log_path(
+                            conn, logservices_path, log_path):
                         continue
-                    log_info = conn.rf_get(log_path)
+                    log_info = conn.rf_get(log_path, static=True)
                     entries_path = log_info.get(
                         "Entries").get('@odata.id')
                     entries_url_list.append(entries_path)
@@ -61,36 +206,28 @@ class HealthMetric(MetricsBase):
             cls.print_err(e)
 
     @classmethod
-    def node_health(cls, conn, entries_url_list):
+    def node_health(cls, conn, args, entries_url_list):
         health = StateEnum.ok
         summary = {'badreadings': [], 'health': None}
         critical_count = 0
-        sensor_key_list = args.sensor_key.split(',')
+        log_state = LogState(conn.cli_args.host)
         try:
             for entries_url in entries_url_list:
-                entries_info = conn.rf_get(entries_url)
-                count = entries_info.get("Members@odata.count")
-                if count > 0:
-                    for entries in entries_info.get('Members'):
-                        cur_health = entries.get('Severity').lower()
-
-                        res_dict = {'Id': entries.get('Id'),
-                                    'Message': entries.get('Message'),
-                                    'Severity': cur_health}
-                        for key in sensor_key_list:
-                            entries = entries.get(key)
-                        res_dict['SensorName'] = ",".join(entries) if \
-                            isinstance(entries, list) else entries
-                        health = cls.get_latest_health(health, cur_health)
-                        if cur_health == StateEnum.critical.name:
-                            critical_count += 1
-                        summary['badreadings'].append(res_dict)
+                for reading in log_state.read(
+                        conn, entries_url, args.sensor_key):
+                    cur_health = reading['Severity']
+                    health = cls.get_latest_health(health, cur_health)
+                    if cur_health == StateEnum.critical.name:
+                        critical_count += 1
+                    summary['badreadings'].append(reading)
                 summary['health'] = health.name.lower()
             if summary['health'] is None:
                 return []
         except Exception as e:
             cls.print_err(e)
             return []
+        finally:
+            log_state.save()
         return [cls.build_point("node_health", critical_count,
                                 "string", '', summary)]
 
@@ -107,8 +244,9 @@ class HealthMetric(MetricsBase):
             return level
 
     @classmethod
-    def check_log_path(cls, logservices_path, log_path):
-        logservices_info = conn.rf_get(logservices_path).get('Members')
+    def check_log_path(cls, conn, logservices_path, log_path):
+        logservices_info = conn.rf_get(
+            logservices_path, static=True).get('Members')
         logservices_list = \
             [i.get('@odata.id') for i in logservices_info]
         is_matched = False
@@ -125,7 +263,7 @@ class HealthMetric(MetricsBase):
 def node_health(conn, args):
     HealthMetric.verbose = args.verbose
     entries_url_list = HealthMetric.get_entries_url(conn, args)
-    return HealthMetric.node_health(conn, entries_url_list)
+    return HealthMetric.node_health(conn, args, entries_url_list)
 
 
 def get_health_info(plugin_data, conn, args):
@@ -160,8 +298,9 @@ def parse_command_line():
     For example: 'Oem,Hpe,ClassDescription';
     """)
     # vendor
-    parser.add_argument('--vendor', choices=['Dell', 'HPE', 'Lenovo'], help="""
-    Server vendor, Currently only Dell, Lenovo, and HPE are supported;
+    parser.add_argument('--vendor', choices=get_vendor_names(), help="""
+    Server vendor, the profiles of the vendors are in vendors.json, or in the
+    file of the environment variable LICO_REDFISH_VENDOR_PROFILES;
     """)
     parser.add_argument('--timeout', default=5, type=int, help="""
     Timeout in seconds, default is 5s;
@@ -169,6 +308,15 @@ def parse_command_line():
     parser.add_argument('--max_attempt', default=1, type=int, help="""
     Max attempt times, default is 1;
     """)
+    parser.add_argument('--cache_ttl', default=3600, type=int, help="""
+    Seconds the navigation resources of the BMC are cached for, 0 disables
+    the resource cache, default is 3600;
+    """)
+    parser.add_argument('--no_session_cache', dest='session_cache',
+                        action='store_false', help="""
+    Log in and out at each check, instead of sharing a cached session with
+    the other checks of the BMC;
+    """)
     parser.add_argument('--verbose', action='store_true', help="""
     Verbose mode;
     """)
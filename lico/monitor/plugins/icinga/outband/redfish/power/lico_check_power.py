@@ -15,9 +15,10 @@
 import argparse
 
 from lico.monitor.plugins.icinga.helper.base import MetricsBase, PluginData
-from lico.monitor.plugins.icinga.outband.redfish import common
 from lico.monitor.plugins.icinga.outband.redfish.common import (
-    RedfishConnection, RedfishLogger,
+    RedfishConnection, RedfishLogger, apply_vendor_profile, get_extra_profiles,
+    get_member_name, get_vendor_names, get_vendor_profile,
+    summarize_metric_report,
 )
 
 
@@ -32,30 +33,77 @@ class PowerMetric(MetricsBase):
             return 0.0
 
     @classmethod
-    def node_power(cls, conn, args):
+    def node_power_from_report(cls, conn, args):
+        report = conn.get_metric_report(args.metric_report)
+        summary = summarize_metric_report(
+            report,
+            conn.match_report_metric(args),
+            args.report_interval)
+        if summary is None:
+            raise Exception("Power information not found in the report!")
+        points = [cls.build_point('node_power', summary['last'], 'float', 'W')]
+        for key in ['min', 'avg', 'max']:
+            points.append(cls.build_point(
+                f'node_power_{key}', summary[key], 'float', 'W'))
+        return points
 
-        try:
-            if args.data_url:
-                metrics = conn.get_metric_by_identify_from_res(
-                    args.data_url, args.property, args.identify, args.metric
-                )
-            else:
-                services = conn.sysinfo.get('Links', {}).get(
-                    args.res_instance)
-                service_urls = [serv.get('@odata.id') for serv in services]
+    @classmethod
+    def _node_power_points(cls, metrics, metric):
+        """
+        The power of the first matched object is the power of the node,
+        each matched object has its own point if there are several.
+        """
+        if len(metrics) < 1 or metric not in metrics[0].metric:
+            raise Exception("Power information not found!")
+        points = [cls.build_point(
+            'node_power', cls._get_value(metrics[0].metric.get(metric)),
+            'float', 'W')]
+        if len(metrics) > 1:
+            for index, metric_data in enumerate(metrics):
+                points.append(cls.build_point(
+                    f'node_power_{get_member_name(metric_data, index)}',
+                    cls._get_value(metric_data.metric.get(metric)),
+                    'float', 'W'))
+        return points
+
+    @classmethod
+    def _psu_points(cls, metrics):
+        return [
+            cls.build_point(
+                f'psu_{get_member_name(metric_data, index)}_power',
+                cls._get_value(next(iter(metric_data.metric.values()))),
+                'float', 'W')
+            for index, metric_data in enumerate(metrics)
+        ]
 
-                metrics = conn.get_metric_by_identify_from_service(
-                    service_urls, args.res_type, args.property,
-                    args.identify, args.metric)
+    @classmethod
+    def node_power(cls, conn, args):
+        extras = get_extra_profiles(args, ['psu']) if args.psu else dict()
+        points = []
+        if args.metric_report:
+            try:
+                points = cls.node_power_from_report(conn, args)
+            except Exception as e:
+                # Read the metric from the resource instead
+                cls.print_err(e)
+            if points and not extras:
+                return points
 
-            if len(metrics) < 1 or args.metric not in metrics[0].metric:
-                raise Exception("Power information not found!")
-            power_value = cls._get_value(metrics[0].metric.get(args.metric))
+        try:
+            metrics, extra_metrics = conn.get_check_metrics(args, extras)
+            if not points:
+                points = cls._node_power_points(metrics, args.metric)
+        except Exception as e:
+            cls.print_err(e)
+            return points
+        try:
+            extra_metrics.update(conn.get_extra_metrics({
+                name: profile for name, profile in extras.items()
+                if name not in extra_metrics
+            }))
         except Exception as e:
             cls.print_err(e)
-            return []
-        return [cls.build_point(
-            'node_power', power_value, 'float', 'W')]
+        return points + cls._psu_points(extra_metrics.get('psu', []))
 
 
 def node_power(conn, args):
@@ -66,20 +114,22 @@ def node_power(conn, args):
 def get_power_info(plugin_data, conn, args):
     node_power_dict = node_power(conn, args)
     if node_power_dict:
-        node_power_dict = node_power_dict[0]
+        points, node_power_dict = node_power_dict, node_power_dict[0]
         plugin_data.add_output_data(
             "Power = {}{}".format(
                 node_power_dict['value'],
                 node_power_dict['units']
             )
         )
-        plugin_data.add_perf_data(
-            "{}={}{}".format(
-                node_power_dict['metric'],
-                node_power_dict['value'],
-                node_power_dict['units']
+        # The min, avg and max of the metric report follow the reading
+        for point in points:
+            plugin_data.add_perf_data(
+                "{}={}{}".format(
+                    point['metric'],
+                    point['value'],
+                    point['units']
+                )
             )
-        )
 
 
 def parse_command_line():
@@ -103,8 +153,9 @@ def parse_command_line():
         If this parameter is specified, the vendor parameter is invalid.
         property, identify, metric need to match this parameter;
         """)
-    parser.add_argument('--vendor', choices=['Dell', 'HPE', 'Lenovo'], help="""
-        Server vendor.
+    parser.add_argument('--vendor', choices=get_vendor_names(), help="""
+        Server vendor, the profiles of the vendors are in vendors.json, or in
+        the file of the environment variable LICO_REDFISH_VENDOR_PROFILES.
         If this parameter is specified, property, identify, metric are invalid;
         """)
     # positioning metric
@@ -115,18 +166,45 @@ def parse_command_line():
         '--identify', default='Name=Server Power Control',
         help="""
         Resource object identify, default is 'Name=Server Power Control',
-        this argument is a comma-separated list.
-        For example: 'Name=CPU Sub-system Power,Memory Sub-system Power';
+        this argument is a comma-separated list, 'Name=*' matches all the
+        objects, each matched object has its own point if there are several.
+        For example: 'Name=CPU Sub-system Power,Memory Sub-system Power'.
+        A comma in a name is escaped as '\\,', e.g. 'Name=PSU 1\\, Input';
         """)
     parser.add_argument('--metric', default='PowerConsumedWatts', help="""
         Resource object metric, default is PowerConsumedWatts;
         """)
+    parser.add_argument('--psu', action='store_true', help="""
+        Get the input power of each power supply as well, from the same
+        resource unless the profile of the vendor locates it elsewhere;
+        """)
+    parser.add_argument('--metric_report', default=None, help="""
+        Id of a MetricReport of the TelemetryService, e.g. PowerMetrics. The
+        last, min, avg and max of the metric in the report are got instead of
+        reading the resource, which is read if the report is not available;
+        """)
+    parser.add_argument('--report_metric', default=None, help="""
+        MetricId of the metric in the report, default is the metric of the
+        matched objects of data_url, or of the resources discovered;
+        """)
+    parser.add_argument('--report_interval', default=300, type=int, help="""
+        Seconds of the samples of the report summarized, default is 300;
+        """)
     parser.add_argument('--timeout', default=5, type=int, help="""
         Timeout in seconds, default is 5s;
         """)
     parser.add_argument('--max_attempt', default=1, type=int, help="""
         Max attempt times, default is 1;
         """)
+    parser.add_argument('--cache_ttl', default=3600, type=int, help="""
+        Seconds the navigation resources of the BMC are cached for, 0 disables
+        the resource cache, default is 3600;
+        """)
+    parser.add_argument('--no_session_cache', dest='session_cache',
+                        action='store_false', help="""
+        Log in and out at each check, instead of sharing a cached session with
+        the other checks of the BMC;
+        """)
     parser.add_argument('--verbose', action='store_true', help="""
         Verbose mode;
         """)
@@ -143,14 +221,8 @@ if __name__ == '__main__':
         logger.set_logger()
         with RedfishConnection(args) as conn:
             if args.vendor is not None and args.data_url is None:
-                vendor = getattr(common, f"Vendor{args.vendor}")
-                args.identify = (
-                    vendor.power.get("identify").get("key"),
-                    vendor.power.get("identify").get("values")
-                )
-                args.data_url = vendor.power.get("uri")
-                args.property = vendor.power.get("property")
-                args.metric = vendor.power.get("metric")
+                apply_vendor_profile(
+                    args, get_vendor_profile(args.vendor)["power"])
             else:
                 args.identify = conn.parse_identify(str(args.identify))
 
@@ -15,36 +15,105 @@
 import argparse
 
 from lico.monitor.plugins.icinga.helper.base import MetricsBase, PluginData
-from lico.monitor.plugins.icinga.outband.redfish import common
 from lico.monitor.plugins.icinga.outband.redfish.common import (
-    RedfishConnection, RedfishLogger,
+    RedfishConnection, RedfishLogger, apply_vendor_profile, get_extra_profiles,
+    get_member_name, get_vendor_names, get_vendor_profile,
+    summarize_metric_report,
 )
 
+FAN_UNITS = {
+    'RPM': 'RPM',
+    'Percent': '%',
+}
+
 
 class TempMetric(MetricsBase):
     @classmethod
-    def node_temperature(cls, conn, args):
+    def node_temperature_from_report(cls, conn, args):
+        report = conn.get_metric_report(args.metric_report)
+        summary = summarize_metric_report(
+            report,
+            conn.match_report_metric(args),
+            args.report_interval)
+        if summary is None:
+            raise Exception("Temperature information not found in the report!")
+        points = [cls.build_point('node_temp', summary['last'], 'float', '')]
+        for key in ['min', 'avg', 'max']:
+            points.append(cls.build_point(
+                f'node_temp_{key}', summary[key], 'float', ''))
+        return points
+
+    @classmethod
+    def _get_value(cls, value):
         try:
-            if args.data_url:
-                metrics = conn.get_metric_by_identify_from_res(
-                    args.data_url, args.property, args.identify, args.metric
-                )
-            else:
-                services = conn.sysinfo.get('Links', {}).get(
-                    args.res_instance)
-                service_urls = [serv.get('@odata.id') for serv in services]
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+
+    @classmethod
+    def _node_temp_points(cls, metrics, metric):
+        """
+        The temperature of the first matched object is the temperature of
+        the node, each matched object has its own point if there are
+        several.
+        """
+        if len(metrics) < 1 or metric not in metrics[0].metric:
+            raise Exception("Temperature information not found!")
+        points = [cls.build_point(
+            'node_temp', float(metrics[0].metric.get(metric)), 'float', '')]
+        if len(metrics) > 1:
+            for index, metric_data in enumerate(metrics):
+                points.append(cls.build_point(
+                    f'node_temp_{get_member_name(metric_data, index)}',
+                    cls._get_value(metric_data.metric.get(metric)),
+                    'float', ''))
+        return points
 
-                metrics = conn.get_metric_by_identify_from_service(
-                    service_urls, args.res_type, args.property,
-                    args.identify, args.metric)
+    @classmethod
+    def _extra_points(cls, extra_metrics):
+        points = []
+        for index, metric_data in enumerate(extra_metrics.get('sensors', [])):
+            points.append(cls.build_point(
+                f'temp_{get_member_name(metric_data, index)}',
+                cls._get_value(next(iter(metric_data.metric.values()))),
+                'float', ''))
+        for index, metric_data in enumerate(extra_metrics.get('fans', [])):
+            # The reading and the units of the reading
+            values = list(metric_data.metric.values()) + [None]
+            points.append(cls.build_point(
+                f'fan_{get_member_name(metric_data, index)}',
+                cls._get_value(values[0]), 'float',
+                FAN_UNITS.get(values[1], 'RPM')))
+        return points
 
-            if len(metrics) < 1 or args.metric not in metrics[0].metric:
-                raise Exception("Temperature information not found!")
-            temp = metrics[0].metric.get(args.metric)
+    @classmethod
+    def node_temperature(cls, conn, args):
+        names = [name for name in ['sensors', 'fans'] if getattr(args, name)]
+        extras = get_extra_profiles(args, names)
+        points = []
+        if args.metric_report:
+            try:
+                points = cls.node_temperature_from_report(conn, args)
+            except Exception as e:
+                # Read the metric from the resource instead
+                cls.print_err(e)
+            if points and not extras:
+                return points
+        try:
+            metrics, extra_metrics = conn.get_check_metrics(args, extras)
+            if not points:
+                points = cls._node_temp_points(metrics, args.metric)
         except Exception as e:
             cls.print_err(e)
-            return []
-        return [cls.build_point('node_temp', float(temp), 'float', '')]
+            return points
+        try:
+            extra_metrics.update(conn.get_extra_metrics({
+                name: profile for name, profile in extras.items()
+                if name not in extra_metrics
+            }))
+        except Exception as e:
+            cls.print_err(e)
+        return points + cls._extra_points(extra_metrics)
 
 
 def node_temp(conn, args):
@@ -55,20 +124,22 @@ def node_temp(conn, args):
 def get_temperature_info(plugin_data, conn, args):
     node_temp_dict = node_temp(conn, args)
     if node_temp_dict:
-        node_temp_dict = node_temp_dict[0]
+        points, node_temp_dict = node_temp_dict, node_temp_dict[0]
         plugin_data.add_output_data(
             "Temperature = {}{}".format(
                 node_temp_dict['value'],
                 node_temp_dict['units']
             )
         )
-        plugin_data.add_perf_data(
-            "{}={}{}".format(
-                node_temp_dict['metric'],
-                node_temp_dict['value'],
-                node_temp_dict['units']
+        # The min, avg and max of the metric report follow the reading
+        for point in points:
+            plugin_data.add_perf_data(
+                "{}={}{}".format(
+                    point['metric'],
+                    point['value'],
+                    point['units']
+                )
             )
-        )
 
 
 def parse_command_line():
@@ -92,8 +163,9 @@ def parse_command_line():
     If this parameter is specified, the vendor parameter is invalid.
     property, identify, metric need to match this parameter;
     """)
-    parser.add_argument('--vendor', choices=['Dell', 'HPE', 'Lenovo'], help="""
-    Server vendor.
+    parser.add_argument('--vendor', choices=get_vendor_names(), help="""
+    Server vendor, the profiles of the vendors are in vendors.json, or in the
+    file of the environment variable LICO_REDFISH_VENDOR_PROFILES.
     If this parameter is specified, property, identify, metric are invalid;
     """)
     # positioning metric
@@ -101,18 +173,51 @@ def parse_command_line():
     Resource property, default is Temperatures;
     """)
     parser.add_argument('--identify', default='Name=Ambient Temp', help="""
-    Resource object identify, default is 'Name=Ambient Temp';
+    Resource object identify, default is 'Name=Ambient Temp', this argument
+    is a comma-separated list, 'Name=*' matches all the objects, each
+    matched object has its own point if there are several. A comma in a
+    name is escaped as '\\,', e.g. 'Name=Temp 1\\, Rear';
     """)
     parser.add_argument('--metric', default='ReadingCelsius', help="""
     Resource object metric, default is ReadingCelsius;
     """)
+    parser.add_argument('--sensors', action='store_true', help="""
+    Get the reading of each temperature sensor as well, e.g. the CPUs,
+    DIMMs and GPUs, from the same resource unless the profile of the vendor
+    locates them elsewhere;
+    """)
+    parser.add_argument('--fans', action='store_true', help="""
+    Get the speed of each fan as well, in RPM or percent, from the same
+    resource unless the profile of the vendor locates them elsewhere;
+    """)
     # others
+    parser.add_argument('--metric_report', default=None, help="""
+    Id of a MetricReport of the TelemetryService, e.g. ThermalSensor. The
+    last, min, avg and max of the metric in the report are got instead of
+    reading the resource, which is read if the report is not available;
+    """)
+    parser.add_argument('--report_metric', default=None, help="""
+    MetricId of the metric in the report, default is the metric of the
+    matched objects of data_url, or of the resources discovered;
+    """)
+    parser.add_argument('--report_interval', default=300, type=int, help="""
+    Seconds of the samples of the report summarized, default is 300;
+    """)
     parser.add_argument('--timeout', default=5, type=int, help="""
     Timeout in seconds, default is 5s;
     """)
     parser.add_argument('--max_attempt', default=1, type=int, help="""
     Max attempt times, default is 1;
     """)
+    parser.add_argument('--cache_ttl', default=3600, type=int, help="""
+    Seconds the navigation resources of the BMC are cached for, 0 disables
+    the resource cache, default is 3600;
+    """)
+    parser.add_argument('--no_session_cache', dest='session_cache',
+                        action='store_false', help="""
+    Log in and out at each check, instead of sharing a cached session with
+    the other checks of the BMC;
+    """)
     parser.add_argument('--verbose', action='store_true', help="""
     Verbose mode;
     """)
@@ -129,14 +234,8 @@ if __name__ == '__main__':
         logger.set_logger()
         with RedfishConnection(args) as conn:
             if args.vendor is not None and args.data_url is None:
-                vendor = getattr(common, f"Vendor{args.vendor}")
-                args.identify = (
-                    vendor.temperature.get("identify").get("key"),
-                    vendor.temperature.get("identify").get("values")
-                )
-                args.data_url = vendor.temperature.get("uri")
-                args.property = vendor.temperature.get("property")
-                args.metric = vendor.temperature.get("metric")
+                apply_vendor_profile(
+                    args, get_vendor_profile(args.vendor)["temperature"])
             else:
                 args.identify = conn.parse_identify(str(args.identify))
 
@@ -14,151 +14,134 @@
 # limitations under the License.
 
 import argparse
+import itertools
 import os
 import re
 import socket
-from collections import defaultdict
-
-import psutil
 
 from lico.monitor.plugins.icinga.helper.base import PluginData
-from lico.monitor.plugins.icinga.scheduler.utils.jobinfo import (
-    ProcessInfo, get_job_info,
-)
+from lico.monitor.plugins.icinga.scheduler.utils.cgroup import LSFCgroup
+from lico.monitor.plugins.icinga.scheduler.utils.jobinfo import get_job_info
 from lico.monitor.plugins.icinga.scheduler.utils.schedulerbase import (
-    SchedulerBase, SchedulerInfo,
+    SchedulerBase,
 )
 
+# bjobs -UF prints each job on a few unwrapped lines, the jobs are
+# separated by a line of 78 dashes
+SPLIT_LINE = '-' * 78
+JOBID_PATTERN = re.compile(r"Job <([^<|^>]+)>,")
+RES_PATTERN = re.compile(r"Resource usage collected.([^\n]*)")
+HOST_PATTERN = re.compile(r"([^;]+);")
+HOST_PIDS_PATTERN = re.compile(r"PIDs:([^;]*);")
+TASK_ON_HOST_PATTERN = re.compile(
+    r"Started\s\d+\sTask\(s\)\son\sHost\(s\)\s([^,]*)", re.I)
+TASK_HOST_PATTERN = re.compile(r"<(\d+\*)?([^>]+)>")
+PIDS_PATTERN = re.compile("PIDs:[^;]+")
+PID_PATTERN = re.compile(r"\d+")
+
 
 class SchedulerJobInfo(SchedulerBase):
+    cgroup = LSFCgroup
     get_running_jobs_cmd = 'bjobs -UF {0} -u all'
     convert_states = {
         'running': '-r',
         'pending': '-p'
     }
+    # Ask LSF for the jobs on this host only, instead of all the jobs
+    # of the cluster
+    local_host = True
 
     @classmethod
     def init_cmd(cls, states):
         from subprocess import list2cmdline  # nosec B404
+        origin_cmd = cls.get_running_jobs_cmd.format(
+            cls.convert_states[states]).split()
+        if cls.local_host:
+            origin_cmd += ['-m', socket.gethostname()]
         cmd = [
             'bash', '--login', '-c',
-            list2cmdline(cls.get_running_jobs_cmd.format(
-                cls.convert_states[states]).split())
+            list2cmdline(origin_cmd)
         ]
         return cmd
 
-    @classmethod
-    def build_point(cls, metric, value, value_type, unit):
-        return {
-            'metric': metric,
-            'value': value,
-            'type': value_type,
-            'units': unit
-        }
-
-    @classmethod
-    def _init_sche_process(cls, job_pid_group):
-        sche_list = []
-        for sche_id, pid_list in job_pid_group.items():
-            sche = SchedulerInfo(id=sche_id,
-                                 process=defaultdict(),
-                                 gpu=defaultdict(),
-                                 gpu_vram=defaultdict(int))
-
-            for pid in pid_list:
-                try:
-                    proc = psutil.Process(int(pid))
-                except psutil.NoSuchProcess as e:
-                    cls.print_err(f'process {str(e).split()[-1]} of job '
-                                  f'{sche_id} is not exist')
-                    continue
-                except ValueError:
-                    cls.print_err(f'process of job is {int(pid)},'
-                                  f'which causes ValueError')
-                    continue
-                except Exception as e:
-                    cls.print_err(e)
-                    # print(e)
+    @staticmethod
+    def parse_job_pids(started, res, hostname):
+        """
+        Return the pids of a job on hostname, or None if the job is not
+        running on hostname.
+        started is the "Started ... Task(s) on Host(s) ..." field and res is
+        the "Resource usage collected." field of the job.
+        """
+        if "HOST" in res:
+            pids = None
+            for info in res.split("HOST:")[1:]:
+                pattern = HOST_PATTERN.match(info.strip())
+                host = pattern.groups()[0] if pattern else None
+                if host != hostname:
                     continue
-                p_info = ProcessInfo()
-                p_info.s_id = sche_id
-                p_info.process = proc
-                proc.cpu_percent()  # call once before real called
-                sche.process[int(pid)] = p_info
+                pattern = HOST_PIDS_PATTERN.search(info)
+                pids = pattern.groups()[0] if pattern else ""
+                pids = pids.strip().split(" ")
+            return pids
+        if started is None:
+            return None
+        host_list = TASK_HOST_PATTERN.findall(started)
+        if not host_list or \
+                host_list[0][1].lower() != hostname.lower():
+            return None
+        pid_all = []
+        for pid in PIDS_PATTERN.findall(res):
+            pid_all += PID_PATTERN.findall(pid)
+        return pid_all
 
-            sche_list.append(sche)
-        return sche_list
+    @classmethod
+    def parse_jobs(cls, lines, hostname):
+        """
+        Parse the output of "bjobs -UF" line by line,
+        yield (job_id, pids) of the jobs running on hostname.
+        """
+        jobid = started = res = None
+        for line in itertools.chain(lines, [SPLIT_LINE]):
+            line = line.strip()
+            if line == SPLIT_LINE:
+                pids = cls.parse_job_pids(started, res or "", hostname)
+                if pids is not None:
+                    yield jobid, pids
+                jobid = started = res = None
+                continue
+            if jobid is None:
+                pattern = JOBID_PATTERN.search(line)
+                jobid = pattern.groups()[0] if pattern else None
+            if res is None:
+                pattern = RES_PATTERN.search(line)
+                res = pattern.groups()[0] if pattern else None
+            if started is None:
+                pattern = TASK_ON_HOST_PATTERN.search(line)
+                started = pattern.groups()[0] if pattern else None
 
     @classmethod
     def get_pid_by_job(cls, states='running'):
+        job_pid_dict = cls.get_pid_by_job_from_cgroup()
+        if job_pid_dict is not None:
+            return job_pid_dict
         job_pid_dict = dict()
         hostname = socket.gethostname()
-        job_out, job_err, job_ret = cls.command_call(
-            cls.init_cmd(states), lambda: os.seteuid(os.getuid())
-        )
-        if job_ret or not job_out:
-            cls.print_err(job_out + job_err)
-            return job_pid_dict
-        split_str = "-" * 78
-        data = job_out.decode().strip().split(split_str)
-
-        for item in data:
-            jobid_pattern = re.compile(r"Job <([^<|^>]+)>,")
-            pattern = jobid_pattern.search(item.strip())
-            jobid = pattern.groups()[0] if pattern else None
-
-            res_pattern = re.compile(r"Resource usage collected.([^\n]*)")
-            pattern = res_pattern.search(item)
-            res = pattern.groups()[0] if pattern else ""
-
-            if "HOST" in res:
-                res = res.split("HOST:")
-                for info in res[1:]:
-                    host_pattern = re.compile(r"([^;]+);")
-                    pattern = host_pattern.match(info.strip())
-                    host = pattern.groups()[0] if pattern else None
-                    if host != hostname:
-                        continue
-                    pids_pattern = re.compile(r"PIDs:([^;]*);")
-                    pattern = pids_pattern.search(info)
-                    pids = pattern.groups()[0] if pattern else ""
-                    pids = pids.strip().split(" ")
-                    job_pid_dict[jobid] = pids
-            else:
-                task_on_host_pattern = re.compile(
-                    r"Started\s\d+\sTask\(s\)\son\sHost\(s\)\s([^,]*)", re.I)
-                pattern = task_on_host_pattern.search(item.strip())
-                if not pattern:
-                    continue
-                hosts = pattern.groups()[0]
-                host_list = re.findall(r"<(\d+\*)?(.+)>", hosts)
-                if not host_list or \
-                        host_list[0][1].lower() != hostname.lower():
-                    continue
-                pids_pattern = re.compile("PIDs:[^;]+")
-                pids = pids_pattern.findall(res)
-                pid_all = []
-                for pid in pids:
-                    pid_pattern = re.compile(r"\d+")
-                    pid_list = pid_pattern.findall(pid)
-                    pid_all += pid_list
-                job_pid_dict[jobid] = pid_all
+        for jobid, pids in cls.parse_jobs(
+                cls.command_lines(cls.init_cmd(states),
+                                  lambda: os.seteuid(os.getuid())),
+                hostname):
+            job_pid_dict[jobid] = pids
         """"
         return example:
         {'3351':[1211,222334,1111],'3352':[1211,222334,1111]}
         """
         return job_pid_dict
 
-    @classmethod
-    def get_job_by_pid(cls, pid):
-        response = cls.get_pid_by_job()
-        for jobid, values in response.items():
-            if pid in values:
-                return jobid
-
 
 def get_lsf_job_info(plugin_data, args):
     SchedulerJobInfo.verbose = args.verbose
+    SchedulerJobInfo.discovery = args.discovery
+    SchedulerJobInfo.local_host = not args.all_hosts
     get_job_info(SchedulerJobInfo, plugin_data, args)
 
 
@@ -174,6 +157,21 @@ if __name__ == '__main__':
                         Get job information for LSF;
                         """
                         )
+    parser.add_argument('--discovery', default='auto',
+                        choices=['auto', 'cgroup', 'command'],
+                        help="""
+                        How to discover the processes of jobs, default is
+                        auto, which reads the job cgroups created by LSF
+                        if they exist, or else calls the LSF commands;
+                        """
+                        )
+    parser.add_argument('--all-hosts', action='store_true',
+                        help="""
+                        Query the jobs of all the hosts from LSF and filter
+                        the jobs of this host locally, instead of querying
+                        the jobs of this host only by bjobs -m;
+                        """
+                        )
     args = parser.parse_args()
     plugin_data = PluginData()
 
@@ -16,25 +16,69 @@
 
 
 import argparse
+import json
 import os
 import re
 import socket
+import struct
 from collections import defaultdict
 
-import psutil
-
 from lico.monitor.plugins.icinga.helper.base import PluginData
-from lico.monitor.plugins.icinga.scheduler.utils.jobinfo import (
-    ProcessInfo, get_job_info,
-)
+from lico.monitor.plugins.icinga.helper.state import StateFile
+from lico.monitor.plugins.icinga.scheduler.utils.cgroup import PBSCgroup
+from lico.monitor.plugins.icinga.scheduler.utils.jobinfo import get_job_info
+from lico.monitor.plugins.icinga.scheduler.utils.proctree import ProcessTracker
 from lico.monitor.plugins.icinga.scheduler.utils.schedulerbase import (
-    SchedulerBase, SchedulerInfo,
+    SchedulerBase,
 )
 
+# 3113.server or 3113[1].server
+JOB_ID_PATTERN = re.compile(r'(\d+(?:\[\d+\])?)\.')
+JOB_FILE_PATTERN = re.compile(r'(\d+(?:\[\d+\])?)\..*\.JB')
+# The lengths at the end of the header of a svrattrl record in a job file:
+# al_tsize, al_nameln, al_rescln, al_valln, al_flags, al_refct. The header
+# is followed by the name, the resource if al_rescln is not 0, and the
+# value, each ending with a NUL and counted in its length.
+SVRATTRL_LENGTHS = struct.Struct('=6i')
+
+
+def parse_job_attribute(content, name):
+    """
+    Return the value of an attribute without resource of a job file of
+    the MoM, from the svrattrl record of the attribute, or None.
+    The record is found by its name, the size of the header before the
+    lengths depends on the version of PBS, it is checked by al_tsize.
+    """
+    name = name.encode() + b'\x00'
+    start = content.find(name)
+    while start != -1:
+        offset = start - SVRATTRL_LENGTHS.size
+        if offset >= 0:
+            tsize, nameln, rescln, valln, _, _ = \
+                SVRATTRL_LENGTHS.unpack_from(content, offset)
+            value_start = start + nameln + rescln
+            if nameln == len(name) and rescln == 0 and valln > 0 and \
+                    tsize > SVRATTRL_LENGTHS.size + nameln + valln and \
+                    value_start + valln <= len(content) and \
+                    content[value_start + valln - 1] == 0:
+                return content[value_start:value_start + valln - 1].decode(
+                    errors='replace')
+        start = content.find(name, start + 1)
+    return None
+
 
 class SchedulerJobInfo(SchedulerBase):
+    cgroup = PBSCgroup
     get_running_jobs_cmd = "printjob -a {0} | grep -E 'parentjob|sid'"
     job_id_cmd = ['qstat', '-rftn']
+    node_json_cmd = ['pbsnodes', '-F', 'json', '-v']
+    job_json_cmd = ['qstat', '-f', '-F', 'json']
+    pbs_conf = '/etc/pbs.conf'
+    default_pbs_home = '/var/spool/pbs'
+    job_sid_state = StateFile('pbs_job_sid.json')
+    # Where to get the session ids of the jobs from, auto tries the job
+    # files of the local MoM, then qstat in json, then printjob
+    source = 'auto'
 
     @classmethod
     def init_cmd(cls, origin_cmd):
@@ -45,33 +89,128 @@ class SchedulerJobInfo(SchedulerBase):
         ]
         return cmd
 
-    def _init_sche_process(self, job_pid_group):
-        sche_list = []
-        for sche_id, pid_list in job_pid_group.items():
-            sche = SchedulerInfo(id=sche_id,
-                                 process=defaultdict(),
-                                 gpu=defaultdict(),
-                                 gpu_vram=defaultdict(int))
-            for pid in pid_list:
-                try:
-                    proc = psutil.Process(int(pid))
-                except psutil.NoSuchProcess as e:
-                    self.print_err(
-                        f'process {str(e).split()[-1]} of job '
-                        f'{sche_id} is not exist'
-                    )
-                    continue
-                p_info = ProcessInfo()
-                p_info.s_id = sche_id
-                p_info.process = proc
-                proc.cpu_percent()  # call once before real called
-                sche.process[int(pid)] = p_info
-            sche_list.append(sche)
-        return sche_list
+    @classmethod
+    def get_pbs_home(cls):
+        pbs_home = os.environ.get('PBS_HOME')
+        if pbs_home:
+            return pbs_home
+        try:
+            with open(os.environ.get('PBS_CONF_FILE', cls.pbs_conf),
+                      'r') as f:
+                for line in f:
+                    key, _, value = line.strip().partition('=')
+                    if key == 'PBS_HOME_PATH' and value:
+                        return value
+        except OSError:
+            pass
+        return cls.default_pbs_home
 
     @classmethod
-    def get_pid_by_job(cls):
-        job_pid_dict = defaultdict(list)
+    def get_job_sid_from_mom(cls):
+        """
+        Read the session ids of the jobs from the job files of the local
+        MoM, $PBS_HOME/mom_priv/jobs/<job id>.JB. The job id and session id
+        of a job file are cached with its mtime, so only the new and changed
+        job files are read.
+        Return None if the job files can not be read.
+        format of return like [(job_id, job_sid),]
+        """
+        jobs_dir = os.path.join(cls.get_pbs_home(), 'mom_priv', 'jobs')
+        try:
+            entries = [
+                entry for entry in os.scandir(jobs_dir)
+                if entry.name.endswith('.JB')
+            ]
+        except OSError as e:
+            cls.print_err(e)
+            return None
+        cache = cls.job_sid_state.load()
+        job_sid_cache = dict()
+        for entry in entries:
+            job_sid_cache[entry.name] = cls._read_job_file(
+                entry, cache.get(entry.name))
+        if job_sid_cache != cache:
+            cls.job_sid_state.save(job_sid_cache)
+        return [
+            (job_id, job_sid)
+            for _, job_id, job_sid in job_sid_cache.values() if job_sid
+        ]
+
+    @classmethod
+    def _read_job_file(cls, entry, cached):
+        try:
+            mtime = entry.stat().st_mtime_ns
+            if cached and cached[0] == mtime:
+                return cached
+            with open(entry.path, 'rb') as f:
+                content = f.read()
+        except OSError as e:
+            cls.print_err(e)
+            return [None, None, None]
+        match = JOB_FILE_PATTERN.match(entry.name)
+        job_id = match.group(1) if match else None
+        job_sid = parse_job_attribute(content, 'session_id')
+        if job_sid is not None and not job_sid.isdigit():
+            job_sid = None
+        return [mtime, job_id, job_sid]
+
+    @classmethod
+    def _call_json(cls, cmd):
+        out, err, ret = cls.command_call(
+            cls.init_cmd(cmd),
+            lambda: os.seteuid(os.getuid())
+        )
+        try:
+            # qstat exits with an error but prints the other jobs if a job
+            # has finished since it is listed
+            if not out:
+                raise ValueError(err)
+            return json.loads(out.decode())
+        except ValueError as e:
+            cls.print_err(e)
+            return None
+
+    @classmethod
+    def get_job_sid_from_qstat(cls):
+        """
+        Get the session ids of the jobs whose mother superior is this host.
+        The server only sends the jobs running on this host, listed by
+        pbsnodes. Return None if qstat does not support the json format.
+        format of return like [(job_id, job_sid),]
+        """
+        hostname = socket.gethostname()
+        nodes = cls._call_json(cls.node_json_cmd + [hostname])
+        if nodes is None:
+            return None
+        # "jobs": ["3113.server/0", "3113.server/1"]
+        job_names = sorted({
+            job.split('/')[0]
+            for node in nodes.get('nodes', {}).values()
+            for job in node.get('jobs', [])
+        })
+        if not job_names:
+            return []
+        jobs = cls._call_json(cls.job_json_cmd + job_names)
+        if jobs is None:
+            return None
+        jobs = jobs.get('Jobs', {})
+        job_sid_group = []
+        for job_name, job in jobs.items():
+            exec_host = job.get('exec_host', '')
+            if job.get('job_state') != 'R' or 'session_id' not in job or \
+                    exec_host.split('/')[0] != hostname:
+                continue
+            match = JOB_ID_PATTERN.match(job_name)
+            if match:
+                job_sid_group.append(
+                    (match.group(1), str(job['session_id'])))
+        return job_sid_group
+
+    @classmethod
+    def get_job_sid_from_printjob(cls):
+        """
+        format of return like [(job_id, job_sid),]
+        """
         hostname = socket.gethostname()
 
         jobid_out, jobid_err, jobid_ret = cls.command_call(
@@ -80,7 +219,7 @@ class SchedulerJobInfo(SchedulerBase):
         )
         if jobid_ret or not jobid_out:
             cls.print_err(jobid_out + jobid_err)
-            return job_pid_dict
+            return []
 
         server_object = re.search(r'-----\n(.*?) ',
                                   jobid_out.decode('utf-8')).group(1)
@@ -105,14 +244,36 @@ class SchedulerJobInfo(SchedulerBase):
         )
         if job_ret or not job_out:
             cls.print_err(job_out + job_err)
+            return []
+
+        return re.findall(pattern_job_sid, job_out.decode('utf-8'))
+
+    @classmethod
+    def get_job_sid(cls):
+        if cls.source in ('auto', 'mom'):
+            job_sid_group = cls.get_job_sid_from_mom()
+            if job_sid_group is not None or cls.source == 'mom':
+                return job_sid_group or []
+        if cls.source in ('auto', 'qstat'):
+            job_sid_group = cls.get_job_sid_from_qstat()
+            if job_sid_group is not None or cls.source == 'qstat':
+                return job_sid_group or []
+        return cls.get_job_sid_from_printjob()
+
+    @classmethod
+    def get_pid_by_job(cls):
+        job_pid_dict = cls.get_pid_by_job_from_cgroup()
+        if job_pid_dict is not None:
             return job_pid_dict
+        job_pid_dict = defaultdict(list)
 
         # format of job_sid_group like [(job_id, job_sid),]
-        job_sid_group = re.findall(pattern_job_sid, job_out.decode('utf-8'))
+        job_sid_group = cls.get_job_sid()
+        tracker = ProcessTracker()
         for job_id, job_sid in job_sid_group:
             if '-' not in job_sid:
-                job_pid_all = cls.get_child_pids(job_sid, True)
-                job_pid_dict[job_id] += job_pid_all
+                job_pid_dict[job_id] += tracker.track(job_id, job_sid)
+        tracker.save()
         for job_id, pids in job_pid_dict.items():
             job_pid_dict[job_id] = list(set(job_pid_dict[job_id]))
         """"
@@ -142,15 +303,11 @@ class SchedulerJobInfo(SchedulerBase):
                 job_object[job_id_arr[0]] = list(host_list)
         return job_object
 
-    def get_job_by_pid(self, pid):
-        response = self.get_pid_by_job()
-        for jobid, values in response.items():
-            if int(pid) in values:
-                return jobid
-
 
 def get_pbs_job_info(plugin_data, args):
     SchedulerJobInfo.verbose = args.verbose
+    SchedulerJobInfo.discovery = args.discovery
+    SchedulerJobInfo.source = args.source
     get_job_info(SchedulerJobInfo, plugin_data, args)
 
 
@@ -166,6 +323,24 @@ if __name__ == '__main__':
                         Get job information for PBS;
                         """
                         )
+    parser.add_argument('--discovery', default='auto',
+                        choices=['auto', 'cgroup', 'command'],
+                        help="""
+                        How to discover the processes of jobs, default is
+                        auto, which reads the job cgroups created by PBS
+                        if they exist, or else calls the PBS commands;
+                        """
+                        )
+    parser.add_argument('--source', default='auto',
+                        choices=['auto', 'mom', 'qstat', 'printjob'],
+                        help="""
+                        Where to get the session ids of the jobs from when
+                        the jobs are discovered by the PBS commands, default
+                        is auto, which reads the job files of the local MoM
+                        if they can be read, or else calls qstat in json
+                        format, or else calls qstat and printjob;
+                        """
+                        )
     args = parser.parse_args()
     plugin_data = PluginData()
 
@@ -16,53 +16,103 @@
 import argparse
 import os
 import socket
+from collections import defaultdict
 
 from lico.monitor.plugins.icinga.helper.base import PluginData
-from lico.monitor.plugins.icinga.scheduler.utils.jobinfo import get_job_info
+from lico.monitor.plugins.icinga.scheduler.utils.cgroup import SlurmCgroup
+from lico.monitor.plugins.icinga.scheduler.utils.jobinfo import (
+    get_job_info, get_job_step_info,
+)
 from lico.monitor.plugins.icinga.scheduler.utils.schedulerbase import (
     SchedulerBase,
 )
 
 
 class SchedulerJobInfo(SchedulerBase):
+    cgroup = SlurmCgroup
+    # %A is the unique job id, %i is the job id shown for the elements of
+    # job arrays (<base_job_id>_<index>) and the components of
+    # heterogeneous jobs (<het_job_id>+<offset>)
     get_running_jobs_cmd = \
-        'squeue -w {0} --states={1} --Format=JOBID --noheader'
+        ['squeue', '-w', '{0}', '--states={1}', '--noheader', '-o', '%A %i']
     get_job_pids_cmd = ['scontrol', 'listpids']
 
     @classmethod
-    def get_pid_by_job(cls, states='running'):
-        job_pid_dict = dict()
+    def get_job_ids(cls, states='running'):
+        """
+        return example:
+        {'3351': '3351', '3352': '3352', '3350_1': '3352'}
+        Map each form of the id of a job to the unique job id.
+        """
         hostname = socket.gethostname()
-        job_out, job_err, job_ret = cls.command_call(
-            cls.get_running_jobs_cmd.format(hostname, states).split(),
-            lambda: os.seteuid(os.getuid())
-        )
-        if job_ret or not job_out:
-            cls.print_err(job_out + job_err)
-            return job_pid_dict
+        job_ids = dict()
+        for line in cls.command_lines(
+                [i.format(hostname, states) for i in cls.get_running_jobs_cmd],
+                lambda: os.seteuid(os.getuid())):
+            fields = line.split()
+            if not fields:
+                continue
+            for job_id in fields:
+                job_ids[job_id] = fields[0]
+        return job_ids
 
-        job_ids_list = job_out.decode().strip().split()
-        pids_out, pids_err, pids_ret = cls.command_call(
-            cls.get_job_pids_cmd,
-            lambda: os.seteuid(os.getuid())
-        )
-        if pids_ret or not pids_out:
-            cls.print_err(pids_out + pids_err)
+    @classmethod
+    def parse_listpids(cls, lines, job_ids=None):
+        """
+        Example for the output of "scontrol listpids":
+        PID      JOBID    STEPID   LOCALID GLOBALID
+        1174     3351     batch    0       0
+        1186     3351     0        0       0
+        1190     3352     0+1      -       -
+        yield (pid, job_id, step_id) of the jobs in job_ids, or of all jobs
+        if job_ids is None.
+        """
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 3 or not fields[0].isdigit():
+                continue
+            pid, job_id, step_id = fields[:3]
+            if job_ids is not None:
+                job_id = job_ids.get(job_id)
+                if job_id is None:
+                    continue
+            yield pid, job_id, step_id
+
+    @classmethod
+    def get_pid_by_job(cls, states='running'):
+        job_pid_dict = cls.get_pid_by_job_from_cgroup()
+        if job_pid_dict is not None:
+            return job_pid_dict
+        job_pid_dict = defaultdict(list)
+        job_ids = cls.get_job_ids(states)
+        if not job_ids:
             return job_pid_dict
 
-        pid_job_list = pids_out.decode().strip().split('\n')[1:]
-        for pid_str in pid_job_list:
-            pid_list = pid_str.strip().split()
-            if pid_list[1] not in job_ids_list:
-                break
-            if pid_list[1] in job_pid_dict:
-                job_pid_dict[pid_list[1]].append(pid_list[0])
-            else:
-                job_pid_dict[pid_list[1]] = [pid_list[0]]
+        for pid, job_id, _ in cls.parse_listpids(
+                cls.command_lines(cls.get_job_pids_cmd,
+                                  lambda: os.seteuid(os.getuid())),
+                job_ids):
+            job_pid_dict[job_id].append(pid)
         return job_pid_dict
 
+    @classmethod
+    def get_pid_by_step(cls, job_id=None):
+        """
+        return example:
+        {'3351': {'batch': ['1174'], '0': ['1186']}}
+        Only the steps of job_id are listed if it is specified.
+        """
+        job_step_pid_dict = defaultdict(lambda: defaultdict(list))
+        cmd = cls.get_job_pids_cmd + ([str(job_id)] if job_id else [])
+        for pid, s_job_id, step_id in cls.parse_listpids(
+                cls.command_lines(cmd, lambda: os.seteuid(os.getuid()))):
+            job_step_pid_dict[s_job_id][step_id].append(pid)
+        return job_step_pid_dict
+
     @classmethod
     def get_job_by_pid(cls, pid):
+        if cls.index is not None:
+            return cls.index.get_job(pid)
         output, err, ret = cls.command_call(
             ['scontrol', 'pidinfo', pid]
         )
@@ -84,7 +134,10 @@ class SchedulerJobInfo(SchedulerBase):
 
 def get_slurm_job_info(plugin_data, args):
     SchedulerJobInfo.verbose = args.verbose
+    SchedulerJobInfo.discovery = args.discovery
     get_job_info(SchedulerJobInfo, plugin_data, args)
+    if args.step:
+        get_job_step_info(SchedulerJobInfo, plugin_data, args)
 
 
 if __name__ == '__main__':
@@ -95,6 +148,15 @@ if __name__ == '__main__':
     parser.add_argument('--jobinfo', action='store_true', help="""
     Get job information for SLURM;
     """)
+    parser.add_argument('--step', action='store_true', help="""
+    Get the information of each job step as well, used with --jobinfo;
+    """)
+    parser.add_argument('--discovery', default='auto',
+                        choices=['auto', 'cgroup', 'command'], help="""
+    How to discover the processes of jobs, default is auto, which reads the
+    job cgroups created by SLURM if they exist, or else calls the SLURM
+    commands;
+    """)
     args = parser.parse_args()
     plugin_data = PluginData()
     if args.jobinfo:
@@ -0,0 +1,246 @@
+#! /usr/bin/python3
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from collections import defaultdict
+
+from lico.monitor.plugins.icinga.helper.base import MetricsBase
+from lico.monitor.plugins.icinga.helper.state import StateFile
+from lico.monitor.plugins.icinga.network.ib.lico_check_infiniband import (
+    get_device_list,
+)
+from lico.monitor.plugins.icinga.scheduler.utils.gpu import get_gpu_energy
+
+
+class CounterRates:
+    """
+    Rates of monotonic counters, computed against the snapshot saved by
+    the previous run, so a check never has to sleep between two samples.
+    """
+
+    def __init__(self, name):
+        self.state = StateFile(name)
+        self._previous = self.state.load()
+        self._current = dict()
+
+    def update(self, key, counters):
+        """
+        Return the rates per second of the counters since the previous run
+        and the interval in seconds, or None if key has no previous
+        snapshot. A counter which is reset, e.g. by the exit of a process,
+        has no rate.
+        """
+        now = time.monotonic()
+        self._current[key] = {'time': now, 'counters': counters}
+        prev = self._previous.get(key)
+        if not prev or now <= prev['time']:
+            return None
+        interval = now - prev['time']
+        rates = dict()
+        for name, value in counters.items():
+            prev_value = prev['counters'].get(name)
+            if value is None or prev_value is None or value < prev_value:
+                continue
+            rates[name] = (value - prev_value) / interval
+        return rates, interval
+
+    def save(self):
+        # Only the keys updated by this run are saved, the finished jobs
+        # are dropped
+        return self.state.save(self._current)
+
+
+def _sum_cgroup_usage(read_usage, cgroups):
+    total = defaultdict(int)
+    for path in cgroups:
+        usage = read_usage(path)
+        if usage is None:
+            return None
+        for key, value in usage.items():
+            total[key] += value
+    return dict(total) if cgroups else None
+
+
+def _read_process_io(pid):
+    io_usage = dict()
+    try:
+        with open(f'/proc/{pid}/io', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('read_bytes', 'write_bytes'):
+                    io_usage[key] = int(value)
+    except (OSError, ValueError):
+        return None
+    return io_usage
+
+
+def _job_io_counters(cgroup, sche):
+    if cgroup is not None:
+        io_usage = _sum_cgroup_usage(cgroup.read_io_usage, sche.cgroup)
+        if io_usage is not None:
+            return io_usage
+    # The counters of each process are kept apart, so the exit of a
+    # process does not reset the counters of the job
+    counters = dict()
+    for pid in sche.process:
+        io_usage = _read_process_io(pid)
+        for key, value in (io_usage or {}).items():
+            counters[f'{pid}:{key}'] = value
+    # None if the io of no process is readable, e.g. without the
+    # permission, rather than no io
+    return counters or None
+
+
+def io_collector(engine, sche_list, plugin_data):
+    io_rates = CounterRates('job_io_usage.json')
+    for sche in sche_list:
+        counters = _job_io_counters(engine.discovery.cgroup, sche)
+        if counters is None:
+            continue
+        result = io_rates.update(sche.id, counters)
+        # No counter has a rate, e.g. the processes are all new, the io
+        # of the job is unknown
+        if result is None or not result[0]:
+            continue
+        rates, _ = result
+        read_rate = round(sum(
+            v for k, v in rates.items() if k.endswith('read_bytes')))
+        write_rate = round(sum(
+            v for k, v in rates.items() if k.endswith('write_bytes')))
+        plugin_data.add_perf_data(f"job_{sche.id}_io_read={read_rate}B")
+        plugin_data.add_perf_data(f"job_{sche.id}_io_write={write_rate}B")
+        plugin_data.add_point(MetricsBase.build_point(
+            'job_io_read', read_rate, 'float', 'B'), job=sche.id)
+        plugin_data.add_point(MetricsBase.build_point(
+            'job_io_write', write_rate, 'float', 'B'), job=sche.id)
+    io_rates.save()
+
+
+def _ib_counters():
+    ports = [p for dev in get_device_list() for p in dev.ports]
+    if not ports:
+        return None
+    return {
+        'rcv_data': sum(p.io_counters.rcv_data for p in ports),
+        'xmit_data': sum(p.io_counters.xmit_data for p in ports)
+    }
+
+
+def rdma_collector(engine, sche_list, plugin_data):
+    cgroup = engine.discovery.cgroup
+    for sche in sche_list:
+        if cgroup is None:
+            break
+        usage = _sum_cgroup_usage(cgroup.read_rdma_usage, sche.cgroup)
+        if usage is None:
+            continue
+        plugin_data.add_perf_data(
+            f"job_{sche.id}_rdma_hca_handle={usage['hca_handle']}")
+        plugin_data.add_perf_data(
+            f"job_{sche.id}_rdma_hca_object={usage['hca_object']}")
+        plugin_data.add_point(MetricsBase.build_point(
+            'job_rdma_hca_handle', usage['hca_handle'], 'uint', ''),
+            job=sche.id)
+        plugin_data.add_point(MetricsBase.build_point(
+            'job_rdma_hca_object', usage['hca_object'], 'uint', ''),
+            job=sche.id)
+
+    # The IB traffic is only counted by the ports of the node, there is no
+    # per-job counter. The rates of the node ports are reported with a job
+    # only when it is the only job running on the node, they include the
+    # traffic of anything else using the ports, e.g. a parallel file system
+    ib_rates = CounterRates('job_ib_usage.json')
+    ib_counters = _ib_counters() \
+        if len(sche_list) == 1 and sche_list[0].process else None
+    if ib_counters is not None:
+        sche = sche_list[0]
+        result = ib_rates.update(sche.id, ib_counters)
+        if result is not None and len(result[0]) == 2:
+            ib_in = round(result[0]['rcv_data'])
+            ib_out = round(result[0]['xmit_data'])
+            plugin_data.add_perf_data(
+                f"job_{sche.id}_node_ib_port_in={ib_in}B")
+            plugin_data.add_perf_data(
+                f"job_{sche.id}_node_ib_port_out={ib_out}B")
+            plugin_data.add_point(MetricsBase.build_point(
+                'job_node_ib_port_in', ib_in, 'float', 'B'), job=sche.id)
+            plugin_data.add_point(MetricsBase.build_point(
+                'job_node_ib_port_out', ib_out, 'float', 'B'), job=sche.id)
+    ib_rates.save()
+
+
+def _gpu_power(gpu_energy):
+    """
+    return example:
+    {'GPU-6a4b...': (70.5, 60.0)}  # uuid: (power in W, interval in s)
+    The power is the average since the previous run if the GPU reports
+    its energy counter, or else the current power draw.
+    """
+    energy_rates = CounterRates('gpu_energy.json')
+    gpu_power = dict()
+    for g_uuid, value in gpu_energy.items():
+        result = energy_rates.update(g_uuid, {'energy': value['energy']})
+        if result is None:
+            continue
+        rates, interval = result
+        if 'energy' in rates:
+            # mJ/s to W
+            gpu_power[g_uuid] = (rates['energy'] / 1000, interval)
+        elif value['power'] is not None:
+            gpu_power[g_uuid] = (value['power'], interval)
+    energy_rates.save()
+    return gpu_power
+
+
+def gpu_energy_collector(engine, sche_list, plugin_data):
+    """
+    Attribute the energy of the GPUs to the jobs using them, a GPU shared
+    by several jobs is divided evenly. It runs after the gpu collector,
+    which finds the GPUs of the jobs.
+    """
+    jobs_on_gpu = defaultdict(int)
+    for sche in sche_list:
+        for g_uuid in sche.gpu:
+            jobs_on_gpu[g_uuid] += 1
+    get_energy = get_gpu_energy() if jobs_on_gpu else None
+    if get_energy is None:
+        return
+    gpu_power = _gpu_power(get_energy())
+
+    energy_state = StateFile('job_gpu_energy.json')
+    prev_job_energy, job_energy = energy_state.load(), dict()
+    for sche in sche_list:
+        power = [
+            (gpu_power[g_uuid][0] / jobs_on_gpu[g_uuid],
+             gpu_power[g_uuid][1])
+            for g_uuid in sche.gpu if g_uuid in gpu_power
+        ]
+        if not power:
+            if sche.id in prev_job_energy:
+                job_energy[sche.id] = prev_job_energy[sche.id]
+            continue
+        # energy in J consumed by the job since it is first seen
+        job_energy[sche.id] = round(prev_job_energy.get(sche.id, 0) + sum(
+            p * interval for p, interval in power), 1)
+        job_power = round(sum(p for p, _ in power), 1)
+        plugin_data.add_perf_data(f"job_{sche.id}_gpu_power={job_power}W")
+        plugin_data.add_perf_data(
+            f"job_{sche.id}_gpu_energy={job_energy[sche.id]}J")
+        plugin_data.add_point(MetricsBase.build_point(
+            'job_gpu_power', job_power, 'float', 'W'), job=sche.id)
+        plugin_data.add_point(MetricsBase.build_point(
+            'job_gpu_energy', job_energy[sche.id], 'float', 'J'),
+            job=sche.id)
+    energy_state.save(job_energy)
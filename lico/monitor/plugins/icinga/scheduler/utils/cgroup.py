@@ -0,0 +1,276 @@
+#! /usr/bin/python3
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+from collections import defaultdict
+from glob import glob
+
+
+class CgroupBase:
+    """
+    Discover the jobs running on this node from the cgroup tree created by
+    the scheduler, without any request to the scheduler controller.
+    """
+    root = '/sys/fs/cgroup'
+    # On cgroup v1, the jobs are discovered from the first mounted controller
+    v1_controllers = ['freezer', 'cpuacct', 'memory', 'cpuset', 'pids']
+    # Glob patterns of the job cgroups, relative to the controller mount
+    # point (v1) or to the unified hierarchy (v2)
+    v1_job_patterns = []
+    v2_job_patterns = []
+    # Match the base name of a job cgroup, the first group is the job id
+    job_pattern = None
+
+    @classmethod
+    def is_unified(cls):
+        return os.path.exists(os.path.join(cls.root, 'cgroup.controllers'))
+
+    @classmethod
+    def mount_points(cls):
+        if cls.is_unified():
+            return [cls.root]
+        return [
+            os.path.join(cls.root, controller)
+            for controller in cls.v1_controllers
+            if os.path.isdir(os.path.join(cls.root, controller))
+        ]
+
+    @classmethod
+    def job_patterns(cls):
+        return cls.v2_job_patterns if cls.is_unified() \
+            else cls.v1_job_patterns
+
+    @classmethod
+    def available(cls):
+        for mount_point in cls.mount_points():
+            for pattern in cls.job_patterns():
+                parent = os.path.dirname(os.path.join(mount_point, pattern))
+                if glob(parent):
+                    return True
+        return False
+
+    @classmethod
+    def parse_job_id(cls, name):
+        match = cls.job_pattern.fullmatch(name)
+        return match.group(1) if match else None
+
+    @classmethod
+    def get_cgroup_by_job(cls):
+        """
+        return example:
+        {'3351': ['slurm/uid_1000/job_3351']}
+        The path is relative to the mount point of a controller, it is the
+        same for all the controllers on cgroup v1.
+        """
+        job_cgroup_dict = defaultdict(list)
+        for mount_point in cls.mount_points():
+            for pattern in cls.job_patterns():
+                for path in glob(os.path.join(mount_point, pattern)):
+                    job_id = cls.parse_job_id(os.path.basename(path))
+                    if job_id is None or not os.path.isdir(path):
+                        continue
+                    job_cgroup_dict[job_id].append(
+                        os.path.relpath(path, mount_point))
+            if job_cgroup_dict:
+                break
+        return job_cgroup_dict
+
+    @classmethod
+    def controller_path(cls, controller, cgroup):
+        if cls.is_unified():
+            return os.path.join(cls.root, cgroup)
+        return os.path.join(cls.root, controller, cgroup)
+
+    @classmethod
+    def _read_stat(cls, path):
+        stat = dict()
+        with open(path, 'r') as f:
+            for line in f:
+                key, value = line.split()[:2]
+                stat[key] = int(value)
+        return stat
+
+    @classmethod
+    def read_cpu_usage(cls, cgroup):
+        """
+        Return the CPU time used by the cgroup in nanoseconds, or None if
+        the cpu accounting is not enabled for the cgroup.
+        """
+        try:
+            if cls.is_unified():
+                cpu_stat = cls._read_stat(
+                    os.path.join(cls.root, cgroup, 'cpu.stat'))
+                return cpu_stat['usage_usec'] * 1000
+            with open(os.path.join(cls.controller_path('cpuacct', cgroup),
+                                   'cpuacct.usage'), 'r') as f:
+                return int(f.read().strip())
+        except (OSError, KeyError, ValueError):
+            return None
+
+    @classmethod
+    def read_memory_usage(cls, cgroup):
+        """
+        Return the memory used by the cgroup in bytes, or None if the
+        memory accounting is not enabled for the cgroup.
+        The inactive page cache is excluded, as it can be reclaimed at any
+        time and is not a part of the working set of the job.
+        """
+        path = cls.controller_path('memory', cgroup)
+        try:
+            if cls.is_unified():
+                usage_file, inactive_key = 'memory.current', 'inactive_file'
+            else:
+                usage_file = 'memory.usage_in_bytes'
+                inactive_key = 'total_inactive_file'
+            with open(os.path.join(path, usage_file), 'r') as f:
+                usage = int(f.read().strip())
+            memory_stat = cls._read_stat(os.path.join(path, 'memory.stat'))
+        except (OSError, ValueError):
+            return None
+        return max(usage - memory_stat.get(inactive_key, 0), 0)
+
+    @staticmethod
+    def _read_io_stat(path, io_usage):
+        # 8:0 rbytes=1 wbytes=2 rios=3 wios=4 dbytes=0 dios=0
+        keys = {'rbytes': 'read_bytes', 'wbytes': 'write_bytes'}
+        with open(path, 'r') as f:
+            for line in f:
+                for field in line.split()[1:]:
+                    key, _, value = field.partition('=')
+                    if key in keys:
+                        io_usage[keys[key]] += int(value)
+
+    @staticmethod
+    def _read_blkio_service_bytes(path, io_usage):
+        # 8:0 Read 1, 8:0 Write 2, ..., Total 3
+        keys = {'Read': 'read_bytes', 'Write': 'write_bytes'}
+        with open(path, 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 3 and fields[1] in keys:
+                    io_usage[keys[fields[1]]] += int(fields[2])
+
+    @classmethod
+    def read_io_usage(cls, cgroup):
+        """
+        Return the bytes read and written by the cgroup from the block
+        devices, {'read_bytes': 0, 'write_bytes': 0}, or None if the io
+        accounting is not enabled for the cgroup.
+        """
+        io_usage = {'read_bytes': 0, 'write_bytes': 0}
+        try:
+            if cls.is_unified():
+                cls._read_io_stat(
+                    os.path.join(cls.root, cgroup, 'io.stat'), io_usage)
+            else:
+                cls._read_blkio_service_bytes(
+                    os.path.join(cls.controller_path('blkio', cgroup),
+                                 'blkio.throttle.io_service_bytes'),
+                    io_usage)
+        except (OSError, ValueError):
+            return None
+        return io_usage
+
+    @classmethod
+    def read_rdma_usage(cls, cgroup):
+        """
+        Return the RDMA resources used by the cgroup, summed over the
+        devices, {'hca_handle': 0, 'hca_object': 0}, or None if the rdma
+        controller is not enabled for the cgroup.
+        """
+        rdma_usage = {'hca_handle': 0, 'hca_object': 0}
+        try:
+            # mlx5_0 hca_handle=2 hca_object=2000
+            with open(os.path.join(cls.controller_path('rdma', cgroup),
+                                   'rdma.current'), 'r') as f:
+                for line in f:
+                    for field in line.split()[1:]:
+                        key, _, value = field.partition('=')
+                        if key in rdma_usage:
+                            rdma_usage[key] += int(value)
+        except (OSError, ValueError):
+            return None
+        return rdma_usage
+
+    @classmethod
+    def read_procs(cls, path):
+        pids = []
+        for dirpath, _, filenames in os.walk(path):
+            if 'cgroup.procs' not in filenames:
+                continue
+            try:
+                with open(os.path.join(dirpath, 'cgroup.procs'), 'r') as f:
+                    pids += f.read().split()
+            except OSError:
+                # The cgroup is removed when the job step exits
+                continue
+        return pids
+
+    @classmethod
+    def get_pid_by_job(cls, job_cgroup=None):
+        """
+        job_cgroup is the result of get_cgroup_by_job if it is already
+        known, so the cgroup tree is not walked again.
+        """
+        if job_cgroup is None:
+            job_cgroup = cls.get_cgroup_by_job()
+        job_pid_dict = dict()
+        mount_points = cls.mount_points()
+        for job_id, cgroups in job_cgroup.items():
+            pids = set()
+            for cgroup in cgroups:
+                for mount_point in mount_points:
+                    path = os.path.join(mount_point, cgroup)
+                    if os.path.isdir(path):
+                        pids.update(cls.read_procs(path))
+                        break
+            if pids:
+                job_pid_dict[job_id] = list(pids)
+        """
+        return example:
+        {'3351':['1211','222334','1111'],'3352':['1212']}
+        """
+        return job_pid_dict
+
+
+class SlurmCgroup(CgroupBase):
+    # slurm_<nodename> is used when multiple slurmd run on one node
+    v1_job_patterns = ['slurm*/uid_*/job_*']
+    v2_job_patterns = ['system.slice/*slurmstepd.scope/job_*']
+    job_pattern = re.compile(r'job_(\d+)')
+
+
+class PBSCgroup(CgroupBase):
+    v1_job_patterns = ['pbs_jobs.service/jobid/*', 'pbspro/*']
+    v2_job_patterns = ['pbs_jobs.service/jobid/*']
+    # 3113.server or 3113[1].server, the server name is not a part of the
+    # job id reported by the plugin
+    job_pattern = re.compile(r'(\d+(?:\[\d+\])?)\..+')
+
+
+class LSFCgroup(CgroupBase):
+    v1_job_patterns = ['lsf/*/job.*']
+    v2_job_patterns = ['lsf/*/job.*']
+    # job.<jobid>.<array index>.<submit time>
+    job_pattern = re.compile(r'job\.(\d+)\.(\d+)\.\d+')
+
+    @classmethod
+    def parse_job_id(cls, name):
+        match = cls.job_pattern.fullmatch(name)
+        if not match:
+            return None
+        job_id, index = match.groups()
+        return job_id if index == '0' else f'{job_id}[{index}]'
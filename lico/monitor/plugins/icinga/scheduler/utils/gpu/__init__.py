@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from functools import lru_cache
 from importlib import import_module
 
 from lico.monitor.plugins.icinga.scheduler.utils import command_call
@@ -23,16 +24,22 @@ CHECK_GPU = {
 }
 
 
+@lru_cache(maxsize=None)
+def get_gpu_module():
+    for k, v in CHECK_GPU.items():
+        out, err, ret = command_call(v)
+        if ret == 0:
+            return import_module(
+                "lico.monitor.plugins.icinga.scheduler.utils.gpu." + k
+            )
+    return None
+
+
 def get_gpu_res_by_job():
-    get_gpu_res_by_job = None
-    try:
-        for k, v in CHECK_GPU.items():
-            out, err, ret = command_call(v)
-            if ret == 0:
-                get_gpu_res_by_job = import_module(
-                    "lico.monitor.plugins.icinga.scheduler.utils.gpu." + k
-                ).get_gpu_res_by_job
-                break
-    except Exception as e:
-        raise e
-    return get_gpu_res_by_job
+    gpu_module = get_gpu_module()
+    return gpu_module.get_gpu_res_by_job if gpu_module else None
+
+
+def get_gpu_energy():
+    gpu_module = get_gpu_module()
+    return gpu_module.get_gpu_energy if gpu_module else None
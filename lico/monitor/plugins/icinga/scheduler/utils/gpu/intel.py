@@ -15,6 +15,7 @@
 from collections import defaultdict
 
 from lico.monitor.plugins.icinga.gpu.lico_check_intel_xpu import XPUMetric
+from lico.monitor.plugins.icinga.helper.base import MetricsBase
 
 
 class GPUInfo:
@@ -37,14 +38,14 @@ def _get_xpu_device_info():
 
 
 def _format_gpu_info():
-    gpu_uuid_index_mapping = defaultdict()
     gp_dict = defaultdict()  # all gpu info
     gp_mem_dict = defaultdict(list)
-    discovery_list, ps_list = _get_xpu_device_info()
+    discovery_list, _ = _get_xpu_device_info()
+    memory_used_list = XPUMetric.xpu_memory_used()
+    util_list = XPUMetric.xpu_util()
+    process_usage = XPUMetric.xpu_process_usage()
     for n in range(len(discovery_list)):
         discovery = discovery_list[n]
-        proc_list = ps_list[n]
-        memory_used = XPUMetric.xpu_memory_used()[n]['value']
         if "memory_physical_size_byte" in discovery.keys():
             mem = str(int(
                 discovery['memory_physical_size_byte']
@@ -52,52 +53,81 @@ def _format_gpu_info():
         else:
             mem = discovery['memory_physical_size']
         gp_info = GPUInfo()
-        index, g_uuid, vram, used = \
-            n, \
-            discovery['uuid'], \
-            mem, \
-            XPUMetric.xpu_util()[n]['value']
-        gp_info.index = index
-        gp_info.uuid = g_uuid
-        gp_info.used = used
-        gp_info.vram = int(float(vram))
-        gp_dict[g_uuid] = gp_info
-        gpu_uuid_index_mapping[gp_info.uuid] = gp_info.index
-        for proc in proc_list["device_util_by_proc_list"]:
-            g_uuid, g_pid, vram_used = g_uuid, \
-                                   proc["process_id"], \
-                                   memory_used
-            if g_uuid in gp_dict:
-                gp_mem_dict[g_pid].append((g_uuid, vram_used))
+        gp_info.index = n
+        gp_info.uuid = discovery['uuid']
+        gp_info.used = util_list[n]['value']
+        gp_info.vram = int(float(mem))
+        gp_dict[gp_info.uuid] = gp_info
+        for g_pid, usage in process_usage[n].items():
+            # Older xpumcli does not report the memory of a process,
+            # fall back to the memory used by the whole device.
+            vram_used = usage['mem_used'] or memory_used_list[n]['value']
+            gp_mem_dict[g_pid].append((gp_info.uuid, vram_used, usage))
     return gp_dict, gp_mem_dict
 
 
-def get_gpu_res_by_job(sche_list, plugin_data, verbose):
+def _attribute_gpu_processes(sche_list, index, gp_dict, gp_mem_dict):
+    """
+    Attribute the GPU processes to the jobs in one pass, through the job
+    index of the discovery.
+    return example:
+    {('3351', 'uuid'): 45.0}  # (job id, g_uuid): sum of the utilization
+    """
+    sche_dict = {sche.id: sche for sche in sche_list}
+    job_gpu_util = defaultdict(float)
+    for pid, vram_tuple_list in gp_mem_dict.items():
+        sche = sche_dict.get(index.get_job(pid))
+        if sche is None:
+            continue
+        for g_uuid, vram_used, usage in vram_tuple_list:
+            sche.gpu[g_uuid] = gp_dict[g_uuid]
+            if usage['mem_used']:
+                sche.gpu_vram[g_uuid] += usage['mem_used']
+            else:
+                # For XPU without process memory: use '=' instead '+='
+                sche.gpu_vram[g_uuid] = vram_used
+            if usage['engine_util']:
+                job_gpu_util[(sche.id, g_uuid)] += usage['util']
+    return job_gpu_util
+
+
+def get_gpu_res_by_job(sche_list, plugin_data, verbose, index):
     try:
         gp_dict, gp_mem_dict = _format_gpu_info()
+        job_gpu_util = _attribute_gpu_processes(
+            sche_list, index, gp_dict, gp_mem_dict)
         for sche in sche_list:
-            index_pids = defaultdict(list)
-            for pid, vram_tuple_list in gp_mem_dict.items():
-                if int(pid) in sche.process.keys():
-                    for g in vram_tuple_list:
-                        sche.gpu[g[0]] = gp_dict[g[0]]
-                        sche.gpu_vram[g[0]] = int(g[1])
-                        # For XPU: use '=' instead '+=',because xpu not
-                        # provides the mem used of pid.
-                        index_pids[gp_dict[g[0]].index].append(pid)
             for g in sche.gpu.values():
-                util = g.used
-                plugin_data.add_output_data(
-                    f"Job {sche.id} Usage on GPU Device gpu{g.index}"
+                util = min(round(job_gpu_util[(sche.id, g.uuid)], 1), 100) \
+                    if (sche.id, g.uuid) in job_gpu_util else g.used
+                plugin_data.add_perf_data(
+                    f"job_{sche.id}_gpu{g.index}_util={util}%"
                 )
-                for pid in index_pids[g.index]:
-                    plugin_data.add_perf_data(
-                        f"job_{sche.id}_gpu{g.index}_util={util}%"
-                    )
+                mem_usage = round((sche.gpu_vram[g.uuid] / g.vram) * 100, 1)
                 plugin_data.add_perf_data(
-                    f"job_{sche.id}_gpu{g.index}_mem_usage="
-                    f"{round((sche.gpu_vram[g.uuid] / g.vram) * 100, 1)}%"
+                    f"job_{sche.id}_gpu{g.index}_mem_usage={mem_usage}%"
                 )
+                plugin_data.add_point(MetricsBase.build_point(
+                    'job_gpu_util', util, 'float', '%'),
+                    job=sche.id, gpu=g.index)
+                plugin_data.add_point(MetricsBase.build_point(
+                    'job_gpu_mem_usage', mem_usage, 'float', '%'),
+                    job=sche.id, gpu=g.index)
     except Exception as e:
         if verbose:
             raise e
+
+
+def get_gpu_energy():
+    """
+    return example:
+    {'uuid': {'energy': 1234567, 'power': None}}
+    energy is the energy consumed by the device since it is powered on
+    in mJ, or None if it is not reported by xpumcli.
+    """
+    discovery_list, _ = _get_xpu_device_info()
+    energy_list = XPUMetric.xpu_energy()
+    return {
+        discovery['uuid']: {'energy': energy['value'], 'power': None}
+        for discovery, energy in zip(discovery_list, energy_list)
+    }
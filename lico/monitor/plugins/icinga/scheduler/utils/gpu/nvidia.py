@@ -12,13 +12,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import re
-import time
+from array import array
 from collections import defaultdict
 
-from lico.monitor.plugins.icinga.scheduler.utils import (
-    command_call, convert_unit,
+from lico.monitor.plugins.icinga.gpu.lico_check_nvidia_gpu import GPUMetric
+from lico.monitor.plugins.icinga.gpu.nvidia_mig import (
+    MigActivity, MigTopology, to_mib,
 )
+from lico.monitor.plugins.icinga.helper.base import MetricsBase
+from lico.monitor.plugins.icinga.scheduler.utils import command_call
+
+try:
+    import pynvml
+except ModuleNotFoundError:
+    pynvml = None
 
 
 class GPUInfo:
@@ -29,187 +36,146 @@ class GPUInfo:
     used = 0
 
 
-def get_gpu_res_by_job(sche_list, plugin_data, verbose):
+def _get_gpu_util(sche, g, job_gpu_util):
+    # The utilization of the job processes, or else of the whole GPU if the
+    # processes are not sampled
+    if (sche.id, g.uuid) in job_gpu_util:
+        return min(round(job_gpu_util[(sche.id, g.uuid)], 1), 100)
+    return g.used
+
+
+def get_gpu_res_by_job(sche_list, plugin_data, verbose, index):
     try:
         # sm_total: {'0': 96, ...}   # gpu_index: sm_total
         gpu_mig_dict, sm_total = _get_mig_info(verbose)
-        gp_dict, gp_mem_dict = _get_gpu_info()
+        gp_dict, apps = _get_gpu_info()
         """
         gp_dict = {
             g_uuid: gp_info(index, g_uuid, util, vram)
         }
-        gp_mem_dict = {
-            g_pid:[(g_uuid, vram_used), ...]
-        }
+        apps: the compute processes of all the GPUs
         """
-        time.sleep(0.02)  # wait for cpu_percent compute
+        job_gpu_util, job_gpu_pids = _attribute_gpu_processes(
+            sche_list, index, gp_dict, apps, _get_process_util(verbose))
         for sche in sche_list:
-            # index_pids = {'index': ['pid1', 'pid2']}
-            index_pids = _get_gpu_running_pids(sche, gp_dict, gp_mem_dict)
             for g in sche.gpu.values():
                 gpu_sm_total = sm_total.get(g.index)
-                util = g.used
-                plugin_data.add_output_data(
-                    f"Job {sche.id} Usage on GPU Device gpu{g.index}"
-                )
                 # If GPU usage is [N/A], it means MIG is enabled.
                 # GPU usage is not available.
                 if not g.used == "[N/A]":
+                    util = _get_gpu_util(sche, g, job_gpu_util)
+                    mem_usage = (sche.gpu_vram[g.uuid] / g.vram) * 100
                     plugin_data.add_perf_data(
                         f"job_{sche.id}_gpu{g.index}_util={util}%"
                     )
                     plugin_data.add_perf_data(
                         f"job_{sche.id}_gpu{g.index}_mem_usage="
-                        f"{(sche.gpu_vram[g.uuid] / g.vram) * 100}%"
+                        f"{mem_usage}%"
                     )
+                    plugin_data.add_point(MetricsBase.build_point(
+                        'job_gpu_util', util, 'float', '%'),
+                        job=sche.id, gpu=g.index)
+                    plugin_data.add_point(MetricsBase.build_point(
+                        'job_gpu_mem_usage', mem_usage, 'float', '%'),
+                        job=sche.id, gpu=g.index)
                 else:
-                    for pid in index_pids[g.index]:
-                        if g.used == "[N/A]" and gpu_sm_total and \
-                                pid in gpu_mig_dict[g.index]:
+                    for pid in job_gpu_pids[(sche.id, g.index)]:
+                        if gpu_sm_total and pid in gpu_mig_dict[g.index]:
                             mig_pid_info = gpu_mig_dict[g.index][pid]
                             mig_util = mig_pid_info['mig_util']
                             mig_mem_util = mig_pid_info['mig_mem_util']
                             mig_dev_id = mig_pid_info['mig_dev_id']
                             gi_id, ci_id = mig_pid_info['gi_ci_id'].split('/')
-                            plugin_data.add_perf_data(
-                                f"job_{sche.id}_gpu{g.index}_{mig_dev_id}_"
-                                f"{gi_id}_{ci_id}_util={mig_util}%"
-                            )
+                            labels = dict(
+                                job=sche.id, gpu=g.index,
+                                mig_device=mig_dev_id, gi=gi_id, ci=ci_id)
+                            if mig_util is not None:
+                                plugin_data.add_perf_data(
+                                    f"job_{sche.id}_gpu{g.index}_"
+                                    f"{mig_dev_id}_{gi_id}_{ci_id}_"
+                                    f"util={mig_util}%"
+                                )
+                                plugin_data.add_point(MetricsBase.build_point(
+                                    'job_gpu_mig_util', mig_util, 'float',
+                                    '%'), **labels)
                             plugin_data.add_perf_data(
                                 f"job_{sche.id}_gpu{g.index}_{mig_dev_id}_"
                                 f"{gi_id}_{ci_id}_mem_usage={mig_mem_util}%"
                             )
+                            plugin_data.add_point(MetricsBase.build_point(
+                                'job_gpu_mig_mem_usage', mig_mem_util,
+                                'float', '%'), **labels)
     except Exception as e:
         if verbose:
             raise e
 
 
-def compile(value):
-    return re.compile(r"<{0}>([\s\S]*?)</{0}>".format(value))
-
-
-def get_gpu_detail_info(verbose):
-    mig_cmd = ['nvidia-smi', '-q', '-x']
-    raw_out, err, ret = command_call(mig_cmd)
-    if err and verbose:
-        print(
-            "Get GPU detail failed: {0},"
-            "Command is: {1}".format(err, ' '.join(mig_cmd))
-        )
-    return raw_out, err, ret
-
-
 def _get_mig_info(verbose):
     gpu_sm_total = dict()
     gpu_mig_dict = defaultdict(lambda: defaultdict(dict))
-    raw_out, err, ret = get_gpu_detail_info(verbose)
-    if err:
-        return gpu_mig_dict
-    out = raw_out.decode().strip()
-    gpu_pattern = re.compile(r"<gpu id=.*>([\s\S]*?)</gpu>")
-    for gpu_info in gpu_pattern.findall(out):
-        if not gpu_info.strip():
-            continue
-        current_mig = compile('current_mig').search(gpu_info)
-        if current_mig.group(1).strip().lower() != 'enabled':
-            continue
-        gpu_index = compile('minor_number').search(gpu_info).group(1)
-        gpu_sm_total[gpu_index] = 0
-        pid_res = _get_pid_resource(gpu_info)
-        mig_info = _get_mig_device(gpu_info)
-        for _, v in mig_info.items():
-            gpu_sm_total[gpu_index] += v["sm"]
-        if not pid_res or not mig_info:
-            continue
-        for type, res in pid_res.items():
-            for pid, used_mem in res.items():
-                if type in mig_info:
-                    total_sm = mig_info[type]['sm']
-                    used_sm = mig_info[type]['sm']
-                    sm_util = round(used_sm * 100 / total_sm)
-                    mem_util = round(int(used_mem) * 100 / int(
-                        mig_info[type]['total_memory']))
-                    mig_dev_id = mig_info[type]['mig_dev_id']
-                    gpu_mig_dict[gpu_index][pid] = {
-                        'gi_ci_id': type,
-                        'mig_util': sm_util,
-                        'mig_mem_util': mem_util,
-                        'mig_dev_id': mig_dev_id,
-                        'mig_total_sm': total_sm
-                    }
-    """
-    gpu_mig_dict for example:
-    {
-        '0': { # gpu index
-            '3568728': { # pid
-                'gi_ci_id': '2/0',
-                'mig_util': 10.5,   # unit: %
-                'mig_memory_util': 30.1  # unit: %
-                'mig_total_sm': 14  # sm counts of this mig instance
-            },
-        }
-        ...
-    }
-    """
-    return gpu_mig_dict, gpu_sm_total
+    MigTopology.verbose = verbose
+    topology = MigTopology.load()
+    if topology is None:
+        return gpu_mig_dict, gpu_sm_total
+    mig_gpus = topology.mig_gpus()
+    for gpu in mig_gpus:
+        gpu_sm_total[gpu.index] = gpu.sm_total
 
+    # Only the GPU instances running processes are sampled
+    MigActivity.verbose = verbose
+    activity = MigActivity.sample(sorted({
+        (gpu.index, instance.gpu_instance_id)
+        for gpu in mig_gpus for instance in gpu.instances.values()
+        if instance.processes
+    }))
+    for gpu in mig_gpus:
+        for instance in gpu.instances.values():
+            # The SM activity is sampled for the GPU instance, it is shared
+            # by the compute instances and processes of the GPU instance
+            sm_util = activity.get(f'{gpu.index}/{instance.gpu_instance_id}')
+            memory_total = to_mib(instance.memory_total)
+            for process in instance.processes:
+                mem_util = round(process.used_memory * 100 / memory_total) \
+                    if memory_total else 0
+                gpu_mig_dict[gpu.index][process.pid] = {
+                    'gi_ci_id': instance.gi_ci_id,
+                    'mig_util': sm_util,
+                    'mig_mem_util': mem_util,
+                    'mig_dev_id': int(instance.mig_device),
+                    'mig_total_sm': instance.sm_count
+                }
+    return gpu_mig_dict, gpu_sm_total
 
-def _get_mig_device(gpu_info):
-    mig_dev_info = defaultdict(dict)
-    mig_devices = compile('mig_device').findall(gpu_info)
-    for mig_info in mig_devices:
-        if not compile('shared').search(mig_info):
-            continue
-        fb_memory_usage = compile('fb_memory_usage').search(mig_info)
-        if not fb_memory_usage:
-            continue
-        total_mem = compile('total').search(
-            fb_memory_usage.group(1)
-        ).group(1)
-        mig_dev_id = compile('index').search(mig_info).group(1)
-        gi_id = compile('gpu_instance_id').search(mig_info).group(1)
-        ci_id = compile('compute_instance_id').search(mig_info).group(1)
-        sm = compile('multiprocessor_count').search(mig_info).group(1)
-        mig_dev_info['{0}/{1}'.format(gi_id, ci_id)]['total_memory'] = \
-            convert_unit(total_mem)
-        mig_dev_info['{0}/{1}'.format(gi_id, ci_id)]['sm'] = int(sm)
-        mig_dev_info['{0}/{1}'.format(gi_id, ci_id)]['mig_dev_id'] = \
-            int(mig_dev_id)
 
+class ComputeApps:
     """
-    {
-        'gi_id/ci_id': {
-            'total_memory': 20096, # memory size for mig instance
-            'sm': 14, # sm count for mig instance
-            'mig_dev_id': 0, # mig dev id for mig instance
-        }
-    }
+    The compute processes of all the GPUs, in typed columns, one row for
+    each process on each GPU.
     """
-    return dict(mig_dev_info)
+    __slots__ = ['pids', 'uuids', 'vram']
 
+    def __init__(self):
+        self.pids = array('q')
+        # uuid of the GPU of each row
+        self.uuids = []
+        # used memory, unit: MiB
+        self.vram = array('q')
 
-def _get_pid_resource(gpu_info):
-    pid_res_dict = defaultdict(dict)
-    for proc_info in compile('process_info').findall(gpu_info):
-        pid = compile('pid').search(proc_info)
-        if not pid:
-            continue
-        used_memory = compile('used_memory').search(proc_info)
-        if not used_memory:
-            continue
-        gi_id = compile('gpu_instance_id').search(proc_info).group(1)
-        ci_id = compile('compute_instance_id').search(proc_info).group(1)
-        pid_res_dict['{0}/{1}'.format(gi_id, ci_id)][pid.group(1)] = \
-            convert_unit(used_memory.group(1))
-    """
-    pid_res_dict for example:
-    {
-        'gi_id/ci_id': {
-            '1171437': 121, # {'pid': 'used_memory'}
-        }
-    }
-    """
-    return dict(pid_res_dict)
+    def __len__(self):
+        return len(self.pids)
+
+    def append(self, pid, g_uuid, vram):
+        self.pids.append(pid)
+        self.uuids.append(g_uuid)
+        self.vram.append(vram)
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        # [N/A] or [Insufficient Permissions]
+        return 0
 
 
 def _get_gpu_info():
@@ -222,41 +188,148 @@ def _get_gpu_info():
             "--format=csv,noheader,nounits"]
     out1, err1, ret1 = command_call(args)
 
+    apps = ComputeApps()
     if ret or ret1 or not out1:
-        return {}, {}
-
-    gpu_uuid_index_mapping = dict()
+        return {}, apps
 
     gp_dict = {}  # all gpu info
     for gp in out.decode().strip().split('\n'):
         gp_info = GPUInfo()
-        index, g_uuid, vram, used = gp.split(', ')
+        index, g_uuid, vram, used = [i.strip() for i in gp.split(',')]
         gp_info.index = index
         gp_info.uuid = g_uuid
         gp_info.used = used
         gp_info.vram = int(vram)
         gp_dict[g_uuid] = gp_info
 
-        gpu_uuid_index_mapping[gp_info.uuid] = gp_info.index
+    for gp_mem in out1.decode().strip().split('\n'):
+        fields = [i.strip() for i in gp_mem.split(',')]
+        if len(fields) != 3 or fields[0] not in gp_dict or \
+                not fields[1].isdigit():
+            continue
+        apps.append(int(fields[1]), fields[0], _to_int(fields[2]))
 
-    # key: process id
-    # value: tuple value for a process all used
-    gp_mem_dict = defaultdict(list)
+    return gp_dict, apps
 
-    for gp_mem in out1.decode().strip().split('\n'):
-        g_uuid, g_pid, vram_used = gp_mem.split(', ')
-        if g_uuid in gp_dict:
-            gp_mem_dict[g_pid].append((g_uuid, vram_used))
-
-    return gp_dict, gp_mem_dict
-
-
-def _get_gpu_running_pids(sche, gp_dict, gp_mem_dict):
-    index_pids = defaultdict(list)
-    for pid, vram_tuple_list in gp_mem_dict.items():
-        if int(pid) in sche.process.keys():
-            for g in vram_tuple_list:
-                sche.gpu[g[0]] = gp_dict[g[0]]
-                sche.gpu_vram[g[0]] += int(g[1])
-                index_pids[gp_dict[g[0]].index].append(pid)
-    return index_pids
+
+def _get_nvml_process_util():
+    process_util = defaultdict(dict)
+    pynvml.nvmlInit()
+    try:
+        for i in range(pynvml.nvmlDeviceGetCount()):
+            handle = pynvml.nvmlDeviceGetHandleByIndex(i)
+            # The NVML index is the nvidia-smi index, the minor number of
+            # the device may differ
+            index = str(i)
+            try:
+                samples = pynvml.nvmlDeviceGetProcessUtilization(handle, 0)
+            except pynvml.NVMLError:
+                # No sample in the buffer of the device, or MIG is enabled
+                continue
+            latest = dict()
+            for sample in samples:
+                if sample.pid not in latest or \
+                        sample.timeStamp > latest[sample.pid].timeStamp:
+                    latest[sample.pid] = sample
+            for pid, sample in latest.items():
+                process_util[index][str(pid)] = float(sample.smUtil)
+    finally:
+        pynvml.nvmlShutdown()
+    return process_util
+
+
+def _get_process_util(verbose):
+    """
+    SM utilization of each process, from the NVML process utilization
+    samples if pynvml is installed, or else from nvidia-smi pmon.
+    return example:
+    {'0': {'5895': 45.0}}  # gpu index: {pid: sm utilization in %}
+    """
+    if pynvml is not None:
+        try:
+            return _get_nvml_process_util()
+        except pynvml.NVMLError as e:
+            if verbose:
+                print(f"Get process utilization by NVML failed: {e}")
+    GPUMetric.verbose = verbose
+    return {
+        index: {pid: util['sm'] for pid, util in pid_util.items()}
+        for index, pid_util in GPUMetric._gpu_process_util().items()
+    }
+
+
+def _attribute_gpu_processes(sche_list, index, gp_dict, apps, process_util):
+    """
+    Attribute the GPU processes to the jobs in one pass, through the job
+    index of the discovery, grouped by (job, gpu).
+    return example:
+    job_gpu_util = {('3351', 'GPU-6a4b...'): 45.0}
+    job_gpu_pids = {('3351', '0'): ['5895']}
+    """
+    sche_dict = {sche.id: sche for sche in sche_list}
+    job_gpu_util = defaultdict(float)
+    job_gpu_pids = defaultdict(list)
+    for pid, g_uuid, vram in zip(apps.pids, apps.uuids, apps.vram):
+        sche = sche_dict.get(index.get_job(pid))
+        if sche is None:
+            continue
+        g = gp_dict[g_uuid]
+        sche.gpu[g_uuid] = g
+        sche.gpu_vram[g_uuid] += vram
+        job_gpu_pids[(sche.id, g.index)].append(str(pid))
+        util = process_util.get(g.index, {}).get(str(pid))
+        if util is not None:
+            job_gpu_util[(sche.id, g_uuid)] += util
+    return job_gpu_util, job_gpu_pids
+
+
+def _get_nvml_energy():
+    energy_dict = dict()
+    if pynvml is None:
+        return energy_dict
+    try:
+        pynvml.nvmlInit()
+    except pynvml.NVMLError:
+        return energy_dict
+    try:
+        for i in range(pynvml.nvmlDeviceGetCount()):
+            handle = pynvml.nvmlDeviceGetHandleByIndex(i)
+            try:
+                uuid = pynvml.nvmlDeviceGetUUID(handle)
+                energy_dict[uuid.decode() if isinstance(uuid, bytes)
+                            else uuid] = \
+                    pynvml.nvmlDeviceGetTotalEnergyConsumption(handle)
+            except pynvml.NVMLError:
+                # Energy counter is supported since Volta
+                continue
+    finally:
+        pynvml.nvmlShutdown()
+    return energy_dict
+
+
+def get_gpu_energy():
+    """
+    return example:
+    {'GPU-6a4b...': {'energy': 1234567, 'power': 70.5}}
+    energy is the energy consumed by the GPU since the driver is loaded
+    in mJ, it is None if pynvml is not installed or the GPU does not
+    support it, then the power draw in W is used.
+    """
+    energy_dict = _get_nvml_energy()
+    args = ["nvidia-smi", "--query-gpu=uuid,power.draw",
+            "--format=csv,noheader,nounits"]
+    out, err, ret = command_call(args)
+    gpu_energy = dict()
+    if ret:
+        return gpu_energy
+    for line in out.decode().strip().split('\n'):
+        g_uuid, power = line.split(', ')
+        try:
+            power = float(power)
+        except ValueError:
+            # [N/A] or [Not Supported]
+            power = None
+        gpu_energy[g_uuid] = {
+            'energy': energy_dict.get(g_uuid), 'power': power
+        }
+    return gpu_energy
@@ -18,6 +18,11 @@ from collections import defaultdict
 
 import psutil
 
+from lico.monitor.plugins.icinga.helper.base import MetricsBase, PluginData
+from lico.monitor.plugins.icinga.helper.state import StateFile
+from lico.monitor.plugins.icinga.scheduler.utils.accounting import (
+    gpu_energy_collector, io_collector, rdma_collector,
+)
 from lico.monitor.plugins.icinga.scheduler.utils.gpu import get_gpu_res_by_job
 from lico.monitor.plugins.icinga.scheduler.utils.schedulerbase import (
     SchedulerInfo,
@@ -36,77 +41,308 @@ class ProcessInfo:
     # gpu_vram_used = []
 
 
+class CgroupUsage:
+    """
+    CPU and memory of jobs from the accounting of their cgroups.
+    The CPU utilization is computed against the sample saved by the
+    previous run, so it covers the whole polling interval.
+    """
+    state = StateFile('job_cgroup_usage.json')
+    # Interval to sample the CPU usage of a job which has no previous sample
+    first_sample_interval = 0.5
+
+    @classmethod
+    def _sample(cls, cgroup, sche):
+        cpu_usage, memory_used = 0, 0
+        for path in sche.cgroup:
+            cpu = cgroup.read_cpu_usage(path)
+            memory = cgroup.read_memory_usage(path)
+            if cpu is None or memory is None:
+                return None
+            cpu_usage += cpu
+            memory_used += memory
+        return {
+            'cgroup': sche.cgroup,
+            'cpu_usage': cpu_usage,
+            'memory_used': memory_used,
+            'time': time.monotonic()
+        }
+
+    @staticmethod
+    def _cpu_util(prev, curr):
+        interval = curr['time'] - prev['time']
+        usage = curr['cpu_usage'] - prev['cpu_usage']
+        if prev['cgroup'] != curr['cgroup'] or interval <= 0 or usage < 0:
+            return None
+        return round(usage / 1e9 / interval * 100, 1)
+
+    @classmethod
+    def collect(cls, cgroup, sche_list):
+        """
+        return example:
+        {'3351': (120.5, 1073741824)}  # job id: (cpu util %, memory bytes)
+        The jobs which are not accounted by cgroup are not in the result.
+        """
+        # The runs of the plugin may overlap, the state is locked from its
+        # load to its save
+        with cls.state.lock():
+            prev_samples = cls.state.load()
+            samples, result, first_sampled = dict(), dict(), []
+            for sche in sche_list:
+                sample = cls._sample(cgroup, sche) if sche.cgroup else None
+                if sample is None:
+                    continue
+                samples[sche.id] = sample
+                prev = prev_samples.get(sche.id)
+                cpu_util = cls._cpu_util(prev, sample) if prev else None
+                if cpu_util is None:
+                    first_sampled.append(sche)
+                else:
+                    result[sche.id] = (cpu_util, sample['memory_used'])
+
+            if first_sampled:
+                time.sleep(cls.first_sample_interval)
+            for sche in first_sampled:
+                sample = cls._sample(cgroup, sche)
+                cpu_util = cls._cpu_util(samples[sche.id], sample) \
+                    if sample else None
+                if cpu_util is None:
+                    samples.pop(sche.id)
+                    continue
+                samples[sche.id] = sample
+                result[sche.id] = (cpu_util, sample['memory_used'])
+
+            # Only the running jobs are saved, the finished jobs are dropped
+            cls.state.save(samples)
+        return result
+
+
+def cpu_memory_collector(engine, sche_list, plugin_data):
+    get_job_used_info(sche_list, plugin_data, engine.verbose,
+                      engine.discovery.cgroup)
+
+
+def gpu_collector(engine, sche_list, plugin_data):
+    get_gpu_res = get_gpu_res_by_job()
+    if get_gpu_res is not None:
+        get_gpu_res(sche_list, plugin_data, engine.verbose, engine.index)
+
+
+class JobMetricsEngine:
+    """
+    Collect the metrics of the jobs found by a JobDiscovery.
+    The jobs are discovered once, then each collector of the pipeline
+    attributes its metrics to all the jobs in one pass, through the job
+    index of the discovery. The output is batched, one line for each job
+    with the metrics of all the collectors.
+    """
+    collectors = [
+        cpu_memory_collector, gpu_collector, gpu_energy_collector,
+        io_collector, rdma_collector
+    ]
+
+    def __init__(self, discovery, verbose=False, collectors=None):
+        self.discovery = discovery
+        self.verbose = verbose
+        if collectors is not None:
+            self.collectors = collectors
+        self.index = None
+
+    def discover(self):
+        job_pid, job_cgroup = self.discovery.discover_jobs()
+        self.index = self.discovery.index
+        return _init_sche_process(job_pid, self.verbose, job_cgroup)
+
+    @staticmethod
+    def summarize(points):
+        """
+        return example:
+        {'3351': 'Job 3351 CPU Utilization = 120.5%, '
+                 'Used Memory = 1073741824B, gpu_util[gpu=0]=45.0%'}
+        The CPU and memory of a job are in the text of the output before
+        the pipeline, the other metrics follow them.
+        """
+        job_usage = defaultdict(dict)
+        job_metrics = defaultdict(list)
+        for point in points:
+            labels = dict(point['labels'])
+            job_id = labels.pop('job', None)
+            if job_id is None:
+                continue
+            value = f"{point['value']}{point['units']}"
+            if point['metric'] in ('job_cpu_util', 'job_mem_used') and \
+                    not labels:
+                job_usage[job_id][point['metric']] = value
+                continue
+            name = point['metric'].replace('job_', '', 1)
+            if labels:
+                name += '[' + ','.join(
+                    f'{k}={v}' for k, v in labels.items()) + ']'
+            job_metrics[job_id].append(f"{name}={value}")
+        summary = dict()
+        for job_id in list(job_usage) + list(job_metrics):
+            if job_id in summary:
+                continue
+            usage = job_usage.get(job_id, {})
+            texts = []
+            if 'job_cpu_util' in usage:
+                texts.append(f"CPU Utilization = {usage['job_cpu_util']}")
+            if 'job_mem_used' in usage:
+                texts.append(f"Used Memory = {usage['job_mem_used']}")
+            summary[job_id] = f"Job {job_id} " + ', '.join(
+                texts + job_metrics.get(job_id, []))
+        return summary
+
+    def run(self, plugin_data):
+        sche_list = self.discover()
+        job_data = PluginData()
+        for collector in self.collectors:
+            try:
+                collector(self, sche_list, job_data)
+            except Exception as e:
+                if self.verbose:
+                    raise e
+        for summary in self.summarize(job_data.get_points()).values():
+            job_data.add_output_data(summary)
+        plugin_data.merge(job_data)
+        return sche_list
+
+
 def get_job_info(scheduler, plugin_data, args):
-    job_pid = scheduler.get_pid_by_job()
-    sche_list = _init_sche_process(job_pid, args.verbose)
-    get_job_used_info(sche_list, plugin_data, args.verbose)
+    JobMetricsEngine(scheduler, args.verbose).run(plugin_data)
+
+
+def _get_process_used_info(sche):
+    cpu_util_sum, memory_used_sum = 0, 0
+    for p in sche.process.values():
+        if p.process is None:
+            continue
+        with p.process.oneshot():
+            p.cpu_percent = p.process.cpu_percent()
+            p.memory_used = p.process.memory_info().rss
+        cpu_util_sum += p.cpu_percent
+        memory_used_sum += p.memory_used
+    return cpu_util_sum, memory_used_sum
+
+
+def collect_used_info(sche_list, verbose, cgroup=None):
+    """
+    return example:
+    {'3351': (120.5, 1073741824)}  # job id: (cpu util %, memory bytes)
+    """
+    cgroup_usage = CgroupUsage.collect(cgroup, sche_list) \
+        if cgroup is not None else {}
+    process_sche_list = [
+        sche for sche in sche_list if sche.id not in cgroup_usage
+    ]
+    if process_sche_list:
+        _init_process(process_sche_list, verbose)
+        time.sleep(0.02)  # wait for cpu_percent compute
+    used_info = dict(cgroup_usage)
+    for sche in process_sche_list:
+        used_info[sche.id] = _get_process_used_info(sche)
+    return used_info
+
+
+def get_job_used_info(sche_list, plugin_data, verbose, cgroup=None):
     try:
-        get_gpu_res_by_job()(sche_list, plugin_data, args.verbose)
+        used_info = collect_used_info(sche_list, verbose, cgroup)
+        for sche in sche_list:
+            cpu_util_sum, memory_used_sum = used_info[sche.id]
+            plugin_data.add_perf_data(
+                f"job_{sche.id}_cpu_util={cpu_util_sum}"
+            )
+            plugin_data.add_perf_data(
+                f"job_{sche.id}_mem_used={memory_used_sum}B"
+            )
+            plugin_data.add_point(MetricsBase.build_point(
+                'job_cpu_util', cpu_util_sum, 'float', '%'), job=sche.id)
+            plugin_data.add_point(MetricsBase.build_point(
+                'job_mem_used', memory_used_sum, 'uint', 'B'), job=sche.id)
     except Exception as e:
-        if args.verbose:
+        if verbose:
             raise e
 
 
-def get_job_used_info(sche_list, plugin_data, verbose):
+def get_job_step_info(scheduler, plugin_data, args):
+    job_step_pid = scheduler.get_pid_by_step()
+    step_pid = {
+        (job_id, step_id): pids
+        for job_id, steps in job_step_pid.items()
+        for step_id, pids in steps.items()
+    }
+    sche_list = _init_sche_process(step_pid, args.verbose)
     try:
-        time.sleep(0.02)  # wait for cpu_percent compute
+        used_info = collect_used_info(sche_list, args.verbose)
         for sche in sche_list:
-            cpu_util_sum, memory_used_sum = 0, 0
-            for p in sche.process.values():
-                with p.process.oneshot():
-                    p.cpu_percent = p.process.cpu_percent()
-                    p.memory_used = p.process.memory_info().rss
-                cpu_util_sum += p.cpu_percent
-                memory_used_sum += p.memory_used
-
+            job_id, step_id = sche.id
+            cpu_util_sum, memory_used_sum = used_info[sche.id]
             plugin_data.add_output_data(
-                f"Job {sche.id} CPU Utilization = {cpu_util_sum}%"
+                f"Job {job_id} Step {step_id} CPU Utilization = "
+                f"{cpu_util_sum}%, Used Memory = {memory_used_sum}B"
             )
             plugin_data.add_perf_data(
-                f"job_{sche.id}_cpu_util={cpu_util_sum}"
-            )
-
-            plugin_data.add_output_data(
-                f"Used Memory = {memory_used_sum}B"
+                f"job_{job_id}_step_{step_id}_cpu_util={cpu_util_sum}"
             )
             plugin_data.add_perf_data(
-                f"job_{sche.id}_mem_used={memory_used_sum}B"
+                f"job_{job_id}_step_{step_id}_mem_used={memory_used_sum}B"
             )
+            plugin_data.add_point(MetricsBase.build_point(
+                'job_step_cpu_util', cpu_util_sum, 'float', '%'),
+                job=job_id, step=step_id)
+            plugin_data.add_point(MetricsBase.build_point(
+                'job_step_mem_used', memory_used_sum, 'uint', 'B'),
+                job=job_id, step=step_id)
     except Exception as e:
-        if verbose:
+        if args.verbose:
             raise e
 
 
-def _init_sche_process(job_pid_group, verbose):
+def _init_sche_process(job_pid_group, verbose, job_cgroup=None):
+    """
+    The psutil.Process of a job process is created by _init_process, only
+    when the job is not accounted by cgroup.
+    """
+    job_cgroup = job_cgroup or {}
     sche_list = []
     for sche_id, pid_list in job_pid_group.items():
         sche = SchedulerInfo(id=sche_id,
                              process=defaultdict(),
                              gpu=defaultdict(),
-                             gpu_vram=defaultdict(int))
+                             gpu_vram=defaultdict(int),
+                             cgroup=job_cgroup.get(sche_id))
 
         for pid in pid_list:
             try:
-                proc = psutil.Process(int(pid))
-            except psutil.NoSuchProcess as e:
-                if verbose:
-                    print(f'process {str(e).split()[-1]} of job '
-                          f'{sche_id} is not exist')
-                continue
+                pid = int(pid)
             except ValueError:
                 if verbose:
-                    print(f'process of job is {int(pid)},'
+                    print(f'process of job is {pid},'
                           f'which causes ValueError')
                 continue
+            p_info = ProcessInfo()
+            p_info.s_id = sche_id
+            sche.process[pid] = p_info
+
+        sche_list.append(sche)
+    return sche_list
+
+
+def _init_process(sche_list, verbose):
+    for sche in sche_list:
+        for pid, p_info in list(sche.process.items()):
+            try:
+                proc = psutil.Process(pid)
+            except psutil.NoSuchProcess as e:
+                if verbose:
+                    print(f'process {str(e).split()[-1]} of job '
+                          f'{sche.id} is not exist')
+                sche.process.pop(pid)
+                continue
             except Exception as e:
                 if verbose:
                     print(e)
+                sche.process.pop(pid)
                 continue
-            p_info = ProcessInfo()
-            p_info.s_id = sche_id
             p_info.process = proc
             proc.cpu_percent()  # call once before real called
-            sche.process[int(pid)] = p_info
-
-        sche_list.append(sche)
-    return sche_list
@@ -0,0 +1,137 @@
+#! /usr/bin/python3
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from collections import defaultdict, deque
+
+from lico.monitor.plugins.icinga.helper.state import StateFile
+
+
+class ProcessTracker:
+    """
+    Track the process trees of the jobs across the check runs.
+
+    The tree of a job is walked from its root through the children files
+    of /proc/<pid>/task/<tid>, so only the processes of the job are read,
+    instead of all the processes of the node. When the kernel does not
+    provide the children files, a single scan of /proc is shared by all the
+    jobs.
+    The processes found by the previous run are kept as long as their
+    start time is not changed, so a process reparented out of the tree,
+    e.g. a daemon started by the job, is still accounted to the job, and a
+    reused pid is never accounted to a job.
+    Each process is checked once a run, its stat and children files are
+    read when the walk reaches it, and a process of the previous run is
+    only read again if the walk does not reach it.
+    """
+    state = StateFile('job_process_tree.json')
+    proc_root = '/proc'
+
+    def __init__(self):
+        # {job id: {pid: start time}}
+        self._previous = self.state.load()
+        self._trees = dict()
+        self._ppid_map = None
+        self._children_file = None
+
+    def _read_stat(self, pid):
+        """
+        Return the fields of /proc/<pid>/stat after the command name, the
+        first one is the state of the process.
+        """
+        try:
+            with open(os.path.join(self.proc_root, str(pid), 'stat'),
+                      'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        return data.rsplit(b')', 1)[-1].split()
+
+    def start_time(self, pid):
+        stat = self._read_stat(pid)
+        # starttime is the 22nd field of the stat file
+        return stat[19].decode() if stat and len(stat) > 19 else None
+
+    def _has_children_file(self):
+        if self._children_file is None:
+            self._children_file = os.path.exists(os.path.join(
+                self.proc_root, str(os.getpid()), 'task', str(os.getpid()),
+                'children'))
+        return self._children_file
+
+    def _scan_ppid(self):
+        if self._ppid_map is None:
+            self._ppid_map = defaultdict(list)
+            for pid in os.listdir(self.proc_root):
+                if not pid.isdigit():
+                    continue
+                stat = self._read_stat(pid)
+                if stat and len(stat) > 1:
+                    self._ppid_map[stat[1].decode()].append(pid)
+        return self._ppid_map
+
+    def children(self, pid):
+        if not self._has_children_file():
+            return self._scan_ppid().get(str(pid), [])
+        task_dir = os.path.join(self.proc_root, str(pid), 'task')
+        children = []
+        try:
+            tids = os.listdir(task_dir)
+        except OSError:
+            return children
+        for tid in tids:
+            try:
+                with open(os.path.join(task_dir, tid, 'children'), 'r') as f:
+                    children += f.read().split()
+            except OSError:
+                # The thread has exited
+                continue
+        return children
+
+    def _walk(self, tree, pid, start):
+        queue = deque([(pid, start)])
+        while queue:
+            pid, start = queue.popleft()
+            tree[pid] = start
+            for child in self.children(pid):
+                if child in tree:
+                    continue
+                child_start = self.start_time(child)
+                if child_start is not None:
+                    queue.append((child, child_start))
+
+    def track(self, job_id, root_pid):
+        """
+        Add the process tree of root_pid to the job, return all the pids
+        of the job found so far.
+        """
+        root_pid = str(root_pid)
+        tree = self._trees.setdefault(job_id, dict())
+        if root_pid in tree:
+            return list(tree)
+        root_start = self.start_time(root_pid)
+        if root_start is None:
+            return list(tree)
+
+        self._walk(tree, root_pid, root_start)
+        # Walk the subtrees of the processes kept from the previous run as
+        # well, they may be out of the tree of root_pid
+        for pid, start in self._previous.get(job_id, {}).items():
+            if pid not in tree and self.start_time(pid) == start:
+                self._walk(tree, pid, start)
+        return list(tree)
+
+    def save(self):
+        return self.state.save(self._trees)
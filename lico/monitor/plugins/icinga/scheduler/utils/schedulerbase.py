@@ -14,13 +14,116 @@
 # limitations under the License.
 
 import sys
-from abc import ABCMeta
-from subprocess import PIPE, Popen  # nosec B404
+from abc import ABCMeta, abstractmethod
+from subprocess import DEVNULL, PIPE, Popen  # nosec B404
 
 import psutil
 
 
-class SchedulerBase(metaclass=ABCMeta):
+class JobIndex:
+    """
+    Reverse index of the processes of the jobs, to look up the job of a
+    process without discovering the jobs again.
+    """
+
+    def __init__(self, job_pid_dict):
+        self.job_pid_dict = job_pid_dict
+        self._pid_job = dict()
+        for job_id, pids in job_pid_dict.items():
+            for pid in pids:
+                try:
+                    self._pid_job[int(pid)] = job_id
+                except ValueError:
+                    continue
+
+    def get_job(self, pid):
+        try:
+            return self._pid_job.get(int(pid))
+        except ValueError:
+            return None
+
+    def __contains__(self, pid):
+        return self.get_job(pid) is not None
+
+
+class JobDiscovery(metaclass=ABCMeta):
+    """
+    Discover the jobs running on this node and their processes.
+    A scheduler only has to implement get_pid_by_job, the metrics of the
+    jobs are collected from the processes and cgroups of the jobs by
+    jobinfo.JobMetricsEngine.
+    """
+    # Subclass of utils.cgroup.CgroupBase for the scheduler
+    cgroup = None
+    # auto: use the cgroup tree if the scheduler creates it, or else call
+    # the scheduler commands; cgroup: only use the cgroup tree;
+    # command: only call the scheduler commands
+    discovery = 'auto'
+    # JobIndex of the jobs found by discover_jobs in this run
+    index = None
+
+    @classmethod
+    @abstractmethod
+    def get_pid_by_job(cls):
+        """
+        return example:
+        {'3351':['1211','222334','1111'],'3352':['1212']}
+        """
+
+    @classmethod
+    def use_cgroup(cls):
+        if cls.cgroup is None or cls.discovery == 'command':
+            return False
+        return cls.discovery == 'cgroup' or cls.cgroup.available()
+
+    @classmethod
+    def get_pid_by_job_from_cgroup(cls):
+        """
+        Return None if the jobs should be discovered by the scheduler
+        commands instead.
+        """
+        if not cls.use_cgroup():
+            return None
+        return cls.cgroup.get_pid_by_job()
+
+    @classmethod
+    def get_cgroup_by_job(cls):
+        """
+        Return the cgroups of the jobs when the jobs are discovered from
+        the cgroup tree, or else an empty dict.
+        """
+        if not cls.use_cgroup():
+            return {}
+        return cls.cgroup.get_cgroup_by_job()
+
+    @classmethod
+    def discover_jobs(cls):
+        """
+        Discover the processes and cgroups of the jobs with one walk of the
+        cgroup tree, and build the job index of this run.
+        return example:
+        ({'3351': ['1211', '1111']}, {'3351': ['slurm/uid_1000/job_3351']})
+        """
+        if cls.use_cgroup():
+            job_cgroup = cls.cgroup.get_cgroup_by_job()
+            job_pid = cls.cgroup.get_pid_by_job(job_cgroup)
+        else:
+            job_pid, job_cgroup = cls.get_pid_by_job(), {}
+        cls.index = JobIndex(job_pid)
+        return job_pid, job_cgroup
+
+    @classmethod
+    def get_job_index(cls):
+        if cls.index is None:
+            cls.discover_jobs()
+        return cls.index
+
+    @classmethod
+    def get_job_by_pid(cls, pid):
+        return cls.get_job_index().get_job(pid)
+
+
+class SchedulerBase(JobDiscovery):
     verbose = False
 
     @classmethod
@@ -45,6 +148,29 @@ class SchedulerBase(metaclass=ABCMeta):
             ret = -1
         return out, err, ret
 
+    @classmethod
+    def command_lines(cls, cmd, preexec_fn=None):
+        """
+        Yield the decoded output lines of a command while it is running,
+        so a large output is never held in memory as a whole.
+        """
+        try:
+            process = Popen(  # nosec B603
+                cmd,
+                stderr=DEVNULL,
+                stdout=PIPE,
+                preexec_fn=preexec_fn
+            )
+        except Exception as e:
+            cls.print_err(e)
+            return
+        with process:
+            for line in process.stdout:
+                yield line.decode(errors='replace')
+        if process.returncode:
+            cls.print_err(
+                f'{" ".join(cmd)} exited with code {process.returncode}')
+
     @classmethod
     def get_child_pids(cls, parent_id, recursive=False):
         pid_all = []
@@ -56,9 +182,10 @@ class SchedulerBase(metaclass=ABCMeta):
 
 
 class SchedulerInfo:
-    __slots__ = ['id', 'process', 'gpu', 'gpu_vram']
+    __slots__ = ['id', 'process', 'gpu', 'gpu_vram', 'cgroup']
 
-    def __init__(self, id, process: dict, gpu: dict, gpu_vram: dict):
+    def __init__(self, id, process: dict, gpu: dict, gpu_vram: dict,
+                 cgroup: list = None):
         # scheduler id
         self.id = id
         # all process of a job
@@ -66,3 +193,5 @@ class SchedulerInfo:
         # all gpu of a job
         self.gpu = gpu
         self.gpu_vram = gpu_vram
+        # cgroups of a job, relative to the mount point of a controller
+        self.cgroup = cgroup or []
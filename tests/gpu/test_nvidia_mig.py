@@ -0,0 +1,244 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from collections import namedtuple
+
+import pytest
+
+from lico.monitor.plugins.icinga.gpu import nvidia_mig
+from lico.monitor.plugins.icinga.gpu.nvidia_mig import MigTopology, to_mib
+
+# The output of nvidia-smi -q -x on 8 A100 with 7 MIG devices of 1g.10gb
+# each, the GPU instances 7 to 13
+NVIDIA_SMI_FILE = os.path.join(
+    os.path.dirname(__file__), '..', 'fixtures', 'nvidia',
+    'nvidia-smi-q-x-mig.xml')
+GPU_INSTANCES = [str(gi) for gi in range(7, 14)]
+
+MemoryInfo = namedtuple('MemoryInfo', ['total', 'used', 'free'])
+ProcessInfo = namedtuple('ProcessInfo', ['pid', 'usedGpuMemory'])
+
+
+class NVMLError(Exception):
+    pass
+
+
+class NVMLError_NotFound(NVMLError):
+    pass
+
+
+class NVMLError_NotSupported(NVMLError):
+    pass
+
+
+class FakeNVML:
+    """
+    The pynvml calls reading the MIG devices of the GPUs of the fixture.
+    The handle of a GPU is its index, the handle of a MIG device is
+    (gpu index, gpu instance id).
+    """
+    NVMLError = NVMLError
+    NVMLError_NotFound = NVMLError_NotFound
+    NVMLError_NotSupported = NVMLError_NotSupported
+    NVML_DEVICE_MIG_DISABLE = 0
+    NVML_DEVICE_MIG_ENABLE = 1
+
+    def __init__(self, driver='535.104.05'):
+        self.driver = driver
+        self.gpu_uuids = [
+            f'GPU-5a7e3c1{i}-8d2f-4b61-9e0a-1c3d5f7b9e2{i}' for i in range(8)]
+        # The MIG devices created again get new UUIDs
+        self.mig_generation = 0
+        # {(gpu index, gpu instance id): [ProcessInfo]}
+        self.processes = {
+            (0, '7'): [ProcessInfo(4211, 1024 ** 3)],
+        }
+
+    def nvmlInit(self):
+        pass
+
+    def nvmlShutdown(self):
+        pass
+
+    def nvmlSystemGetDriverVersion(self):
+        return self.driver
+
+    def nvmlDeviceGetCount(self):
+        return len(self.gpu_uuids)
+
+    def nvmlDeviceGetHandleByIndex(self, index):
+        return index
+
+    def nvmlDeviceGetUUID(self, handle):
+        if isinstance(handle, tuple):
+            return 'MIG-{}-{}-{}'.format(self.gpu_uuids[handle[0]][4:],
+                                         handle[1], self.mig_generation)
+        return self.gpu_uuids[handle]
+
+    def nvmlDeviceGetMigMode(self, handle):
+        return [self.NVML_DEVICE_MIG_ENABLE, self.NVML_DEVICE_MIG_ENABLE]
+
+    def nvmlDeviceGetMaxMigDeviceCount(self, handle):
+        return len(GPU_INSTANCES)
+
+    def nvmlDeviceGetMigDeviceHandleByIndex(self, handle, index):
+        return handle, GPU_INSTANCES[index]
+
+    def nvmlDeviceGetGpuInstanceId(self, handle):
+        return int(handle[1])
+
+    def nvmlDeviceGetComputeInstanceId(self, handle):
+        return 0
+
+    def nvmlDeviceGetMemoryInfo(self, handle):
+        used = sum(p.usedGpuMemory for p in self.processes.get(handle, []))
+        used += 13 * 1024 ** 2
+        return MemoryInfo(9856 * 1024 ** 2, used, 9856 * 1024 ** 2 - used)
+
+    def nvmlDeviceGetComputeRunningProcesses(self, handle):
+        return self.processes.get(handle, [])
+
+
+@pytest.fixture
+def nvidia_smi_xml():
+    with open(NVIDIA_SMI_FILE, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def nvidia_smi(monkeypatch, nvidia_smi_xml, tmp_path):
+    """
+    The commands of nvidia-smi -q -x run by the topology.
+    """
+    state_dir = tmp_path / 'state'
+    state_dir.mkdir(mode=0o700)
+    monkeypatch.setenv('LICO_MONITOR_STATE_DIR', str(state_dir))
+    monkeypatch.setattr(MigTopology, '_cache', None)
+    commands = []
+
+    def command_call(cmd, preexec_fn=None):
+        commands.append(cmd)
+        return nvidia_smi_xml, b'', 0
+
+    monkeypatch.setattr(MigTopology, 'command_call', command_call)
+    return commands
+
+
+@pytest.fixture
+def nvml(monkeypatch):
+    nvml = FakeNVML()
+    monkeypatch.setattr(nvidia_mig, 'pynvml', nvml)
+    return nvml
+
+
+def instance_state(topology):
+    return [(gpu.index, gpu.uuid, gi_ci_id, i.mig_device, i.sm_count,
+             i.memory_total, i.memory_used,
+             [(p.pid, p.used_memory) for p in i.processes])
+            for gpu in topology.gpus for gi_ci_id, i in gpu.instances.items()]
+
+
+@pytest.mark.parametrize('text, mib', [
+    ('2048 MiB', 2048),
+    ('9 GiB', 9216),
+    ('2048 KiB', 2),
+    ('1 TiB', 1024 ** 2),
+    ('N/A', 0),
+    ('', 0),
+    (None, 0),
+])
+def test_to_mib(text, mib):
+    assert to_mib(text) == mib
+
+
+def test_from_xml(nvidia_smi_xml):
+    topology = MigTopology.from_xml(nvidia_smi_xml)
+    assert [gpu.index for gpu in topology.gpus] == [str(i) for i in range(8)]
+    assert len(topology.mig_gpus()) == 8
+    gpu = topology.gpus[0]
+    assert gpu.uuid == 'GPU-5a7e3c10-8d2f-4b61-9e0a-1c3d5f7b9e20'
+    assert list(gpu.instances) == [f'{gi}/0' for gi in GPU_INSTANCES]
+    assert gpu.sm_total == 7 * 14
+    instance = gpu.instances['7/0']
+    assert (instance.mig_device, instance.memory_total,
+            instance.memory_used) == ('0', '9856 MiB', '2061 MiB')
+    # The memory of the processes in MiB, whatever the unit of nvidia-smi
+    assert [(p.pid, p.used_memory) for p in instance.processes] == [
+        ('4211', 2048)]
+    assert [(p.pid, p.used_memory)
+            for p in gpu.instances['8/0'].processes] == [('4212', 9216)]
+    assert [(p.pid, p.used_memory) for p in topology.gpus[3].instances[
+        '13/0'].processes] == [('5120', 2)]
+    assert [(p.pid, p.used_memory) for p in topology.gpus[5].instances[
+        '9/0'].processes] == [('6001', 0)]
+
+
+def test_state_round_trip(nvidia_smi_xml):
+    topology = MigTopology.from_xml(nvidia_smi_xml)
+    restored = MigTopology.from_state(topology.to_state())
+    assert restored.to_state() == topology.to_state()
+    # The usage is not kept in the state, it is read by NVML in each run
+    for row in instance_state(restored):
+        assert row[-2:] == ('', [])
+    assert [row[:-2] for row in instance_state(restored)] == [
+        row[:-2] for row in instance_state(topology)]
+
+
+def test_load_without_nvml(monkeypatch, nvidia_smi):
+    monkeypatch.setattr(nvidia_mig, 'pynvml', None)
+    assert len(MigTopology.load().gpus) == 8
+    assert len(MigTopology.load(refresh=True).gpus) == 8
+    assert len(nvidia_smi) == 2
+
+
+def test_load_cached(nvidia_smi, nvml):
+    topology = MigTopology.load()
+    assert len(nvidia_smi) == 1
+    state = MigTopology.state.load()
+    # The key of the state is the driver version and the UUIDs of the
+    # GPUs and of their MIG devices
+    assert state['config'][0] == '535.104.05'
+    assert state['config'][1] == [nvml.gpu_uuids[0], sorted(
+        f'MIG-{nvml.gpu_uuids[0][4:]}-{gi}-0' for gi in GPU_INSTANCES)]
+    assert len(state['config']) == 9
+
+    # The next run reads the usage by NVML only
+    nvml.processes[(0, '8')] = [ProcessInfo(4300, 512 * 1024 ** 2)]
+    cached = MigTopology.load(refresh=True)
+    assert len(nvidia_smi) == 1
+    assert [row[:-2] for row in instance_state(cached)] == [
+        row[:-2] for row in instance_state(topology)]
+    gpu = cached.gpus[0]
+    assert gpu.instances['7/0'].memory_used == '1037 MiB'
+    assert [(p.pid, p.used_memory)
+            for p in gpu.instances['7/0'].processes] == [('4211', 1024)]
+    assert [(p.pid, p.used_memory)
+            for p in gpu.instances['8/0'].processes] == [('4300', 512)]
+    assert cached.gpus[1].instances['7/0'].processes == []
+
+
+@pytest.mark.parametrize('change', ['driver', 'gpu', 'mig'])
+def test_load_changed(nvidia_smi, nvml, change):
+    MigTopology.load()
+    if change == 'driver':
+        nvml.driver = '550.54.15'
+    elif change == 'gpu':
+        # A GPU is replaced
+        nvml.gpu_uuids[2] = 'GPU-0c1d2e3f-8d2f-4b61-9e0a-1c3d5f7b9e22'
+    else:
+        # MIG is reconfigured, the MIG devices are new ones
+        nvml.mig_generation = 1
+    MigTopology.load(refresh=True)
+    assert len(nvidia_smi) == 2
@@ -0,0 +1,98 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from lico.monitor.plugins.icinga.gpu import (
+    lico_check_intel_xpu, lico_check_nvidia_gpu,
+)
+from lico.monitor.plugins.icinga.helper.base import MetricsBase, PluginData
+from lico.monitor.plugins.icinga.helper.exporter import build_samples, render
+
+MIG_RESOURCE = [MetricsBase.build_point('lico_gpu0_mig_devices', [{
+    'mig_device': '0', 'gpu_instance_id': '7', 'compute_instance_id': '0',
+    'memory_total': '9856 MiB', 'memory_used': '2061 MiB',
+    'sm_counts': '14', 'process': ['4211'],
+}], 'string', '')]
+
+
+def render_points(plugin_data):
+    return render(build_samples(plugin_data.get_points()))
+
+
+def test_render():
+    plugin_data = PluginData()
+    plugin_data.add_output_data('Job 3351 ...')
+    plugin_data.add_point(MetricsBase.build_point(
+        'cpu_load', 1.5, 'float', ''))
+    for gpu, used in [('0', 1024), ('1', 512)]:
+        plugin_data.add_point(MetricsBase.build_point(
+            'gpu1_mem_used', used, 'float', 'MiB'), 'gpu_mem_used', gpu=gpu)
+    plugin_data.add_point(MetricsBase.build_point(
+        'job_gpu_energy', 3600.5, 'float', 'J'), job='3351[1]')
+    plugin_data.add_point(MetricsBase.build_point(
+        'eth_in', 100, 'float', 'B'), interface='eth"0')
+    # Not a number
+    plugin_data.add_point(MetricsBase.build_point(
+        'gpu0_model', 'A100', 'string', ''))
+    plugin_data.add_point(MetricsBase.build_point(
+        'gpu_temp', None, 'int', 'C'), gpu='0')
+    assert render_points(plugin_data) == '\n'.join([
+        '# TYPE lico_cpu_load gauge',
+        'lico_cpu_load 1.5',
+        '# TYPE lico_gpu_mem_used_bytes gauge',
+        '# UNIT lico_gpu_mem_used_bytes bytes',
+        'lico_gpu_mem_used_bytes{gpu="0"} 1073741824.0',
+        'lico_gpu_mem_used_bytes{gpu="1"} 536870912.0',
+        '# TYPE lico_job_gpu_energy_joules counter',
+        '# UNIT lico_job_gpu_energy_joules joules',
+        'lico_job_gpu_energy_joules_total{job="3351[1]"} 3600.5',
+        '# TYPE lico_eth_in_bytes gauge',
+        '# UNIT lico_eth_in_bytes bytes',
+        'lico_eth_in_bytes{interface="eth\\"0"} 100.0',
+        '# EOF',
+    ]) + '\n'
+
+
+def test_render_mig_devices():
+    plugin_data = PluginData()
+    for get_data in [lico_check_nvidia_gpu.get_mig_sm,
+                     lico_check_nvidia_gpu.get_mig_mem_used,
+                     lico_check_nvidia_gpu.get_mig_total,
+                     lico_check_nvidia_gpu.get_mig_proc_num]:
+        get_data(plugin_data=plugin_data, mig_resource_out=MIG_RESOURCE)
+    labels = 'gpu="0",mig_device="0",gi="7",ci="0"'
+    text = render_points(plugin_data)
+    assert f'lico_gpu_mig_sm_count{{{labels}}} 14.0' in text
+    assert f'lico_gpu_mig_mem_used_bytes{{{labels}}} {2061 * 1024 ** 2}.0' \
+        in text
+    assert f'lico_gpu_mig_mem_total_bytes{{{labels}}} {9856 * 1024 ** 2}.0' \
+        in text
+    assert f'lico_gpu_mig_proc_num{{{labels}}} 1.0' in text
+
+
+def test_render_xpu_tiles(monkeypatch):
+    tiles = [MetricsBase.build_point('gpu0_xpu_tiles', [{
+        'tile_id': 1, 'memory_used': 4096.0, 'memory_total': 16384.0,
+        'gpu_utilization': 35.5, 'gpu_temperature': 52,
+        'gpu_bandwidth_utilization': 12.0,
+    }], 'string', '', index='0')]
+    monkeypatch.setattr(lico_check_intel_xpu.XPUTILEMetric, 'xpu_tile_info',
+                        classmethod(lambda cls: tiles))
+    plugin_data = PluginData()
+    lico_check_intel_xpu.get_xpu_tile_info(plugin_data, False)
+    text = render_points(plugin_data)
+    assert 'lico_gpu_tile_mem_usage_percent{gpu="0",tile="1"} 25.0' in text
+    assert 'lico_gpu_tile_util_percent{gpu="0",tile="1"} 35.5' in text
+    assert 'lico_gpu_tile_temp_celsius{gpu="0",tile="1"} 52.0' in text
+    assert 'lico_gpu_tile_util_bandwidth_percent{gpu="0",tile="1"} 12.0' \
+        in text
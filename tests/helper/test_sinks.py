@@ -0,0 +1,172 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pytest
+
+from lico.monitor.plugins.icinga.helper.base import IcingaPushSink, PluginData
+
+API_PATH = '/v1/actions/process-check-result'
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        result = json.loads(self.rfile.read(length))
+        api = self.server.api
+        status = api.status.get(result.get('host'), 200)
+        with api.lock:
+            api.requests.append((self.path, self.client_address, result))
+        body = json.dumps({'results': [{'code': status}]}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class IcingaAPI:
+    """
+    A stand-in of the Icinga 2 API taking the passive check results.
+    status: the HTTP status answered for the results of a host, 200 for
+    the other hosts
+    """
+
+    def __init__(self, port=0):
+        self.status = dict()
+        self.requests = list()
+        self.lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', port), _Handler)
+        self._server.api = self
+        threading.Thread(
+            target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self._server.server_address[1])
+
+    @property
+    def hosts(self):
+        return [result.get('host') for _, _, result in self.requests]
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    path = tmp_path / 'state'
+    path.mkdir(mode=0o700)
+    monkeypatch.setenv('LICO_MONITOR_STATE_DIR', str(path))
+    return path
+
+
+@pytest.fixture
+def api(state_dir):
+    api = IcingaAPI()
+    yield api
+    api.stop()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def host_data(text='Power = 268.0W'):
+    plugin_data = PluginData()
+    plugin_data.add_output_data(text)
+    return plugin_data
+
+
+def test_push_batches(api):
+    sink = IcingaPushSink(api.url, 'node1', batch_size=2)
+    for host in ['c1', 'c2', 'c3']:
+        sink.emit(host_data(), host=host)
+    # The full batch is sent, the last result waits for the flush
+    assert api.hosts == ['c1', 'c2']
+    assert sink.flush()
+    assert api.hosts == ['c1', 'c2', 'c3']
+    assert all(path == API_PATH for path, _, _ in api.requests)
+    # The batches are sent over one keep-alive connection
+    assert len({address for _, address, _ in api.requests}) == 1
+
+
+def test_push_rejected(api):
+    # The host does not exist in Icinga 2
+    api.status['c2'] = 404
+    sink = IcingaPushSink(api.url, 'node1')
+    for host in ['c1', 'c2', 'c3']:
+        sink.emit(host_data(), host=host)
+    assert sink.flush()
+    assert api.hosts == ['c1', 'c2', 'c3']
+    # The rejected result is not spooled to be sent again
+    assert sink.spool.load().get('results', []) == []
+    assert sink.flush()
+    assert api.hosts == ['c1', 'c2', 'c3']
+
+
+def test_push_spooled(state_dir):
+    port = free_port()
+    sink = IcingaPushSink(f'http://127.0.0.1:{port}', 'node1', timeout=1)
+    sink.emit(host_data(), host='c1')
+    sink.emit(host_data(), host='c2')
+    # The API is unreachable, the results are spooled
+    assert not sink.flush()
+    spooled = sink.spool.load()['results']
+    assert [result['host'] for result in spooled] == ['c1', 'c2']
+
+    api = IcingaAPI(port)
+    try:
+        sink = IcingaPushSink(api.url, 'node1')
+        sink.emit(host_data(), host='c3')
+        assert sink.flush()
+        # The spooled results are sent first, with the time they were
+        # checked
+        assert api.hosts == ['c1', 'c2', 'c3']
+        assert [r['execution_end'] for _, _, r in api.requests[:2]] == [
+            result['execution_end'] for result in spooled]
+        assert sink.spool.load()['results'] == []
+    finally:
+        api.stop()
+
+
+def test_push_unavailable(api):
+    api.status['c2'] = 503
+    sink = IcingaPushSink(api.url, 'node1')
+    for host in ['c1', 'c2', 'c3']:
+        sink.emit(host_data(), host=host)
+    assert not sink.flush()
+    # The result the API failed to take and those after it are spooled
+    assert [result['host'] for result in sink.spool.load()['results']] == [
+        'c2', 'c3']
+    api.status.pop('c2')
+    assert sink.flush()
+    assert api.hosts == ['c1', 'c2', 'c2', 'c3']
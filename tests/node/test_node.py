@@ -0,0 +1,48 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+
+import pytest
+
+from lico.monitor.plugins.icinga.node import lico_check_node
+from lico.monitor.plugins.icinga.node.lico_check_node import (
+    collect, parse_collectors,
+)
+
+
+def test_parse_collectors():
+    assert parse_collectors(' cpu,memory,,cpu ') == ['cpu', 'memory']
+    with pytest.raises(argparse.ArgumentTypeError, match='unknown'):
+        parse_collectors('cpu,gpus')
+
+
+@pytest.mark.parametrize('value', ['', ',', ' , '])
+def test_parse_collectors_empty(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_collectors(value)
+
+
+def test_collect(monkeypatch):
+    def get_data(name):
+        return lambda plugin_data, verbose: plugin_data.add_perf_data(
+            f'{name}=1')
+
+    monkeypatch.setitem(lico_check_node.COLLECTORS, 'cpu',
+                        [get_data('cpu_load'), get_data('cpu_util')])
+    result = collect(['cpu'], False)
+    assert list(result) == ['cpu']
+    assert result['cpu'].get_perf_data() == 'cpu_load=1 cpu_util=1'
+    # No collector, no thread
+    assert collect([], False) == {}
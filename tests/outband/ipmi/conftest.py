@@ -0,0 +1,50 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+from fake_ipmi import FakeCommand
+from pyghmi.ipmi import sdr
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    path = tmp_path / 'state'
+    path.mkdir(mode=0o700)
+    monkeypatch.setenv('LICO_MONITOR_STATE_DIR', str(path))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def shared_sdrs(monkeypatch):
+    # The SDRs decoded by pyghmi are shared in the process, each test
+    # downloads the records of its BMCs
+    monkeypatch.setattr(sdr, 'shared_sdrs', dict())
+
+
+@pytest.fixture
+def fake_bmcs(state_dir, monkeypatch):
+    """
+    The BMCs of the fan-out, {address: FakeCommand}, the sessions are
+    opened to them instead of the network.
+    """
+    bmcs = dict()
+
+    def get_command(bmc=None, userid=None, password=None, port=623):
+        return bmcs[bmc]
+
+    monkeypatch.setattr(
+        'lico.monitor.plugins.icinga.outband.ipmi.fanout.get_command',
+        get_command)
+    FakeCommand.reset()
+    return bmcs
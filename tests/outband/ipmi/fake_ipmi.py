@@ -0,0 +1,171 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import struct
+import threading
+import time
+from collections import Counter
+
+import pyghmi.exceptions as pygexc
+from pyghmi.ipmi.command import Command
+from pyghmi.ipmi.oem import generic
+
+# netfn, command
+GET_DEVICE_ID = (6, 0x01)
+GET_SDR_REPOSITORY_INFO = (0x0a, 0x20)
+GET_SDR = (0x0a, 0x23)
+GET_SENSOR_READING = (4, 0x2d)
+
+SENSOR_TYPE_TEMPERATURE = 0x01
+SENSOR_TYPE_OTHER_UNITS = 0x0b
+UNIT_DEGREES_C = 1
+UNIT_WATTS = 6
+# The threshold states of the Get Sensor Reading response
+UPPER_CRITICAL = 0b10000
+
+
+class FakeSensor:
+    """
+    A threshold sensor of a BMC, a full sensor record in its SDR.
+    """
+
+    def __init__(self, name, value, sensor_type=SENSOR_TYPE_TEMPERATURE,
+                 unit=UNIT_DEGREES_C, states=0):
+        self.name = name
+        self.value = value
+        self.sensor_type = sensor_type
+        self.unit = unit
+        self.states = states
+
+    def record(self, record_id, number):
+        """
+        The full sensor record, the reading is value * 1 + 0.
+        """
+        body = bytearray(42)
+        body[0] = 0x20  # owner, the BMC
+        body[2] = number
+        body[6] = 0x0c  # settable and readable thresholds
+        body[7] = self.sensor_type
+        body[8] = 0x01  # threshold reading type
+        body[16] = self.unit
+        body[19] = 1  # M
+        name = self.name.encode()
+        body += bytes([0xc0 | len(name)]) + name
+        return struct.pack('<HBBB', record_id, 0x51, 0x01, len(body)) + body
+
+
+def power_sensor(name, value):
+    return FakeSensor(name, value, SENSOR_TYPE_OTHER_UNITS, UNIT_WATTS)
+
+
+class FakeCommand(Command):
+    """
+    The Command of pyghmi on a fake BMC answering the raw commands of the
+    SDR repository and the sensors. The BMC reads a sensor in delay
+    seconds, or does not respond after the session is opened.
+    requests: the number of the raw commands sent, by (netfn, command)
+    """
+    # The raw commands running across all the BMCs
+    active = 0
+    max_active = 0
+    _lock = threading.Lock()
+
+    def __init__(self, bmc, sensors, delay=0, respond=True, timestamp=1):
+        # No session, the raw commands are answered by the fake BMC
+        self.bmc = bmc
+        self.sensors = sensors
+        self.delay = delay
+        self.respond = respond
+        self.timestamp = timestamp
+        self.ipmi_session = FakeSession()
+        self.requests = Counter()
+        self._sdr = None
+        self._sdrcachedir = None
+        self._oem = generic.OEMHandler(None, self)
+        self._oemknown = True
+
+    @classmethod
+    def reset(cls):
+        cls.active = cls.max_active = 0
+
+    def _records(self):
+        return [sensor.record(i, i + 1)
+                for i, sensor in enumerate(self.sensors)]
+
+    def _device_id(self):
+        # Lenovo, firmware 1.23, with an SDR repository device
+        return bytes([0x20, 0x01, 0x01, 0x23, 0x02, 0x02,
+                      0x66, 0x4a, 0x00, 0x01, 0x00])
+
+    def _repository_info(self):
+        return bytes([0x51, len(self.sensors), 0, 0xff, 0xff]) + \
+            struct.pack('<II', self.timestamp, 0) + bytes([0x02])
+
+    def _get_sdr(self, data):
+        record_id = data[2] + (data[3] << 8)
+        records = self._records()
+        next_id = record_id + 1 if record_id + 1 < len(records) else 0xffff
+        return list(struct.pack('<H', next_id)) + list(records[record_id])
+
+    def _sensor_reading(self, number):
+        if not 0 < number <= len(self.sensors):
+            return {'error': 'Requested sensor not present', 'code': 203}
+        sensor = self.sensors[number - 1]
+        return {'code': 0, 'data': [sensor.value, 0x40, sensor.states]}
+
+    def _respond(self, netfn, command, data):
+        if not self.respond:
+            return {'error': 'timeout', 'code': 0xffff}
+        if (netfn, command) == GET_DEVICE_ID:
+            return {'code': 0, 'data': self._device_id()}
+        if (netfn, command) == GET_SDR_REPOSITORY_INFO:
+            return {'code': 0, 'data': self._repository_info()}
+        if (netfn, command) == GET_SDR:
+            return {'code': 0, 'data': self._get_sdr(data)}
+        if (netfn, command) == GET_SENSOR_READING:
+            time.sleep(self.delay)
+            return self._sensor_reading(data[0])
+        return {'error': 'Invalid command', 'code': 0xc1}
+
+    def raw_command(self, netfn, command, bridge_request=(), data=(),
+                    delay_xmit=None, retry=True, timeout=None, rslun=0):
+        cls = type(self)
+        with cls._lock:
+            self.requests[(netfn, command)] += 1
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        try:
+            return self._respond(netfn, command, data)
+        finally:
+            with cls._lock:
+                cls.active -= 1
+
+    def xraw_command(self, netfn, command, bridge_request=(), data=(),
+                     delay_xmit=None, retry=True, timeout=None, rslun=0):
+        rsp = self.raw_command(netfn, command, data=data, rslun=rslun)
+        if 'error' in rsp:
+            raise pygexc.IpmiException(rsp['error'], rsp['code'])
+        return {'netfn': netfn + 1, 'command': command,
+                'data': memoryview(bytes(rsp['data']))}
+
+
+class FakeSession:
+
+    def __init__(self):
+        self.logged = 1
+        self.logouts = 0
+
+    def logout(self):
+        self.logouts += 1
+        self.logged = 0
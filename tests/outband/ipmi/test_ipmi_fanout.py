@@ -0,0 +1,127 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import time
+
+from fake_ipmi import (
+    GET_SDR, GET_SENSOR_READING, FakeCommand, FakeSensor, power_sensor,
+)
+
+from lico.monitor.plugins.icinga.helper.base import OutputSink
+from lico.monitor.plugins.icinga.helper.fanout import Backoff, BMCHost
+from lico.monitor.plugins.icinga.outband.ipmi.combined import lico_check_ipmi
+
+SENSORS = [
+    power_sensor('Sys Power', 268),
+    FakeSensor('Ambient Temp', 23),
+]
+
+
+class ListSink(OutputSink):
+
+    def __init__(self):
+        self.results = dict()
+
+    def emit(self, plugin_data, service=None, host=None):
+        self.results[host] = plugin_data
+
+
+def get_args(**kwargs):
+    args = dict(power=False, temperature=False, health=False, all=True,
+                verbose=False, user='admin', ipmi_port=623, concurrency=64,
+                timeout=5)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+def run_fanout(fanout, hosts):
+    sink = ListSink()
+    fanout.run(hosts, sink)
+    return sink.results
+
+
+def test_fanout(fake_bmcs):
+    fake_bmcs['10.0.0.1'] = FakeCommand('10.0.0.1', SENSORS)
+    fanout = lico_check_ipmi.get_fanout(get_args())
+    try:
+        results = run_fanout(fanout, [BMCHost('10.0.0.1', 'node1')])
+        assert results['node1'].get_state() == 'OK'
+        perf_data = results['node1'].get_perf_data()
+        assert 'node_power=268.0W' in perf_data
+        assert 'node_temp=23.0' in perf_data
+        assert 'node_health_critical_count=0' in perf_data
+        # One reading of the sensors for all the metrics
+        requests = fake_bmcs['10.0.0.1'].requests
+        assert requests[GET_SDR] == 2
+        assert requests[GET_SENSOR_READING] == 2
+    finally:
+        fanout.close()
+    assert fake_bmcs['10.0.0.1'].ipmi_session.logouts == 1
+
+
+def test_fanout_concurrency(fake_bmcs):
+    hosts = [BMCHost(f'10.0.0.{i}') for i in range(1, 9)]
+    for host in hosts:
+        fake_bmcs[host.address] = FakeCommand(host.address, SENSORS, 0.1)
+    fanout = lico_check_ipmi.get_fanout(get_args(concurrency=3))
+    try:
+        results = run_fanout(fanout, hosts)
+    finally:
+        fanout.close()
+    assert all(r.get_state() == 'OK' for r in results.values())
+    assert FakeCommand.max_active == 3
+
+
+def test_fanout_timeout(fake_bmcs):
+    fake_bmcs['10.0.0.1'] = FakeCommand('10.0.0.1', SENSORS, 0.5)
+    fake_bmcs['10.0.0.2'] = FakeCommand('10.0.0.2', SENSORS)
+    fanout = lico_check_ipmi.get_fanout(
+        get_args(concurrency=1, timeout=0.2))
+    start = time.monotonic()
+    try:
+        results = run_fanout(
+            fanout, [BMCHost('10.0.0.1'), BMCHost('10.0.0.2')])
+    finally:
+        fanout.close()
+    assert results['10.0.0.1'].get_state() == 'Unknown'
+    assert results['10.0.0.2'].get_state() == 'OK'
+    # The slot of the BMC timed out is held until its worker returns
+    assert FakeCommand.max_active == 1
+    assert time.monotonic() - start >= 1
+    # The session of the BMC timed out is closed
+    assert fake_bmcs['10.0.0.1'].ipmi_session.logouts == 1
+    backoff = Backoff('ipmi_fanout_backoff.json')
+    assert not backoff.ready('10.0.0.1', time.time())
+    assert backoff.ready('10.0.0.2', time.time())
+
+
+def test_fanout_backoff(fake_bmcs):
+    # The BMC does not respond after the session is opened
+    fake_bmcs['10.0.0.1'] = FakeCommand('10.0.0.1', SENSORS, respond=False)
+    fake_bmcs['10.0.0.2'] = FakeCommand('10.0.0.2', SENSORS)
+    hosts = [BMCHost('10.0.0.1'), BMCHost('10.0.0.2')]
+    fanout = lico_check_ipmi.get_fanout(get_args())
+    try:
+        results = run_fanout(fanout, hosts)
+        assert results['10.0.0.1'].get_state() == 'Unknown'
+        assert results['10.0.0.2'].get_state() == 'OK'
+        sent = sum(fake_bmcs['10.0.0.1'].requests.values())
+        # The BMC is not polled again until the backoff time
+        results = run_fanout(fanout, hosts)
+        assert '10.0.0.1' not in results
+        assert sum(fake_bmcs['10.0.0.1'].requests.values()) == sent
+        assert fake_bmcs['10.0.0.2'].requests[GET_SENSOR_READING] == 4
+    finally:
+        fanout.close()
@@ -0,0 +1,71 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from fake_ipmi import (
+    GET_DEVICE_ID, GET_SDR, GET_SDR_REPOSITORY_INFO, GET_SENSOR_READING,
+    FakeCommand, FakeSensor, power_sensor,
+)
+
+from lico.monitor.plugins.icinga.outband.ipmi.common import SensorReadings
+
+SENSORS = [
+    power_sensor('Sys Power', 268),
+    FakeSensor('Ambient Temp', 23),
+    FakeSensor('CPU1 Temp', 45),
+]
+
+
+def test_sdr_downloaded_once(state_dir):
+    command = FakeCommand('10.0.0.1', SENSORS)
+    readings = SensorReadings(command, lazy=False)
+    assert [r.name for r in readings.readings] == [
+        'Sys Power', 'Ambient Temp', 'CPU1 Temp']
+    assert readings.power() == 268.0
+    # The download by pyghmi reads the device and the repository info again
+    assert command.requests == {
+        GET_DEVICE_ID: 2, GET_SDR_REPOSITORY_INFO: 2, GET_SDR: 3,
+        GET_SENSOR_READING: 3}
+    assert len(list((state_dir / 'sdr').iterdir())) == 1
+
+    # The next session reads the records from the cache file
+    command.requests.clear()
+    readings = SensorReadings(command, lazy=False)
+    assert readings.inlet_temperature() == 23.0
+    assert readings.health()['badreadings'] == []
+    assert command.requests == {
+        GET_DEVICE_ID: 1, GET_SDR_REPOSITORY_INFO: 1, GET_SENSOR_READING: 3}
+
+
+def test_sdr_checked_once_lazy(state_dir):
+    command = FakeCommand('10.0.0.1', SENSORS)
+    SensorReadings(command).readings
+    command.requests.clear()
+    readings = SensorReadings(command)
+    assert readings.power() == 268.0
+    assert readings.inlet_temperature() == 23.0
+    # The repository is checked by the first read of the session only
+    assert command.requests == {
+        GET_DEVICE_ID: 1, GET_SDR_REPOSITORY_INFO: 1, GET_SENSOR_READING: 2}
+
+
+def test_sdr_changed(state_dir):
+    command = FakeCommand('10.0.0.1', SENSORS)
+    SensorReadings(command).readings
+    # A sensor is added to the repository
+    command.sensors = SENSORS + [FakeSensor('CPU2 Temp', 47)]
+    command.timestamp = 2
+    command.requests.clear()
+    readings = SensorReadings(command).readings
+    assert [r.name for r in readings][-1] == 'CPU2 Temp'
+    assert command.requests[GET_SDR] == 4
@@ -0,0 +1,109 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+
+import pyghmi.constants as pygconstants
+import pyghmi.exceptions as pygexc
+from fake_ipmi import (
+    GET_SDR, GET_SDR_REPOSITORY_INFO, GET_SENSOR_READING, UPPER_CRITICAL,
+    FakeCommand, FakeSensor, power_sensor,
+)
+from pyghmi.ipmi.oem import generic
+
+from lico.monitor.plugins.icinga.helper.base import PluginData
+from lico.monitor.plugins.icinga.outband.ipmi.combined import lico_check_ipmi
+from lico.monitor.plugins.icinga.outband.ipmi.common import SensorReadings
+
+SENSORS = [
+    power_sensor('Sys Power', 268),
+    FakeSensor('Ambient Temp', 23),
+    FakeSensor('CPU1 Temp', 95, states=UPPER_CRITICAL),
+]
+
+
+class BypassOEM(generic.OEMHandler):
+    """
+    An OEM handler assessing the health of the BMC itself.
+    """
+
+    def get_health(self, summary):
+        summary['health'] = pygconstants.Health.Warning
+        raise pygexc.BypassGenericBehavior()
+
+
+def health_summary(summary):
+    return summary['health'], [
+        (reading.name, reading.health) for reading in summary['badreadings']]
+
+
+def test_one_sdr_read(state_dir):
+    command = FakeCommand('10.0.0.1', SENSORS)
+    args = argparse.Namespace(power=False, temperature=False, health=False,
+                              all=True, verbose=False)
+    plugin_data = PluginData()
+    lico_check_ipmi.get_ipmi_info(plugin_data, args, SensorReadings(
+        command, lazy=False))
+    perf_data = plugin_data.get_perf_data()
+    assert 'node_power=268.0W' in perf_data
+    assert 'node_temp=23.0' in perf_data
+    assert 'node_health_critical_count=1' in perf_data
+    # The power, temperature and health are derived from one read of the
+    # repository and of each sensor
+    assert command.requests[GET_SDR] == len(SENSORS)
+    assert command.requests[GET_SENSOR_READING] == len(SENSORS)
+
+
+def test_lazy_select(state_dir):
+    SensorReadings(FakeCommand('10.0.0.1', SENSORS)).readings
+    command = FakeCommand('10.0.0.1', SENSORS)
+    readings = SensorReadings(command)
+    assert readings.power() == 268.0
+    # Only the power sensor is read
+    assert command.requests[GET_SENSOR_READING] == 1
+    assert readings.inlet_temperature() == 23.0
+    assert command.requests[GET_SENSOR_READING] == 2
+    assert command.requests[GET_SDR_REPOSITORY_INFO] == 1
+    # The health needs all the sensors
+    assert readings.health()['health'] == pygconstants.Health.Critical
+    assert command.requests[GET_SENSOR_READING] == 5
+
+
+def test_lazy_select_psu(state_dir):
+    sensors = [power_sensor('PSU1_PIN', 130), power_sensor('PSU2_PIN', 140),
+               FakeSensor('Ambient Temp', 23)]
+    command = FakeCommand('10.0.0.1', sensors)
+    # Without a power sensor of the node, the input power of the PSUs is
+    # summed
+    assert SensorReadings(command).power() == 270.0
+    assert command.requests[GET_SENSOR_READING] == 2
+
+
+def test_health(state_dir):
+    readings = SensorReadings(FakeCommand('10.0.0.1', SENSORS))
+    expected = FakeCommand('10.0.0.1', SENSORS).get_health()
+    assert health_summary(readings.health()) == health_summary(expected)
+    assert health_summary(expected) == (
+        pygconstants.Health.Critical,
+        [('CPU1 Temp', pygconstants.Health.Critical)])
+
+
+def test_health_oem(state_dir):
+    commands = [FakeCommand('10.0.0.1', SENSORS) for _ in range(2)]
+    for command in commands:
+        command._oem = BypassOEM(None, command)
+    summary = SensorReadings(commands[0]).health()
+    assert health_summary(summary) == health_summary(
+        commands[1].get_health())
+    assert health_summary(summary) == (pygconstants.Health.Warning, [])
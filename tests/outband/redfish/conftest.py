@@ -0,0 +1,55 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import shutil
+import subprocess  # nosec B404
+
+import pytest
+from mock_redfish import MockBMC
+
+
+@pytest.fixture(scope='session')
+def certificate(tmp_path_factory):
+    if shutil.which('openssl') is None:
+        pytest.skip('openssl is required for the mock BMC')
+    cert_dir = tmp_path_factory.mktemp('cert')
+    certfile, keyfile = cert_dir / 'cert.pem', cert_dir / 'key.pem'
+    subprocess.run(  # nosec B603 B607
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+         '-days', '1', '-subj', '/CN=127.0.0.1',
+         '-keyout', str(keyfile), '-out', str(certfile)],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return str(certfile), str(keyfile)
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    path = tmp_path / 'state'
+    path.mkdir(mode=0o700)
+    monkeypatch.setenv('LICO_MONITOR_STATE_DIR', str(path))
+    return path
+
+
+@pytest.fixture
+def mock_bmc(certificate, state_dir):
+    bmcs = []
+
+    def start(vendor):
+        bmc = MockBMC(vendor, *certificate).start()
+        bmcs.append(bmc)
+        return bmc
+
+    yield start
+    for bmc in bmcs:
+        bmc.stop()
@@ -0,0 +1,174 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import hashlib
+import json
+import os
+import ssl
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'fixtures', 'redfish')
+SESSIONS_URL = '/redfish/v1/SessionService/Sessions'
+
+
+def load_payloads(vendor):
+    """
+    The payloads of a BMC of the vendor, {url: body}, the urls have no
+    trailing slash.
+    """
+    with open(os.path.join(FIXTURES_DIR, f'{vendor.lower()}.json')) as f:
+        return json.load(f)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body=None, headers=()):
+        data = json.dumps(body if body is not None else {}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _path(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        return url.path.rstrip('/') or '/', query
+
+    def do_GET(self):
+        path, query = self._path()
+        self.server.bmc._record('GET', path, query)
+        status, body = self.server.bmc._get(
+            path, query, self.headers.get('X-Auth-Token'))
+        if status != 200:
+            return self._send(status, body)
+        etag = '"{}"'.format(hashlib.sha1(
+            json.dumps(body, sort_keys=True).encode()).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._send(200, body, [('ETag', etag)])
+
+    def do_POST(self):
+        path, query = self._path()
+        length = int(self.headers.get('Content-Length', 0))
+        credentials = json.loads(self.rfile.read(length) or '{}')
+        self.server.bmc._record('POST', path, query)
+        if path != SESSIONS_URL:
+            return self._send(405)
+        token = uuid.uuid4().hex
+        location = f'{SESSIONS_URL}/{len(self.server.bmc.tokens) + 1}'
+        self.server.bmc.tokens[token] = location
+        self._send(201, {'UserName': credentials.get('UserName')},
+                   [('X-Auth-Token', token), ('Location', location)])
+
+    def do_DELETE(self):
+        path, query = self._path()
+        self.server.bmc._record('DELETE', path, query)
+        for token, location in list(self.server.bmc.tokens.items()):
+            if location == path:
+                self.server.bmc.tokens.pop(token)
+                return self._send(204)
+        self._send(404)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockBMC:
+    """
+    A Redfish service serving the payloads of a vendor over HTTPS, with
+    sessions, ETags, and $top, $skip and $filter=Created ge on the
+    collections.
+    reject_queries: the query parameters answered with 501 Not Implemented
+    fail_urls: the urls answered with 500 Internal Server Error
+    """
+
+    def __init__(self, vendor, certfile, keyfile):
+        self.resources = load_payloads(vendor)
+        self.reject_queries = set()
+        self.fail_urls = set()
+        self.tokens = dict()
+        self.requests = list()
+        self._lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.bmc = self
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        self._server.socket = context.wrap_socket(
+            self._server.socket, server_side=True)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+
+    @property
+    def address(self):
+        return '127.0.0.1:{}'.format(self._server.server_address[1])
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def requested(self, method, path=None):
+        with self._lock:
+            return [
+                r for r in self.requests
+                if r[0] == method and (path is None or r[1] == path)
+            ]
+
+    def _record(self, method, path, query):
+        with self._lock:
+            self.requests.append((method, path, query))
+
+    def _get(self, path, query, token):
+        if path not in ('/redfish', '/redfish/v1') and \
+                token not in self.tokens:
+            return 401, {'error': 'unauthorized'}
+        if path in self.fail_urls:
+            return 500, {'error': 'internal error'}
+        if self.reject_queries & set(query):
+            return 501, {'error': 'query not implemented'}
+        body = self.resources.get(path)
+        if body is None:
+            return 404, {'error': 'not found'}
+        if 'Members' in body and query:
+            body = copy.deepcopy(body)
+            members = body['Members']
+            if '$filter' in query:
+                _, _, created = query['$filter'].partition(' ge ')
+                members = [m for m in members if m['Created'] >= created]
+            body['Members@odata.count'] = len(members)
+            skip = int(query.get('$skip', 0))
+            top = int(query.get('$top', len(members)))
+            body['Members'] = members[skip:skip + top]
+        return 200, body
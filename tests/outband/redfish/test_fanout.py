@@ -0,0 +1,132 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+
+import pytest
+from mock_redfish import SESSIONS_URL
+
+from lico.monitor.plugins.icinga.helper.base import OutputSink
+from lico.monitor.plugins.icinga.helper.fanout import Backoff, BMCHost
+from lico.monitor.plugins.icinga.outband.redfish.combined import (
+    lico_check_redfish,
+)
+from lico.monitor.plugins.icinga.outband.redfish.fanout import RedfishFanout
+
+
+class ListSink(OutputSink):
+
+    def __init__(self):
+        self.results = dict()
+
+    def emit(self, plugin_data, service=None, host=None):
+        self.results[host] = plugin_data
+
+
+def parse_args(monkeypatch, *argv):
+    monkeypatch.setattr('sys.argv', [
+        'lico_check_redfish', '--hosts', 'hosts', '--username', 'admin',
+        '--password', 'secret', '--all', *argv])
+    return lico_check_redfish.parse_command_line()
+
+
+def run_fanout(args, hosts):
+    fanout = RedfishFanout(
+        lambda conn: lico_check_redfish.get_tasks(conn, args), args,
+        backoff=Backoff('redfish_fanout_backoff.json'))
+    sink = ListSink()
+    fanout.run(hosts, sink)
+    return fanout, sink.results
+
+
+@pytest.mark.parametrize('vendor, power, temperature, health', [
+    ('Lenovo', 'node_power=268.0W', 'node_temp=23.0', 'critical_count=1'),
+    ('Dell', 'node_power=312.0W', 'node_temp=21.0', 'critical_count=0'),
+    ('HPE', 'node_power=187.0W', 'node_temp=19.0', 'critical_count=1'),
+])
+def test_fanout_vendor(monkeypatch, mock_bmc, vendor, power, temperature,
+                       health):
+    bmc = mock_bmc(vendor)
+    if vendor == 'HPE':
+        # No ProtocolFeaturesSupported, the log is read without $top
+        bmc.reject_queries.add('$top')
+    args = parse_args(monkeypatch, '--vendor', vendor)
+    fanout, results = run_fanout(args, [BMCHost(bmc.address, 'node1')])
+    try:
+        perf_data = results['node1'].get_perf_data()
+        assert results['node1'].get_state() == 'OK'
+        assert power in perf_data
+        assert temperature in perf_data
+        assert health in perf_data
+        assert len(bmc.requested('POST', SESSIONS_URL)) == 1
+    finally:
+        fanout.close()
+
+
+def get_thermal(plugin_data, conn, args):
+    thermal = conn.rf_get('/redfish/v1/Chassis/1/Thermal')
+    plugin_data.add_output_data(thermal['Id'])
+
+
+def test_fanout_failed_bmc(monkeypatch, mock_bmc):
+    good, bad = mock_bmc('Lenovo'), mock_bmc('Lenovo')
+    bad.fail_urls.add('/redfish/v1/Chassis/1/Thermal')
+    args = parse_args(monkeypatch, '--no_session_cache')
+    hosts = [BMCHost(good.address, 'good'), BMCHost(bad.address, 'bad')]
+    fanout = RedfishFanout(lambda conn: [(get_thermal, args)], args)
+    sink = ListSink()
+    try:
+        fanout.run(hosts, sink)
+        assert sink.results['good'].get_output_data() == 'Thermal'
+        assert sink.results['bad'].get_state() == 'Unknown'
+        # The connection of the failed BMC is closed, logging out
+        assert bad.address not in fanout._connections
+        assert len(bad.requested('DELETE')) == 1
+        assert not good.requested('DELETE')
+        backoff = Backoff('redfish_fanout_backoff.json')
+        assert not backoff.ready(bad.address, 0)
+        assert backoff.ready(good.address, 0)
+    finally:
+        fanout.close()
+    assert len(good.requested('DELETE')) == 1
+
+
+def test_fanout_unreachable_bmc(monkeypatch, state_dir):
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        address = '127.0.0.1:{}'.format(s.getsockname()[1])
+    args = parse_args(monkeypatch, '--vendor', 'Lenovo', '--timeout', '1')
+    fanout, results = run_fanout(args, [BMCHost(address)])
+    fanout.close()
+    assert results[address].get_state() == 'Unknown'
+
+
+def test_fanout_saves_updates_once(monkeypatch, mock_bmc):
+    bmc = mock_bmc('Lenovo')
+    args = parse_args(monkeypatch, '--vendor', 'Lenovo')
+    host = BMCHost(bmc.address)
+    fanout, _ = run_fanout(args, [host])
+    try:
+        conn = fanout._connections[bmc.address]
+        assert not any(conn.resource_cache._updates.values())
+        saved = conn.resource_cache.state.load()['resources']
+        assert '/redfish/v1/Chassis/1/Power/' in saved
+        # The next round of a resident collector only sends conditional
+        # requests for the metric resources, answered 304
+        bmc.requests.clear()
+        fanout.run([host], ListSink())
+        assert bmc.requested('GET', '/redfish/v1/Chassis/1/Power')
+        assert not bmc.requested('GET', '/redfish/v1/Systems')
+    finally:
+        fanout.close()
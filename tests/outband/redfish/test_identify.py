@@ -0,0 +1,32 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from lico.monitor.plugins.icinga.outband.redfish.common import (
+    RedfishConnection,
+)
+
+
+@pytest.mark.parametrize('identify, expected', [
+    ('Name=Ambient Temp', ('Name', ['Ambient Temp'])),
+    ('Name=CPU1 Temp,CPU2 Temp', ('Name', ['CPU1 Temp', 'CPU2 Temp'])),
+    ('Name=*', ('Name', ['*'])),
+    # An escaped comma is in the name
+    (r'Name=Temp 1\, Rear,CPU1 Temp', ('Name', ['Temp 1, Rear', 'CPU1 Temp'])),
+    (r'Name=C:\\Temp,PSU 1\,', ('Name', ['C:\\Temp', 'PSU 1,'])),
+    ('Ambient Temp', (None, [])),
+])
+def test_parse_identify(identify, expected):
+    assert RedfishConnection.parse_identify(identify) == expected
@@ -0,0 +1,83 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime, timedelta, timezone
+
+from test_fanout import parse_args, run_fanout
+
+from lico.monitor.plugins.icinga.helper.fanout import BMCHost
+
+TELEMETRY_URL = '/redfish/v1/TelemetryService'
+REPORTS_URL = TELEMETRY_URL + '/MetricReports'
+POWER_PROPERTY = \
+    '/redfish/v1/Chassis/1/Power#/PowerControl/0/PowerConsumedWatts'
+
+
+def add_power_report(bmc, ages, values):
+    """
+    Add a PowerMetrics report with a sample of each value, taken the age in
+    seconds ago.
+    """
+    now = datetime.now(timezone.utc)
+    bmc.resources['/redfish/v1']['TelemetryService'] = {
+        '@odata.id': TELEMETRY_URL}
+    bmc.resources[TELEMETRY_URL] = {
+        '@odata.id': TELEMETRY_URL,
+        'MetricReports': {'@odata.id': REPORTS_URL},
+    }
+    bmc.resources[REPORTS_URL + '/PowerMetrics'] = {
+        '@odata.id': REPORTS_URL + '/PowerMetrics',
+        'Id': 'PowerMetrics',
+        'MetricValues': [{
+            'MetricId': 'SystemInputPower',
+            'MetricProperty': POWER_PROPERTY,
+            'MetricValue': str(value),
+            'Timestamp': (now - timedelta(seconds=age)).isoformat(),
+        } for age, value in zip(ages, values)],
+    }
+
+
+def test_power_report_discovered(monkeypatch, mock_bmc):
+    bmc = mock_bmc('Lenovo')
+    add_power_report(bmc, [600, 200, 100, 10], [500, 300, 320, 310])
+    # Without --vendor, the power is located in the report with the
+    # resources of the power discovered
+    args = parse_args(monkeypatch, '--power_report', 'PowerMetrics')
+    fanout, results = run_fanout(args, [BMCHost(bmc.address, 'node1')])
+    try:
+        perf_data = results['node1'].get_perf_data()
+        assert 'node_power=310.0W' in perf_data
+        assert 'node_power_min=300.0W' in perf_data
+        assert 'node_power_max=320.0W' in perf_data
+        conn = fanout._connections[bmc.address]
+        assert conn.resource_cache.get_discovery('|Chassis|Power') == [
+            '/redfish/v1/Chassis/1/Power/']
+    finally:
+        fanout.close()
+
+
+def test_power_report_stale(monkeypatch, mock_bmc):
+    bmc = mock_bmc('Lenovo')
+    # The BMC stopped updating the report an hour ago
+    add_power_report(bmc, [3700, 3600], [500, 510])
+    args = parse_args(monkeypatch, '--vendor', 'Lenovo',
+                      '--power_report', 'PowerMetrics')
+    fanout, results = run_fanout(args, [BMCHost(bmc.address, 'node1')])
+    try:
+        perf_data = results['node1'].get_perf_data()
+        # The power is read from the resource instead
+        assert 'node_power=268.0W' in perf_data
+        assert 'node_power_min' not in perf_data
+    finally:
+        fanout.close()
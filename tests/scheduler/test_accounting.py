@@ -0,0 +1,126 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from types import SimpleNamespace
+
+import pytest
+
+from lico.monitor.plugins.icinga.helper.base import PluginData
+from lico.monitor.plugins.icinga.scheduler.utils import accounting
+from lico.monitor.plugins.icinga.scheduler.utils.accounting import CounterRates
+
+
+class Clock:
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    state_dir = tmp_path / 'state'
+    state_dir.mkdir(mode=0o700)
+    monkeypatch.setenv('LICO_MONITOR_STATE_DIR', str(state_dir))
+    clock = Clock()
+    monkeypatch.setattr(accounting.time, 'monotonic', clock)
+    return clock
+
+
+def update(key, counters):
+    """
+    Update the rates of a run, and save the snapshot for the next run.
+    """
+    rates = CounterRates('test_rates.json')
+    result = rates.update(key, counters)
+    rates.save()
+    return result
+
+
+def test_first_sample(clock):
+    # No previous snapshot, no rate
+    assert update('1', {'read_bytes': 4096}) is None
+    clock.now += 10
+    assert update('1', {'read_bytes': 8192}) == ({'read_bytes': 409.6}, 10)
+    # A new counter of the job has no rate until the next run
+    clock.now += 10
+    assert update('1', {'read_bytes': 8192, 'write_bytes': 100}) == (
+        {'read_bytes': 0}, 10)
+
+
+def test_counter_reset(clock):
+    update('1', {'1211:read_bytes': 4096, '1212:read_bytes': 4096})
+    clock.now += 10
+    # The process 1212 is restarted with the same pid, its counter starts
+    # again from 0
+    assert update('1', {'1211:read_bytes': 8192, '1212:read_bytes': 1024}) \
+        == ({'1211:read_bytes': 409.6}, 10)
+    clock.now += 10
+    assert update('1', {'1211:read_bytes': 8192, '1212:read_bytes': 2048}) \
+        == ({'1211:read_bytes': 0, '1212:read_bytes': 102.4}, 10)
+
+
+def test_counter_wrap_around(clock):
+    update('1', {'rcv_data': 2 ** 64 - 1024})
+    clock.now += 10
+    # A wrapped counter can not be told from a reset one, it has no rate
+    # rather than a negative or made up one
+    assert update('1', {'rcv_data': 1024}) == ({}, 10)
+    clock.now += 10
+    assert update('1', {'rcv_data': 2048}) == ({'rcv_data': 102.4}, 10)
+
+
+def test_clock_reset(clock):
+    update('1', {'read_bytes': 4096})
+    # The node is rebooted, the monotonic clock starts again
+    clock.now = 10.0
+    assert update('1', {'read_bytes': 8192}) is None
+    clock.now += 10
+    assert update('1', {'read_bytes': 12288}) == ({'read_bytes': 409.6}, 10)
+
+
+def test_finished_job_dropped(clock):
+    update('1', {'read_bytes': 4096})
+    update('2', {'read_bytes': 4096})
+    clock.now += 10
+    # Job 1 is finished, its snapshot is not saved by the next run
+    assert update('2', {'read_bytes': 4096}) == ({'read_bytes': 0}, 10)
+    assert list(CounterRates('test_rates.json').state.load()) == ['2']
+
+
+def test_rdma_collector_node_ports(clock, monkeypatch):
+    counters = SimpleNamespace(rcv_data=0, xmit_data=0)
+    port = SimpleNamespace(io_counters=counters)
+    monkeypatch.setattr(accounting, 'get_device_list',
+                        lambda: [SimpleNamespace(ports=[port])])
+    engine = SimpleNamespace(discovery=SimpleNamespace(cgroup=None))
+    jobs = [SimpleNamespace(id='1', process={'1211': None})]
+
+    def collect(jobs):
+        plugin_data = PluginData()
+        accounting.rdma_collector(engine, jobs, plugin_data)
+        return plugin_data.get_perf_data()
+
+    assert collect(jobs) == ''
+    clock.now += 10
+    counters.rcv_data, counters.xmit_data = 10240, 20480
+    # The rates of the ports of the node, while the job is the only one
+    perf_data = collect(jobs)
+    assert 'job_1_node_ib_port_in=1024B' in perf_data
+    assert 'job_1_node_ib_port_out=2048B' in perf_data
+    clock.now += 10
+    jobs.append(SimpleNamespace(id='2', process={'1300': None}))
+    assert collect(jobs) == ''
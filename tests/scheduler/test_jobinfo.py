@@ -0,0 +1,136 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fcntl
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from lico.monitor.plugins.icinga.helper.base import MetricsBase, PluginData
+from lico.monitor.plugins.icinga.scheduler.utils import jobinfo
+from lico.monitor.plugins.icinga.scheduler.utils.jobinfo import (
+    CgroupUsage, JobMetricsEngine,
+)
+
+
+class FakeCgroup:
+    """
+    The cgroups of the jobs, each job uses one CPU.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def read_cpu_usage(self, path):
+        return int(self.clock.now * 1e9)
+
+    def read_memory_usage(self, path):
+        return 1024
+
+
+class Clock:
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    path = tmp_path / 'state'
+    path.mkdir(mode=0o700)
+    monkeypatch.setenv('LICO_MONITOR_STATE_DIR', str(path))
+    return path
+
+
+@pytest.fixture
+def clock(state_dir, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jobinfo.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(jobinfo.time, 'sleep', clock.sleep)
+    return clock
+
+
+def job(job_id):
+    return SimpleNamespace(id=job_id, cgroup=[f'/job_{job_id}'])
+
+
+def is_locked(path):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return False
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+
+
+def test_cgroup_first_sample(clock):
+    cgroup = FakeCgroup(clock)
+    jobs = [job('3351'), job('3352'), job('3353')]
+    # One sleep for all the new jobs
+    assert CgroupUsage.collect(cgroup, jobs) == {
+        job.id: (100.0, 1024) for job in jobs}
+    assert clock.sleeps == [CgroupUsage.first_sample_interval]
+
+    # The jobs sampled by the previous run do not sleep
+    clock.now += 30
+    assert CgroupUsage.collect(cgroup, jobs[1:]) == {
+        '3352': (100.0, 1024), '3353': (100.0, 1024)}
+    assert clock.sleeps == [CgroupUsage.first_sample_interval]
+    # The finished job is dropped from the state
+    assert sorted(CgroupUsage.state.load()) == ['3352', '3353']
+
+
+def test_cgroup_state_locked(clock, state_dir, monkeypatch):
+    lock_path = str(state_dir / f'{CgroupUsage.state.name}.lock')
+    locked = []
+
+    def sleep(seconds):
+        # Another run can not load the state until it is saved
+        locked.append(is_locked(lock_path))
+        clock.now += seconds
+
+    monkeypatch.setattr(jobinfo.time, 'sleep', sleep)
+    CgroupUsage.collect(FakeCgroup(clock), [job('3351')])
+    assert locked == [True]
+    assert not is_locked(lock_path)
+
+
+def test_summarize():
+    plugin_data = PluginData()
+    for job_id in ['3351', '3352']:
+        plugin_data.add_point(MetricsBase.build_point(
+            'job_cpu_util', 120.5, 'float', '%'), job=job_id)
+        plugin_data.add_point(MetricsBase.build_point(
+            'job_mem_used', 1024, 'uint', 'B'), job=job_id)
+    plugin_data.add_point(MetricsBase.build_point(
+        'job_gpu_util', 45.0, 'float', '%'), job='3351', gpu='0')
+    plugin_data.add_point(MetricsBase.build_point(
+        'gpu_util', 45.0, 'float', '%'), gpu='0')
+    # The text of the CPU and memory is kept, the other metrics follow it
+    assert JobMetricsEngine.summarize(plugin_data.get_points()) == {
+        '3351': 'Job 3351 CPU Utilization = 120.5%, '
+                'Used Memory = 1024B, gpu_util[gpu=0]=45.0%',
+        '3352': 'Job 3352 CPU Utilization = 120.5%, Used Memory = 1024B',
+    }
@@ -0,0 +1,98 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import os
+import re
+import time
+
+import pytest
+
+from lico.monitor.plugins.icinga.scheduler.lsf import lico_check_lsf
+from lico.monitor.plugins.icinga.scheduler.lsf.lico_check_lsf import (
+    SPLIT_LINE, SchedulerJobInfo,
+)
+
+# The output of "bjobs -UF -u all" on a cluster of c1 and c2
+BJOBS_FILE = os.path.join(
+    os.path.dirname(__file__), '..', 'fixtures', 'lsf', 'bjobs-UF.txt')
+
+
+@pytest.fixture
+def bjobs_lines():
+    with open(BJOBS_FILE) as f:
+        return f.read().splitlines()
+
+
+def test_parse_jobs(bjobs_lines):
+    assert list(SchedulerJobInfo.parse_jobs(bjobs_lines, 'c1')) == [
+        ('3351', ['1211', '1212', '1300']),
+        # The first of the <host> tokens is the host of the pids
+        ('3352', ['2211', '2212', '2213']),
+        # The pids of c1 in the resource usage of each host
+        ('3353', ['6001', '6002']),
+        # No resource usage collected yet
+        ('3356', []),
+    ]
+    assert list(SchedulerJobInfo.parse_jobs(bjobs_lines, 'c2')) == [
+        ('3353', ['5001', '5002']),
+        ('3354[7]', ['7001']),
+    ]
+
+
+def test_parse_jobs_time(bjobs_lines):
+    # About 50k jobs, the jobs of the fixture with new ids
+    blocks = '\n'.join(bjobs_lines).split(SPLIT_LINE)
+    jobs = [re.sub(r'Job <\d+', 'Job <{}'.format(10000 + i), block)
+            for i, block in enumerate(blocks * (50000 // len(blocks)))]
+    lines = '\n{}\n'.format(SPLIT_LINE).join(jobs).splitlines()
+    start = time.monotonic()
+    count = sum(1 for _ in SchedulerJobInfo.parse_jobs(lines, 'c1'))
+    elapsed = time.monotonic() - start
+    assert count == len(jobs) * 4 // len(blocks)
+    assert elapsed < 10, f'{len(lines)} lines parsed in {elapsed:.1f}s'
+
+
+@pytest.mark.parametrize('all_hosts, cmd', [
+    (False, 'bjobs -UF -r -u all -m c1'),
+    (True, 'bjobs -UF -r -u all'),
+])
+def test_get_pid_by_job(monkeypatch, bjobs_lines, all_hosts, cmd):
+    commands = []
+    jobs = []
+
+    def command_lines(command, preexec_fn=None):
+        commands.append(command[-1])
+        return iter(bjobs_lines)
+
+    monkeypatch.setattr('socket.gethostname', lambda: 'c1')
+    monkeypatch.setattr(SchedulerJobInfo, 'command_lines', command_lines)
+    # The attributes set by the arguments are restored after the test
+    for name in ['verbose', 'discovery', 'local_host']:
+        monkeypatch.setattr(
+            SchedulerJobInfo, name, getattr(SchedulerJobInfo, name))
+    monkeypatch.setattr(
+        lico_check_lsf, 'get_job_info',
+        lambda scheduler, plugin_data, args: jobs.append(
+            scheduler.get_pid_by_job()))
+    args = argparse.Namespace(verbose=False, discovery='command',
+                              all_hosts=all_hosts)
+    lico_check_lsf.get_lsf_job_info(None, args)
+    assert commands == [cmd]
+    assert jobs == [{
+        '3351': ['1211', '1212', '1300'],
+        '3352': ['2211', '2212', '2213'],
+        '3353': ['6001', '6002'],
+        '3356': [],
+    }]
@@ -0,0 +1,105 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+
+import pytest
+
+from lico.monitor.plugins.icinga.scheduler.pbs.lico_check_pbs import (
+    SchedulerJobInfo, parse_job_attribute,
+)
+
+# A job file of the MoM, $PBS_HOME/mom_priv/jobs/<job id>.JB, in the
+# layout of job_save: the jobfix struct, then the svrattrl records of the
+# attributes, ending with a record of al_tsize ENDATTRIBUTES (-711).
+# session_id has no resource, so no resource string is written for it.
+JOB_FILE = os.path.join(
+    os.path.dirname(__file__), '..', 'fixtures', 'pbs', '3113.server.JB')
+
+
+@pytest.fixture
+def job_file():
+    with open(JOB_FILE, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def pbs_home(tmp_path, monkeypatch):
+    jobs_dir = tmp_path / 'mom_priv' / 'jobs'
+    jobs_dir.mkdir(parents=True)
+    state_dir = tmp_path / 'state'
+    state_dir.mkdir(mode=0o700)
+    monkeypatch.setenv('PBS_HOME', str(tmp_path))
+    monkeypatch.setenv('LICO_MONITOR_STATE_DIR', str(state_dir))
+    return jobs_dir
+
+
+def test_parse_job_attribute(job_file):
+    assert parse_job_attribute(job_file, 'session_id') == '48213'
+    assert parse_job_attribute(job_file, 'exec_host') == 'c1/0*4'
+
+
+def test_parse_job_attribute_with_resource(job_file):
+    # Resource_List has a resource, it is not an attribute without one
+    assert parse_job_attribute(job_file, 'Resource_List') is None
+
+
+def test_parse_job_attribute_missing(job_file):
+    end = job_file.index(b'session_id\x00')
+    assert parse_job_attribute(job_file[:end], 'session_id') is None
+    # The value is cut by the end of the file
+    assert parse_job_attribute(job_file[:end + 14], 'session_id') is None
+
+
+def test_get_job_sid_from_mom(pbs_home):
+    shutil.copy(JOB_FILE, str(pbs_home / '3113.server.JB'))
+    shutil.copy(JOB_FILE, str(pbs_home / '3114[2].server.JB'))
+    (pbs_home / '3115.server.TK').write_bytes(b'')
+    assert sorted(SchedulerJobInfo.get_job_sid_from_mom()) == [
+        ('3113', '48213'), ('3114[2]', '48213')]
+    # The cached session ids are used for the unchanged job files
+    cache = SchedulerJobInfo.job_sid_state.load()
+    assert cache['3113.server.JB'][1:] == ['3113', '48213']
+    assert sorted(SchedulerJobInfo.get_job_sid_from_mom()) == [
+        ('3113', '48213'), ('3114[2]', '48213')]
+
+
+def test_get_job_sid_from_qstat(monkeypatch):
+    hostname = 'c1'
+    nodes = {'nodes': {hostname: {
+        'jobs': ['3113.server/0', '3113.server/1', '3116.server/0']}}}
+    jobs = {'Jobs': {
+        '3113.server': {'job_state': 'R', 'session_id': 48213,
+                        'exec_host': 'c1/0*2'},
+        # Mother superior on another host
+        '3116.server': {'job_state': 'R', 'session_id': 1234,
+                        'exec_host': 'c2/0+c1/0'},
+    }}
+    commands = []
+
+    def command_call(cmd, preexec_fn=None):
+        commands.append(cmd[-1])
+        if 'pbsnodes' in cmd[-1]:
+            return json.dumps(nodes).encode(), b'', 0
+        return json.dumps(jobs).encode(), b'', 0
+
+    monkeypatch.setattr('socket.gethostname', lambda: hostname)
+    monkeypatch.setattr(SchedulerJobInfo, 'command_call', command_call)
+    assert SchedulerJobInfo.get_job_sid_from_qstat() == [('3113', '48213')]
+    assert commands == [
+        'pbsnodes -F json -v c1',
+        'qstat -f -F json 3113.server 3116.server'
+    ]
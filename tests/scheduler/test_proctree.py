@@ -0,0 +1,94 @@
+# Copyright 2015-present Lenovo
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+
+import pytest
+
+from lico.monitor.plugins.icinga.scheduler.utils.proctree import ProcessTracker
+
+
+class FakeProc:
+    """
+    A /proc with the stat and the children files of the processes.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def add(self, pid, ppid, start, children=()):
+        task_dir = self.root / str(pid) / 'task' / str(pid)
+        task_dir.mkdir(parents=True, exist_ok=True)
+        # pid (comm) state ppid ... starttime is the 22nd field
+        fields = ['S', str(ppid)] + ['0'] * 17 + [str(start)]
+        (self.root / str(pid) / 'stat').write_text(
+            '{} (job) {}'.format(pid, ' '.join(fields)))
+        (task_dir / 'children').write_text(' '.join(map(str, children)))
+
+    def remove(self, pid):
+        shutil.rmtree(str(self.root / str(pid)))
+
+
+@pytest.fixture
+def proc(tmp_path, monkeypatch):
+    state_dir = tmp_path / 'state'
+    state_dir.mkdir(mode=0o700)
+    monkeypatch.setenv('LICO_MONITOR_STATE_DIR', str(state_dir))
+    proc = FakeProc(tmp_path / 'proc')
+    # The children files are found by the task of the check itself
+    proc.add(os.getpid(), 1, 1)
+    monkeypatch.setattr(ProcessTracker, 'proc_root', str(proc.root))
+    return proc
+
+
+def track(job_id, root_pid):
+    tracker = ProcessTracker()
+    pids = sorted(tracker.track(job_id, root_pid))
+    tracker.save()
+    return pids
+
+
+def test_track_tree(proc):
+    proc.add(100, 1, 1000, [101])
+    proc.add(101, 100, 1001, [102])
+    proc.add(102, 101, 1002)
+    assert track('1', 100) == ['100', '101', '102']
+
+
+def test_track_exited_grandchild(proc):
+    proc.add(100, 1, 1000, [101])
+    proc.add(101, 100, 1001, [102])
+    proc.add(102, 101, 1002)
+    assert track('1', 100) == ['100', '101', '102']
+    # The start time and the children of 100 are unchanged
+    proc.add(101, 100, 1001)
+    proc.remove(102)
+    assert track('1', 100) == ['100', '101']
+    # The pid is reused by a process out of the job
+    proc.add(102, 1, 2000)
+    assert track('1', 100) == ['100', '101']
+
+
+def test_track_reparented(proc):
+    proc.add(100, 1, 1000, [101])
+    proc.add(101, 100, 1001)
+    assert track('1', 100) == ['100', '101']
+    # A daemon of the job is reparented to init
+    proc.add(100, 1, 1000)
+    proc.add(101, 1, 1001)
+    assert track('1', 100) == ['100', '101']
+    # The pid of the daemon is reused
+    proc.add(101, 1, 3000)
+    assert track('1', 100) == ['100']